@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Per-task overhead of parallel pipeline operations with large static arguments
+
+Compares sending op, args, and kwargs with every task (pickled functools.partial, as
+wfl.pipeline.pool.do_in_pool used to) with sending them once per worker (current do_in_pool),
+for a trivial op and a large kwarg.
+"""
+
+import functools
+import time
+from argparse import ArgumentParser
+from multiprocessing.pool import Pool
+
+import numpy as np
+from ase.atoms import Atoms
+
+from wfl.configset import ConfigSet_in
+from wfl.pipeline.pool import do_in_pool, _wrapped_op
+from wfl.pipeline.utils import grouper
+
+parser = ArgumentParser()
+parser.add_argument('--npool', '-n', type=int, default=4)
+parser.add_argument('--n_configs', '-c', type=int, default=2000)
+parser.add_argument('--chunksize', type=int, default=1)
+parser.add_argument('--static_mb', '-s', type=float, nargs='+', default=[0.0, 1.0, 10.0],
+                    help='sizes (MB) of static kwarg to pass to op')
+args = parser.parse_args()
+
+
+def op(ats, static):
+    return [at for at in ats]
+
+
+def per_task(configs, static):
+    pool = Pool(args.npool)
+    items = grouper(args.chunksize, ((at, None) for at in configs))
+    for _ in pool.imap(functools.partial(_wrapped_op, op, 0, (), {'static': static}), items):
+        pass
+    pool.close()
+    pool.join()
+
+
+def per_worker(configs, static):
+    do_in_pool(args.npool, args.chunksize, ConfigSet_in(input_configs=configs), None, op, args=(),
+               kwargs={'static': static})
+
+
+configs = [Atoms('Si', cell=[3.0] * 3, pbc=[True] * 3) for _ in range(args.n_configs)]
+n_tasks = -(-args.n_configs // args.chunksize)
+print(f'npool {args.npool} n_tasks {n_tasks}')
+print(f'{"static MB":>10} {"per task us/task":>17} {"per worker us/task":>19}')
+for static_mb in args.static_mb:
+    static = np.zeros(int(static_mb * 1024 ** 2 / 8))
+    timings = []
+    for f in [per_task, per_worker]:
+        t0 = time.perf_counter()
+        f(configs, static)
+        timings.append((time.perf_counter() - t0) / n_tasks * 1.0e6)
+    print(f'{static_mb:10.1f} {timings[0]:17.1f} {timings[1]:19.1f}')
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""End-to-end overhead of remote execution (wfl.pipeline.remote) per job and per item
+
+Runs wfl.calculators.generic.run with an EMT calculator locally and through ExPyRe on a simulated
+queuing system (wfl.pipeline.local_scheduler) that runs jobs as local subprocesses, for several
+job sizes and queue delays, and reports the extra wall time relative to the local run.
+"""
+
+import json
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from ase.build import bulk
+from ase.calculators.emt import EMT
+
+parser = ArgumentParser()
+parser.add_argument('--n_configs', '-c', type=int, default=64)
+parser.add_argument('--supercell', '-s', type=int, default=2, help='size of Cu supercell, per dimension')
+parser.add_argument('--job_chunksize', '-j', type=int, nargs='+', default=[4, 16, 64])
+parser.add_argument('--queue_delay', '-q', type=float, nargs='+', default=[0.0, 1.0])
+parser.add_argument('--num_nodes', '-n', type=int, default=4)
+parser.add_argument('--num_cores_per_node', type=int, default=1)
+parser.add_argument('--check_interval', type=float, default=0.5)
+args = parser.parse_args()
+
+# ExPyRe configuration with no real systems, in a temporary directory
+root_dir = Path(tempfile.mkdtemp(prefix='wfl_benchmark_remote_'))
+(root_dir / '_expyre').mkdir()
+(root_dir / '_expyre' / 'config.json').write_text('{"systems": {}}')
+os.chdir(root_dir)
+
+import expyre.config
+expyre.config.init(str(root_dir / '_expyre'))
+
+from wfl.calculators import generic
+from wfl.configset import ConfigSet_in, ConfigSet_out
+from wfl.pipeline.local_scheduler import add_local_system
+
+configs = []
+for at_i in range(args.n_configs):
+    at = bulk('Cu', cubic=True) * args.supercell
+    at.rattle(0.05, seed=at_i)
+    at.info['config_i'] = at_i
+    configs.append(at)
+
+
+def run():
+    t0 = time.perf_counter()
+    for _ in generic.run(ConfigSet_in(input_configs=configs), ConfigSet_out(), (EMT, [], {}), properties=['energy']):
+        pass
+    return time.perf_counter() - t0
+
+
+os.environ.pop('WFL_AUTOPARA_REMOTEINFO', None)
+t_local = run()
+print(f'n_configs {args.n_configs} natoms {len(configs[0])} local {t_local:.2f} s')
+print(f'{"queue delay s":>13} {"job size":>8} {"n_jobs":>6} {"total s":>8} {"overhead ms/job":>16} '
+      f'{"overhead ms/item":>17}')
+
+# jobs need to import this wfl, even if it is not installed
+pythonpath = f'export PYTHONPATH={Path(__file__).resolve().parents[2]}:$PYTHONPATH'
+for queue_delay in args.queue_delay:
+    for job_chunksize in args.job_chunksize:
+        sys_name = f'local_sim_{queue_delay}_{job_chunksize}'
+        add_local_system(sys_name, num_nodes=args.num_nodes, num_cores_per_node=args.num_cores_per_node,
+                         queue_delay=queue_delay)
+        os.environ['WFL_AUTOPARA_REMOTEINFO'] = json.dumps(
+            {'sys_name': sys_name, 'job_name': sys_name, 'resources': {'max_time': '1h', 'num_nodes': 1},
+             'job_chunksize': job_chunksize, 'check_interval': args.check_interval, 'pre_cmds': [pythonpath]})
+        t_remote = run()
+
+        n_jobs = -(-args.n_configs // job_chunksize)
+        overhead = t_remote - t_local
+        print(f'{queue_delay:13.1f} {job_chunksize:8d} {n_jobs:6d} {t_remote:8.2f} '
+              f'{overhead / n_jobs * 1.0e3:16.1f} {overhead / args.n_configs * 1.0e3:17.1f}')
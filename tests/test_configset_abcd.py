@@ -0,0 +1,99 @@
+import pickle
+
+import numpy as np
+import pytest
+from ase.atoms import Atoms
+
+import wfl.configset
+from wfl.configset import ConfigSet_in, ConfigSet_out
+
+
+class FakeABCD:
+    """In-memory stand-in for an ABCD database, matching queries as dicts of info values"""
+
+    n_from_url = 0
+
+    def __init__(self):
+        self.configs = []
+        self.push_sizes = []
+        self.n_get_atoms = 0
+
+    @classmethod
+    def from_url(cls, url):
+        cls.n_from_url += 1
+        return cls()
+
+    def _match(self, query):
+        return [at for at in self.configs if all([at.info.get(k) == v for k, v in query.items()])]
+
+    def push(self, ats):
+        if isinstance(ats, Atoms):
+            ats = [ats]
+        ats = [at.copy() for at in ats]
+        self.push_sizes.append(len(ats))
+        self.configs.extend(ats)
+
+    def get_atoms(self, query):
+        self.n_get_atoms += 1
+        for at in self._match(query):
+            yield at.copy()
+
+    def count(self, query):
+        return len(self._match(query))
+
+    def property(self, name, query):
+        if name == 'n_atoms':
+            return [len(at) for at in self._match(query)]
+        return [at.info[name] for at in self._match(query) if name in at.info]
+
+
+def test_batched_push():
+    db = FakeABCD()
+    co = ConfigSet_out(abcd_conn=db, output_abcd=True, set_tags={'run': 'a'}, all_or_none=False,
+                       abcd_batch_size=3)
+    for at_i in range(7):
+        co.write(Atoms('H', info={'orig_i': at_i}), flush_interval=1000)
+    assert db.push_sizes == [3, 3]
+    co.end_write()
+    assert db.push_sizes == [3, 3, 1]
+
+    ci = co.to_ConfigSet_in()
+    assert [at.info['orig_i'] for at in ci] == list(range(7))
+
+
+def test_projected_columns():
+    db = FakeABCD()
+    db.push([Atoms('H' * (i + 1), info={'run': 'a', 'energy': -float(i)}) for i in range(5)])
+    db.push([Atoms('H', info={'run': 'b'})])
+
+    ci = ConfigSet_in(abcd_conn=db, input_queries={'run': 'a'})
+    cols = ci.get_columns('energy', with_natoms=True)
+    assert db.n_get_atoms == 0
+    assert np.allclose(cols['energy'], -np.arange(5))
+    assert list(cols['natoms']) == [1, 2, 3, 4, 5]
+
+    # falls back to full configs if fields cannot be projected
+    cols = ci.get_columns('energy', with_volume=True)
+    assert db.n_get_atoms == 1
+
+    with pytest.raises(KeyError):
+        ConfigSet_in(abcd_conn=db, input_queries={}).get_columns('energy')
+
+
+def test_shared_connection(monkeypatch):
+    monkeypatch.setattr(wfl.configset, 'ABCD', FakeABCD)
+    monkeypatch.setattr(wfl.configset, '_abcd_connections', {})
+    FakeABCD.n_from_url = 0
+
+    co = ConfigSet_out(abcd_conn='mongodb://fake', output_abcd=True, all_or_none=False, set_tags={'run': 'a'})
+    co.write([Atoms('H'), Atoms('He')])
+    co.end_write()
+
+    ci = ConfigSet_in(abcd_conn='mongodb://fake', input_queries={'run': 'a'})
+    assert ci.abcd is co.abcd
+    assert FakeABCD.n_from_url == 1
+
+    # unpickled copy reconnects (here in same process, so reuses connection) rather than pickling it
+    ci_copy = pickle.loads(pickle.dumps(ci))
+    assert ci_copy.abcd is ci.abcd
+    assert len(list(ci_copy)) == 2
@@ -1,10 +1,14 @@
 from pathlib import Path
 
+import numpy as np
 import pytest
 from ase.atoms import Atoms
+from ase.calculators.singlepoint import SinglePointCalculator
 import ase.io
 
+import wfl.configset
 from wfl.configset import ConfigSet_in, ConfigSet_out
+from wfl.utils.columnar import ColumnarConfigs
 
 def test_configset_from_atoms():
     ats = [Atoms('H'), Atoms('C')]
@@ -74,3 +78,209 @@ def test_scratch(tmp_path):
             Path(ci_s).name.endswith('.xyz') and
             Path(ci_s).name != 'combined.xyz')
     assert len(ase.io.read(ci_s, ':')) == 4
+
+
+def test_frame_index(tmp_path):
+    ats = [Atoms('H' * (i + 1), cell=[5.0] * 3, pbc=[True] * 3) for i in range(20)]
+    for at_i, at in enumerate(ats):
+        at.info['orig_i'] = at_i
+    ase.io.write(tmp_path / 'at1.xyz', ats[:12])
+    ase.io.write(tmp_path / 'at2.xyz', ats[12:])
+
+    ci = ConfigSet_in(input_files=[(str(tmp_path / 'at1.xyz'), '::3'), (str(tmp_path / 'at2.xyz'), '1:')])
+    assert [at.info['orig_i'] for at in ci] == [0, 3, 6, 9] + list(range(13, 20))
+    assert len(ci) == 11
+    assert (tmp_path / '.at1.xyz.wfl_idx.npz').exists()
+
+    # random access and selected subset, including repeats and out of range values
+    assert ci[5].info['orig_i'] == 14
+    assert ci[-1].info['orig_i'] == 19
+    sel = []
+    for at in ci.subset_iter([10, 1, 1, 4, 100]):
+        sel.append((at.info['orig_i'], ci.get_current_input_file().name))
+    assert sel == [(3, 'at1.xyz'), (3, 'at1.xyz'), (13, 'at2.xyz'), (19, 'at2.xyz')]
+
+    # stale index is rebuilt
+    ase.io.write(tmp_path / 'at2.xyz', ats[12:15])
+    ci = ConfigSet_in(input_files=str(tmp_path / 'at2.xyz'))
+    assert len(ci) == 3
+    assert ci[2].info['orig_i'] == 14
+
+
+def test_subset_iter_configs():
+    ats = [Atoms('H'), Atoms('C'), Atoms('O'), Atoms('N')]
+
+    ci = ConfigSet_in(input_configs=[ats[:2], ats[2:]])
+    assert [at.get_chemical_formula() for at in ci.subset_iter([3, 0])] == ['H', 'N']
+
+    # group with no len() after one with len(), selected configs still returned once each
+    ci = ConfigSet_in(input_configs=[ats[:2], (at for at in ats[2:])])
+    assert [at.get_chemical_formula() for at in ci.subset_iter([3, 0])] == ['H', 'N']
+
+
+def test_len_if_known(tmp_path):
+    ats = [Atoms('H'), Atoms('C'), Atoms('O')]
+    assert ConfigSet_in(input_configs=ats).len_if_known() == 3
+    assert ConfigSet_in(input_configs=[ats, (at for at in ats)]).len_if_known() is None
+
+    ase.io.write(tmp_path / 'at1.xyz', ats)
+    ase.io.write(tmp_path / 'at1.xyz.gz', ats)
+    ci = ConfigSet_in(input_files=[(str(tmp_path / 'at1.xyz'), '1:')])
+    # not known until file is indexed, and not indexed to find out
+    assert ci.len_if_known() is None
+    assert not (tmp_path / '.at1.xyz.wfl_idx.npz').exists()
+    assert len(ci) == 2
+    assert ci.len_if_known() == 2
+
+    assert ConfigSet_in(input_files=str(tmp_path / 'at1.xyz.gz')).len_if_known() is None
+
+
+def test_frame_index_disabled(tmp_path):
+    ats = [Atoms('H'), Atoms('C'), Atoms('O')]
+    ase.io.write(tmp_path / 'at1.xyz', ats)
+
+    ci = ConfigSet_in(input_files=str(tmp_path / 'at1.xyz'), default_index='1:', frame_index=False)
+    assert [at.get_chemical_formula() for at in ci] == ['C', 'O']
+    assert len(ci) == 2
+    assert [at.get_chemical_formula() for at in ci.subset_iter([1])] == ['O']
+    assert not (tmp_path / '.at1.xyz.wfl_idx.npz').exists()
+
+
+def test_columnar(tmp_path):
+    np.random.seed(5)
+    ats = []
+    for at_i in range(6):
+        at = Atoms('Si' * (at_i + 1), cell=[3.0 + at_i] * 3, pbc=[True] * 3,
+                   positions=np.random.uniform(size=(at_i + 1, 3)))
+        at.info['REF_energy'] = -1.5 * at_i
+        at.info['config_type'] = f'type_{at_i % 2}'
+        at.info['desc'] = np.random.uniform(size=4)
+        if at_i % 2 == 0:
+            at.info['even'] = at_i
+        at.new_array('REF_forces', np.random.uniform(size=(len(at), 3)))
+        ats.append(at)
+    ats[1].calc = SinglePointCalculator(ats[1], energy=-2.0, forces=np.ones((2, 3)))
+    ats[3].calc = SinglePointCalculator(ats[3], energy=-4.0, stress=np.arange(6.0))
+    # shape does not fit existing column
+    ats[5].calc = SinglePointCalculator(ats[5], energy=-6.0, stress=np.ones((3, 3)))
+
+    co = ConfigSet_out(output_files=str(tmp_path / 'ats.cols'))
+    co.write(ats[:3])
+    co.write(ats[3:])
+    assert not (tmp_path / 'ats.cols').exists()
+    co.end_write()
+
+    ci = co.to_ConfigSet_in()
+    assert len(ci) == 6
+    for at, at_ref in zip(ci, ats):
+        assert np.all(at.numbers == at_ref.numbers)
+        assert np.allclose(at.positions, at_ref.positions)
+        assert np.allclose(at.cell, at_ref.cell)
+        assert at.info['REF_energy'] == at_ref.info['REF_energy']
+        assert at.info['config_type'] == at_ref.info['config_type']
+        assert at.info.get('even') == at_ref.info.get('even')
+        assert np.allclose(at.info['desc'], at_ref.info['desc'])
+        assert np.allclose(at.arrays['REF_forces'], at_ref.arrays['REF_forces'])
+    assert ci[1].get_potential_energy() == -2.0
+    assert np.allclose(ci[1].get_forces(), 1.0)
+    assert np.allclose(ci[3].calc.results['stress'], np.arange(6.0))
+    assert ci[5].get_potential_energy() == -6.0
+    assert np.allclose(ci[5].calc.results['stress'], np.ones((3, 3)))
+    assert [at.info['REF_energy'] for at in ci.subset_iter([4, 2])] == [-3.0, -6.0]
+
+    # whole columns without creating Atoms
+    cc = ColumnarConfigs(tmp_path / 'ats.cols')
+    assert isinstance(cc.info_column('REF_energy'), np.memmap)
+    assert np.allclose(cc.info_column('REF_energy'), [at.info['REF_energy'] for at in ats])
+    assert cc.info_column('desc').shape == (6, 4)
+    assert np.allclose(cc.arrays_column('REF_forces'), np.vstack([at.arrays['REF_forces'] for at in ats]))
+    even = cc.info_column('even', missing=-1)
+    assert list(even) == [0, -1, 2, -1, 4, -1]
+    with pytest.raises(KeyError):
+        cc.info_column('even')
+    assert list(cc.info_column('absent', missing=np.nan).shape) == [6]
+    assert np.all(np.isnan(cc.info_column('absent', missing=np.nan)))
+    with pytest.raises(KeyError):
+        cc.info_column('absent')
+
+
+def test_get_columns(tmp_path):
+    np.random.seed(5)
+    ats = []
+    for at_i in range(5):
+        at = Atoms('Si' * (at_i + 1) + 'C', cell=[3.0 + at_i] * 3, pbc=[True] * 3,
+                   positions=np.random.uniform(size=(at_i + 2, 3)))
+        at.info['REF_energy'] = -1.5 * at_i
+        at.info['desc'] = np.random.uniform(size=4)
+        if at_i % 2 == 0:
+            at.info['even'] = at_i
+        ats.append(at)
+    ase.io.write(tmp_path / 'ats.xyz', ats)
+    co = ConfigSet_out(output_files=str(tmp_path / 'ats.cols'))
+    co.write(ats)
+    co.end_write()
+
+    ref_natoms = [len(at) for at in ats]
+    ref_volume = [at.get_volume() for at in ats]
+    for ci in [ConfigSet_in(input_configs=ats), ConfigSet_in(input_files=tmp_path / 'ats.xyz'),
+               ConfigSet_in(input_files=tmp_path / 'ats.cols')]:
+        # header only (indexed xyz file read without per-atom lines)
+        cols = ci.get_columns(['REF_energy', 'desc'], with_natoms=True, with_volume=True)
+        assert np.allclose(cols['REF_energy'], [at.info['REF_energy'] for at in ats])
+        assert cols['desc'].shape == (5, 4)
+        assert list(cols['natoms']) == ref_natoms
+        assert np.allclose(cols['volume'], ref_volume)
+
+        cols = ci.get_columns('even', arrays_keys='positions', with_numbers=True, missing=np.nan)
+        assert np.allclose(cols['even'], [0, np.nan, 2, np.nan, 4], equal_nan=True)
+        assert np.allclose(cols['positions'], np.vstack([at.positions for at in ats]))
+        assert list(cols['numbers']) == list(np.concatenate([at.numbers for at in ats]))
+
+        with pytest.raises(KeyError):
+            ci.get_columns('even')
+
+    ci = ConfigSet_in(input_files=[(str(tmp_path / 'ats.xyz'), '1::2')])
+    assert list(ci.get_columns(with_natoms=True)['natoms']) == ref_natoms[1::2]
+
+
+def test_get_columns_non_numeric_missing(tmp_path):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3) for _ in range(4)]
+    ats[1].info['label'] = 'b'
+    ats[3].info['label'] = 'd'
+    ase.io.write(tmp_path / 'ats.xyz', ats)
+    co = ConfigSet_out(output_files=str(tmp_path / 'ats.cols'))
+    co.write(ats)
+    co.end_write()
+
+    for ci in [ConfigSet_in(input_configs=ats), ConfigSet_in(input_files=tmp_path / 'ats.xyz'),
+               ConfigSet_in(input_files=tmp_path / 'ats.cols')]:
+        with pytest.raises(ValueError, match='non-numeric'):
+            ci.get_columns('label', missing=np.nan)
+
+
+def test_prefetch(tmp_path, monkeypatch):
+    monkeypatch.setattr(wfl.configset, 'PREFETCH_BLOCK_FRAMES', 3)
+
+    ats = [Atoms('H' * (i + 1), cell=[5.0] * 3, pbc=[True] * 3) for i in range(30)]
+    for at_i, at in enumerate(ats):
+        at.info['orig_i'] = at_i
+    ase.io.write(tmp_path / 'at0.xyz', ats[:4])
+    ase.io.write(tmp_path / 'at1.xyz', ats[4:15])
+    ase.io.write(tmp_path / 'at2.xyz', ats[15:16])
+    ase.io.write(tmp_path / 'at3.xyz', ats[16:])
+
+    input_files = [str(tmp_path / f'at{i}.xyz') for i in range(4)]
+    for frame_index in [True, False]:
+        ci = ConfigSet_in(input_files=input_files, frame_index=frame_index, prefetch=2)
+        seen = [(at.info['orig_i'], ci.get_current_input_file().name) for at in ci]
+        assert seen == [(at_i, f'at{np.searchsorted([4, 15, 16], at_i, side="right")}.xyz') for at_i in range(30)]
+        assert ci.get_current_input_file() is None
+
+    ci = ConfigSet_in(input_files=[(f, '::2') for f in input_files], prefetch=3)
+    assert [at.info['orig_i'] for at in ci] == [at.info['orig_i'] for at in ConfigSet_in(
+        input_files=[(f, '::2') for f in input_files])]
+
+    # abandoned iteration shuts down cleanly
+    for at_i, at in enumerate(ConfigSet_in(input_files=input_files, prefetch=2)):
+        if at_i == 5:
+            break
@@ -1,9 +1,11 @@
 import time
 from pathlib import Path
 
+import pytest
 from ase.atoms import Atoms
+import ase.io
 
-from wfl.configset import ConfigSet_out
+from wfl.configset import ConfigSet_in, ConfigSet_out
 
 
 def test_configset_out_flush_interval(tmpdir):
@@ -78,3 +80,85 @@ def test_configset_with_pathlib_Path():
 
     assert cout.output_files[0] == Path(out_file)
     assert cout.output_files_map(in_path) == Path(out_file)
+
+
+def test_write_behind(tmpdir):
+    ats = [Atoms('H' * (i + 1)) for i in range(20)]
+    for at_i, at in enumerate(ats):
+        at.info['orig_i'] = at_i
+
+    in_files = [Path(tmpdir) / 'in.0.xyz', Path(tmpdir) / 'in.1.xyz']
+    co = ConfigSet_out(output_files={in_files[0]: 'out.0.xyz', in_files[1]: 'out.1.xyz'}, file_root=Path(tmpdir),
+                       write_behind=3)
+    for at_i, at in enumerate(ats):
+        co.write(at, from_input_file=in_files[at_i // 10])
+
+    co.end_write()
+
+    for file_i in range(2):
+        written = ase.io.read(Path(tmpdir) / f'out.{file_i}.xyz', ':')
+        assert [at.info['orig_i'] for at in written] == list(range(file_i * 10, (file_i + 1) * 10))
+    assert not any([f.name.startswith('tmp.') for f in Path(tmpdir).iterdir()])
+
+
+def test_write_behind_failure(tmpdir):
+    outfile = Path(tmpdir) / 'missing_dir' / 'co.xyz'
+    co = ConfigSet_out(output_files=outfile, write_behind=2)
+
+    with pytest.raises(RuntimeError, match='writer thread failed'):
+        for i in range(10):
+            co.write(Atoms('H'))
+        co.end_write()
+
+    assert not outfile.exists()
+
+
+@pytest.mark.parametrize('suffix', ['.xyz.gz', '.xyz.zst'])
+def test_compressed(tmpdir, suffix):
+    if suffix.endswith('.zst'):
+        pytest.importorskip('zstandard')
+
+    ats = [Atoms('H' * (i + 1), cell=[3.0] * 3, pbc=[True] * 3) for i in range(10)]
+    for at_i, at in enumerate(ats):
+        at.info['orig_i'] = at_i
+
+    outfile = Path(tmpdir) / ('co' + suffix)
+    co = ConfigSet_out(output_files=outfile, compression_level=5, compression_threads=2)
+    co.write(ats[:5])
+    co.write(ats[5:])
+    assert not outfile.exists()
+    co.end_write()
+
+    # really compressed
+    with open(outfile, 'rb') as fin:
+        assert fin.read(2) in [b'\x1f\x8b', b'\x28\xb5']
+
+    ci = co.to_ConfigSet_in()
+    assert [at.info['orig_i'] for at in ci] == list(range(10))
+    assert len(ci) == 10
+    assert not ci.is_one_file()
+    assert [at.info['orig_i'] for at in ConfigSet_in(input_files=[(outfile, '::3')])] == [0, 3, 6, 9]
+    assert [len(grp) for grp in ci.group_iter()] == [10]
+
+
+def test_lazy_group_iter(tmpdir):
+    in_files = []
+    for file_i in range(3):
+        ats = [Atoms('H' * (file_i + 1)) for _ in range(4)]
+        for at_i, at in enumerate(ats):
+            at.info['orig_i'] = file_i * 4 + at_i
+        in_files.append(Path(tmpdir) / f'in.{file_i}.xyz')
+        ase.io.write(in_files[-1], ats)
+
+    ci = ConfigSet_in(input_files=in_files)
+    co = ConfigSet_out(output_files={f: f.name.replace('in.', 'out.') for f in in_files}, file_root=Path(tmpdir),
+                       set_tags={'tagged': True})
+    for group in ci.group_iter(lazy=True):
+        assert not isinstance(group, list)
+        co.write((at for at in group), from_input_file=ci.get_current_input_file())
+    co.end_write()
+
+    for file_i in range(3):
+        written = ase.io.read(Path(tmpdir) / f'out.{file_i}.xyz', ':')
+        assert [at.info['orig_i'] for at in written] == list(range(file_i * 4, (file_i + 1) * 4))
+        assert all([at.info['tagged'] for at in written])
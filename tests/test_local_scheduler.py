@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import pytest
+from ase.build import bulk
+from ase.calculators.emt import EMT
+
+pytest.importorskip('expyre')
+
+import expyre.config
+
+from wfl.calculators import generic
+from wfl.configset import ConfigSet_in, ConfigSet_out
+from wfl.pipeline.local_scheduler import add_local_system
+
+
+@pytest.fixture
+def local_expyre(monkeypatch, tmp_path):
+    # fresh ExPyRe configuration, restored after test
+    for attr in ['local_stage_dir', 'systems', 'db']:
+        monkeypatch.setattr(expyre.config, attr, getattr(expyre.config, attr, None))
+    (tmp_path / '_expyre').mkdir()
+    (tmp_path / '_expyre' / 'config.json').write_text('{"systems": {}}')
+    expyre.config.init(str(tmp_path / '_expyre'))
+    monkeypatch.chdir(tmp_path)
+
+
+def _configs(n):
+    ats = []
+    for at_i in range(n):
+        at = bulk('Cu', cubic=True)
+        at.rattle(0.01, seed=at_i)
+        at.info['orig_i'] = at_i
+        ats.append(at)
+    return ats
+
+
+def _set_remote_info(monkeypatch, **kwargs):
+    # generic.run gets remote info from env var
+    remote_info = {'sys_name': 'local_sim', 'job_name': 'test_local', 'resources': {'max_time': '1h', 'num_nodes': 1},
+                   'job_chunksize': 2, 'check_interval': 0.1,
+                   'pre_cmds': [f'export PYTHONPATH={Path(__file__).parent.parent}:$PYTHONPATH'], **kwargs}
+    monkeypatch.setenv('WFL_AUTOPARA_REMOTEINFO', json.dumps(remote_info))
+
+
+def test_local_scheduler(local_expyre, monkeypatch):
+    scheduler = add_local_system(num_nodes=2, num_cores_per_node=1, queue_delay=0.2)
+    ats = _configs(6)
+
+    _set_remote_info(monkeypatch)
+    out = generic.run(ConfigSet_in(input_configs=ats), ConfigSet_out(), (EMT, [], {}), properties=['energy'])
+
+    monkeypatch.delenv('WFL_AUTOPARA_REMOTEINFO')
+    ref = generic.run(ConfigSet_in(input_configs=ats), ConfigSet_out(), (EMT, [], {}), properties=['energy'])
+    assert [at.info['orig_i'] for at in out] == list(range(6))
+    assert [at.info['EMT_energy'] for at in out] == pytest.approx([at.info['EMT_energy'] for at in ref])
+    assert [job['status'] for job in scheduler.jobs.values()] == ['done'] * 3
+
+
+def test_local_scheduler_failures(local_expyre, monkeypatch):
+    # every job is killed as soon as it starts
+    add_local_system(failure_rate=1.0, num_cores_per_node=1)
+    ats = _configs(4)
+
+    _set_remote_info(monkeypatch, skip_failures=True)
+    with pytest.warns(UserWarning, match='Failed in remote job'):
+        out = list(generic.run(ConfigSet_in(input_configs=ats), ConfigSet_out(), (EMT, [], {}),
+                               properties=['energy']))
+
+    assert [at.info['orig_i'] for at in out] == list(range(4))
+    assert all([at.info['EXPYRE_REMOTE_JOB_FAILED'] for at in out])
+
+    # first job is killed, and its items rerun in a job that is not
+    scheduler = add_local_system(failure_rate=1.0, num_cores_per_node=1)
+    scheduler.random.random = iter([0.0, 1.0, 1.0]).__next__
+    ats = _configs(4)
+
+    _set_remote_info(monkeypatch, resubmit_failures=1)
+    with pytest.warns(UserWarning, match='Failed in remote job test_local_chunk_0'):
+        out = list(generic.run(ConfigSet_in(input_configs=ats), ConfigSet_out(), (EMT, [], {}),
+                               properties=['energy']))
+
+    assert [at.info['orig_i'] for at in out] == list(range(4))
+    assert all(['EMT_energy' in at.info for at in out])
+    assert [job['status'] for job in scheduler.jobs.values()] == ['failed', 'done', 'done']
@@ -1,10 +1,554 @@
+import os
+import pickle
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ase.io
+import numpy as np
 import pytest
+from ase.atoms import Atoms
+from ase.calculators.emt import EMT
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.constraints import FixAtoms
 
-from wfl.configset import ConfigSet_out
+from wfl.configset import ConfigSet_in, ConfigSet_out
 from wfl.generate_configs import buildcell
+from wfl.pipeline import iterable_loop, persistent_pool, Pipeline
+from wfl.pipeline.cache import ResultCache
+from wfl.pipeline.journal import ChunkJournal
+import wfl.pipeline.pool
+from wfl.utils.parallel import construct_calculator_picklesafe
 
 
 def test_empty_iterator(tmp_path):
     co = buildcell.run(ConfigSet_out(output_files=str(tmp_path / 'dummy.xyz')), range(0), buildcell_cmd='dummy', buildcell_input='dummy')
 
     assert len([at for at in co]) == 0
+
+
+def _count_calls(ats, counter_file, shift=0.0):
+    with open(counter_file, 'a') as fout:
+        fout.write(f'{len(ats)}\n')
+    out = []
+    for at in ats:
+        at = at.copy()
+        at.positions += shift
+        at.info['shifted'] = True
+        out.append(at)
+    return out
+
+
+@pytest.mark.parametrize('npool', [0, 2])
+def test_cache(tmp_path, npool):
+    ats = [Atoms('H' * (i + 1), cell=[5.0] * 3, pbc=[True] * 3) for i in range(8)]
+    for at_i, at in enumerate(ats):
+        at.info['orig_i'] = at_i
+    cache = ResultCache(tmp_path / 'cache')
+
+    def _run(ats, shift, label):
+        return iterable_loop(npool, 2, ConfigSet_in(input_configs=ats),
+                             ConfigSet_out(output_files=str(tmp_path / f'out_{label}.xyz')),
+                             _count_calls, 0, True, None, None, None, None, ['counter_file'],
+                             counter_file=str(tmp_path / f'calls_{label}'), shift=shift, cache=cache)
+
+    def _n_calls(label):
+        try:
+            return len(open(tmp_path / f'calls_{label}').readlines())
+        except FileNotFoundError:
+            return 0
+
+    out_0 = _run(ats, 1.0, 0)
+    assert _n_calls(0) == 4
+
+    # same inputs and params, no calls
+    out_1 = _run(ats, 1.0, 1)
+    assert _n_calls(1) == 0
+    assert [at.info['orig_i'] for at in out_1] == list(range(8))
+    assert all([np.allclose(at_0.positions, at_1.positions) for at_0, at_1 in zip(out_0, out_1)])
+
+    # one chunk with changed inputs
+    ats[5].positions[0, 0] += 0.1
+    out_2 = _run(ats, 1.0, 2)
+    assert _n_calls(2) == 1
+    assert [at.info['orig_i'] for at in out_2] == list(range(8))
+    assert np.isclose(list(out_2)[5].positions[0, 0], 1.1)
+
+    # changed param that is hashed
+    _run(ats, 2.0, 3)
+    assert _n_calls(3) == 4
+
+
+def test_cache_eviction(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    for i in range(4):
+        cache.put(f'key_{i}', [Atoms('H' * 100)])
+        os.utime(cache._path(f'key_{i}'), (i, i))
+    entry_size = cache._path('key_0').stat().st_size
+    # use oldest, so it becomes most recent
+    assert cache.get('key_0') is not None
+
+    cache.evict(2 * entry_size)
+    assert [cache.get(f'key_{i}') is not None for i in range(4)] == [True, False, False, True]
+
+
+def _fail_on_flag(ats, counter_file, fail_flag):
+    if any([at.info['orig_i'] == 5 for at in ats]) and os.path.exists(fail_flag):
+        raise RuntimeError('simulated crash')
+    return _count_calls(ats, counter_file)
+
+
+@pytest.mark.parametrize('npool', [0, 2])
+def test_journal(tmp_path, npool):
+    ats = [Atoms('H' * (i + 1), cell=[5.0] * 3, pbc=[True] * 3) for i in range(8)]
+    for at_i, at in enumerate(ats):
+        at.info['orig_i'] = at_i
+    fail_flag = tmp_path / 'fail'
+    fail_flag.touch()
+
+    def _run(label):
+        return iterable_loop(npool, 2, ConfigSet_in(input_configs=ats),
+                             ConfigSet_out(output_files=str(tmp_path / 'out.xyz')),
+                             _fail_on_flag, 0, True, None, None, None, None, ['counter_file'],
+                             counter_file=str(tmp_path / f'calls_{label}'), fail_flag=str(fail_flag), journal=True)
+
+    with pytest.raises(RuntimeError):
+        _run(0)
+    assert not (tmp_path / 'out.xyz').exists()
+    assert (tmp_path / '.out.xyz.wfl_journal').exists()
+    # chunks before crash were completed
+    assert len(open(tmp_path / 'calls_0').readlines()) >= 2
+
+    # chunks may complete out of order, count those journaled before crash
+    with open(tmp_path / '.out.xyz.wfl_journal', 'rb') as fin:
+        n_journaled = -1
+        while True:
+            try:
+                pickle.load(fin)
+            except EOFError:
+                break
+            n_journaled += 1
+    assert n_journaled >= 2
+
+    fail_flag.unlink()
+    out = _run(1)
+    # only chunk that crashed and ones not journaled before crash
+    assert len(open(tmp_path / 'calls_1').readlines()) == 4 - n_journaled
+    assert [at.info['orig_i'] for at in out] == list(range(8))
+    assert all([at.info['shifted'] for at in out])
+    assert not (tmp_path / '.out.xyz.wfl_journal').exists()
+
+
+def test_journal_outputs_on_disk(tmp_path):
+    journal = ChunkJournal(tmp_path / 'journal', 'op')
+    journal.record(0, 2, 'key_0', [Atoms('H'), Atoms('He')])
+    journal.record(2, 3, 'key_1', [Atoms('Li')])
+    # only positions of records kept in memory
+    assert all([isinstance(pos, int) for _, pos in journal.chunks.values()])
+    assert [at.get_chemical_formula() for at in journal.get(2, 3, 'key_1')] == ['Li']
+    journal.close()
+
+    # resumed
+    journal = ChunkJournal(tmp_path / 'journal', 'op')
+    assert all([isinstance(pos, int) for _, pos in journal.chunks.values()])
+    assert [at.get_chemical_formula() for at in journal.get(0, 2, 'key_0')] == ['H', 'He']
+    assert journal.get(0, 2, 'key_other') is None
+    journal.record(3, 4, 'key_2', [Atoms('Be')])
+    assert [at.get_chemical_formula() for at in journal.get(3, 4, 'key_2')] == ['Be']
+    journal.close(remove=True)
+
+
+def _add_results(ats):
+    out = []
+    for at in ats:
+        at = at.copy()
+        at.calc = SinglePointCalculator(at, energy=float(len(at)), forces=at.positions * 2.0)
+        at.new_array('desc', np.ones((len(at), 5)) * len(at))
+        at.info['label'] = f'n_{len(at)}'
+        out.append(at)
+    return out
+
+
+def test_shared_memory_transport(tmp_path):
+    np.random.seed(10)
+    ats = [Atoms('Si' * (i + 1), cell=[4.0] * 3, pbc=[True] * 3, positions=np.random.uniform(size=(i + 1, 3)))
+           for i in range(7)]
+    for at_i, at in enumerate(ats):
+        at.info['orig_i'] = at_i
+        at.new_array('species_label', np.asarray(['Si'] * len(at)))
+    ats[3].set_constraint(FixAtoms([0]))
+
+    shm_before = set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+    out = iterable_loop(2, 2, ConfigSet_in(input_configs=ats), ConfigSet_out(), _add_results,
+                        transport='shared_memory')
+    out = list(out)
+    if os.path.isdir('/dev/shm'):
+        assert set(os.listdir('/dev/shm')) - shm_before == set()
+
+    assert [at.info['orig_i'] for at in out] == list(range(7))
+    for at, at_ref in zip(out, ats):
+        assert np.allclose(at.positions, at_ref.positions)
+        assert np.allclose(at.cell, at_ref.cell)
+        assert at.get_potential_energy() == len(at_ref)
+        assert np.allclose(at.get_forces(apply_constraint=False), at_ref.positions * 2.0)
+        assert np.allclose(at.arrays['desc'], len(at_ref))
+        assert list(at.arrays['species_label']) == ['Si'] * len(at_ref)
+        assert at.info['label'] == f'n_{len(at_ref)}'
+    assert isinstance(out[3].constraints[0], FixAtoms)
+
+
+class _CountPickles:
+    # records each time it is pickled in a file
+    def __init__(self, counter_file):
+        self.counter_file = counter_file
+
+    def __getstate__(self):
+        with open(self.counter_file, 'a') as fout:
+            fout.write('pickled\n')
+        return self.__dict__
+
+
+def _tag_with_arg(ats, arg):
+    out = []
+    for at in ats:
+        at = at.copy()
+        at.info['arg_file'] = arg.counter_file.name
+        out.append(at)
+    return out
+
+
+def test_static_args_once_per_worker(tmp_path):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(20)]
+    counter_file = tmp_path / 'pickles'
+    counter_file.touch()
+
+    out = iterable_loop(2, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _tag_with_arg,
+                        arg=_CountPickles(counter_file))
+    out = list(out)
+    assert [at.info['orig_i'] for at in out] == list(range(20))
+    assert all([at.info['arg_file'] == 'pickles' for at in out])
+
+    # static kwargs sent at most once per worker, not with each of the 20 tasks
+    assert len(counter_file.read_text().splitlines()) <= 2
+
+
+def _tag_with_pid(ats, tag):
+    out = []
+    for at in ats:
+        at = at.copy()
+        at.info['pid'] = os.getpid()
+        at.info['tag'] = tag
+        out.append(at)
+    return out
+
+
+def test_persistent_pool():
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(12)]
+
+    with persistent_pool(2) as pool:
+        pids = set()
+        for tag in ['a', 'b']:
+            out = list(iterable_loop(None, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _tag_with_pid,
+                                     tag=tag, transport='pickle' if tag == 'a' else 'shared_memory'))
+            assert [at.info['orig_i'] for at in out] == list(range(12))
+            assert all([at.info['tag'] == tag for at in out])
+            pids |= set([at.info['pid'] for at in out])
+        # same workers used for both calls
+        assert pids <= set([p.pid for p in pool._pool])
+        assert os.getpid() not in pids
+
+    # recycle workers after 2 tasks each
+    with persistent_pool(2, max_tasks_per_worker=2):
+        out = list(iterable_loop(None, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _tag_with_pid, tag='c'))
+        assert [at.info['orig_i'] for at in out] == list(range(12))
+        assert len(set([at.info['pid'] for at in out])) >= 6
+
+
+@pytest.mark.parametrize('npool', [0, 2])
+def test_auto_chunksize(tmp_path, npool):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(400)]
+    counter_file = tmp_path / 'calls'
+
+    out = iterable_loop(npool, 'auto', ConfigSet_in(input_configs=ats), ConfigSet_out(), _count_calls,
+                        counter_file=counter_file)
+    assert [at.info['orig_i'] for at in out] == list(range(400))
+
+    chunk_sizes = [int(line) for line in counter_file.read_text().splitlines()]
+    assert sum(chunk_sizes) == 400
+    # cheap op, so chunks grow after initial single item chunks, then shrink at the end
+    assert max(chunk_sizes) > 10
+    assert chunk_sizes[-1] < max(chunk_sizes)
+
+
+@pytest.mark.parametrize('npool', [0, 2])
+def test_cost_ordering(tmp_path, npool):
+    natoms = [[1, 5, 2], [4, 1, 3]]
+    input_files = []
+    for file_i, file_natoms in enumerate(natoms):
+        ats = [Atoms('H' * n, cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': (file_i, at_i)})
+               for at_i, n in enumerate(file_natoms)]
+        input_files.append(str(tmp_path / f'in_{file_i}.xyz'))
+        ase.io.write(input_files[-1], ats)
+    counter_file = tmp_path / 'calls'
+
+    ci = ConfigSet_in(input_files=input_files)
+    co = ConfigSet_out(output_files={input_files[0]: 'out_0.xyz', input_files[1]: 'out_1.xyz'},
+                       file_root=tmp_path)
+    iterable_loop(npool, 1, ci, co, _count_calls, counter_file=counter_file, cost_fn=len)
+
+    # original order and input file to output file mapping
+    for file_i in range(2):
+        ats = ase.io.read(tmp_path / f'out_{file_i}.xyz', ':')
+        assert [tuple(at.info['orig_i']) for at in ats] == [(file_i, at_i) for at_i in range(3)]
+        assert [len(at) for at in ats] == natoms[file_i]
+
+
+def _record_natoms(ats, record_file):
+    with open(record_file, 'a') as fout:
+        for at in ats:
+            fout.write(f'{len(at)}\n')
+    return ats
+
+
+def test_cost_key_order(tmp_path):
+    ats = [Atoms('H' * n, info={'cost': n, 'orig_i': at_i}) for at_i, n in enumerate([2, 7, 1, 4])]
+    record_file = tmp_path / 'record'
+    out = iterable_loop(0, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _record_natoms,
+                        record_file=record_file, cost_key='cost')
+    assert [int(line) for line in record_file.read_text().splitlines()] == [7, 4, 2, 1]
+    assert [at.info['orig_i'] for at in out] == list(range(4))
+
+
+def _slow_first(ats):
+    if any([at.info['orig_i'] == 0 for at in ats]):
+        time.sleep(1.0)
+    return ats
+
+
+@pytest.mark.parametrize('transport', ['pickle', 'shared_memory'])
+def test_unordered(tmp_path, transport):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(10)]
+
+    out = iterable_loop(2, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _slow_first, transport=transport)
+    assert [at.info['orig_i'] for at in out] == list(range(10))
+
+    # slow first chunk does not hold up the others
+    out = iterable_loop(2, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _slow_first, transport=transport,
+                        ordered=False)
+    out_i = [at.info['orig_i'] for at in out]
+    assert sorted(out_i) == list(range(10))
+    assert out_i[-1] == 0
+
+
+class _ThreadExecutor(ThreadPoolExecutor):
+    # concurrent.futures executor with the mpipool.MPIExecutor attributes used by do_in_pool
+    def __init__(self, size):
+        super().__init__(size)
+        self.size = size
+
+
+@pytest.mark.parametrize('executor', [None, 'mpipool'])
+@pytest.mark.parametrize('ordered', [True, False])
+@pytest.mark.parametrize('use_cache', [False, True])
+def test_in_flight_bounded(monkeypatch, tmp_path, executor, ordered, use_cache):
+    if executor == 'mpipool':
+        monkeypatch.setattr(wfl.pipeline.pool, 'wfl_mpipool', _ThreadExecutor(2))
+    co = ConfigSet_out()
+    n_ahead = []
+
+    def _items():
+        for at_i in range(200):
+            # number of items read but not yet written
+            n_written = 0 if co.output_configs is None else len(co.output_configs)
+            n_ahead.append(at_i - n_written)
+            yield Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i})
+
+    # chunks are looked up in cache as they are read
+    out = iterable_loop(2, 3, _items(), co, _slow_first, ordered=ordered, in_flight_per_process=2,
+                        cache=tmp_path / 'cache' if use_cache else None)
+    if ordered:
+        assert [at.info['orig_i'] for at in out] == list(range(200))
+    else:
+        assert sorted([at.info['orig_i'] for at in out]) == list(range(200))
+    # at most 2 * npool chunks of 3 items, plus one chunk being read
+    assert max(n_ahead) <= (2 * 2 + 1) * 3
+
+
+def _calc_id(ats, calculator):
+    calc = construct_calculator_picklesafe(calculator)
+    out = []
+    for at in ats:
+        at = at.copy()
+        at.info['calc'] = f'{os.getpid()}_{id(calc)}'
+        out.append(at)
+    return out
+
+
+@pytest.mark.parametrize('npool', [0, 2])
+def test_calculator_cache_in_workers(npool):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3) for _ in range(8)]
+
+    out = iterable_loop(npool, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _calc_id,
+                        calculator=(EMT, [], {}))
+    # one calculator per process
+    calc_ids = [at.info['calc'] for at in out]
+    assert len(set(calc_ids)) == len(set([calc_id.split('_')[0] for calc_id in calc_ids]))
+
+    # not cached in parent after call
+    assert construct_calculator_picklesafe((EMT, [], {})) is not construct_calculator_picklesafe((EMT, [], {}))
+
+
+def _sleep_in_thread(ats, record_file):
+    time.sleep(0.3)
+    with open(record_file, 'a') as fout:
+        fout.write(f'{os.getpid()}\n')
+    return ats
+
+
+def test_threads(tmp_path):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(8)]
+    record_file = tmp_path / 'record'
+
+    t0 = time.time()
+    out = iterable_loop(4, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _sleep_in_thread,
+                        record_file=record_file, executor='threads')
+    dt = time.time() - t0
+
+    assert [at.info['orig_i'] for at in out] == list(range(8))
+    # all in this process, concurrently
+    assert set([int(pid) for pid in record_file.read_text().splitlines()]) == {os.getpid()}
+    assert dt < 8 * 0.3 / 2
+
+
+def _expand(ats, n):
+    out = []
+    for at in ats:
+        out.append([])
+        for sub_i in range(n):
+            at_sub = at.copy()
+            at_sub.info['sub_i'] = sub_i
+            out[-1].append(at_sub)
+    return out
+
+
+def _drop_sub_1(ats):
+    return [None if at.info['sub_i'] == 1 or at.info['orig_i'] == 2 else at for at in ats]
+
+
+def _select_last(inputs, outputs):
+    outputs.write(list(inputs)[-1])
+    outputs.end_write()
+    return outputs.to_ConfigSet_in()
+
+
+@pytest.mark.parametrize('npool', [0, 2])
+def test_pipeline(tmp_path, npool):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(5)]
+    counter_file = tmp_path / 'calls'
+
+    def _pipeline():
+        return (Pipeline()
+                .map(_count_calls, counter_file=str(counter_file))
+                .map(_expand, n=3)
+                .map(_drop_sub_1)
+                .checkpoint(ConfigSet_out(output_files=str(tmp_path / 'checkpoint.xyz'), all_or_none=True))
+                .barrier(_select_last))
+
+    out = _pipeline().run(ats, ConfigSet_out(), npool=npool, chunksize=2)
+
+    # whole per-item chain in one task per chunk
+    assert len(counter_file.read_text().splitlines()) == 3
+    checkpoint = ase.io.read(tmp_path / 'checkpoint.xyz', ':')
+    assert [(at.info['orig_i'], at.info['sub_i']) for at in checkpoint] == [
+        (orig_i, sub_i) for orig_i in [0, 1, 3, 4] for sub_i in [0, 2]]
+    assert [(at.info['orig_i'], at.info['sub_i']) for at in out] == [(4, 2)]
+
+    # rerun resumes from checkpoint
+    out = _pipeline().run(ats, ConfigSet_out(), npool=npool, chunksize=2)
+    assert len(counter_file.read_text().splitlines()) == 3
+    assert [(at.info['orig_i'], at.info['sub_i']) for at in out] == [(4, 2)]
+
+
+def test_pipeline_in_memory(tmp_path):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(5)]
+
+    out = (Pipeline()
+           .map(_expand, n=2)
+           .barrier(_select_last)
+           .map(_expand, n=2)
+           .run(ConfigSet_in(input_configs=ats), ConfigSet_out(output_files=str(tmp_path / 'out.xyz'))))
+
+    assert [at.info['sub_i'] for at in out] == [0, 1]
+    assert len(ase.io.read(tmp_path / 'out.xyz', ':')) == 2
+    assert list(tmp_path.iterdir()) == [tmp_path / 'out.xyz']
+
+
+def test_pipeline_final_checkpoint(tmp_path):
+    pipeline = Pipeline().map(_expand, n=2).checkpoint(ConfigSet_out(output_files=str(tmp_path / 'checkpoint.xyz')))
+
+    with pytest.raises(ValueError):
+        pipeline.run([Atoms('H')], ConfigSet_out())
+    assert not (tmp_path / 'checkpoint.xyz').exists()
+
+
+def _hang_or_fail(ats, flag_dir):
+    # hang in a subprocess if info['hang'], fail on first attempt if info['fail_once']
+    for at in ats:
+        if at.info.get('hang'):
+            proc = subprocess.Popen(['sleep', '1000'])
+            (flag_dir / f'pid_{at.info["orig_i"]}').write_text(str(proc.pid))
+            proc.wait()
+        if at.info.get('fail_once') and not (flag_dir / f'failed_{at.info["orig_i"]}').exists():
+            (flag_dir / f'failed_{at.info["orig_i"]}').touch()
+            raise RuntimeError('first attempt')
+    return [at for at in ats]
+
+
+def test_task_timeout_retry(tmp_path):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(6)]
+    ats[1].info['hang'] = True
+    ats[4].info['fail_once'] = True
+
+    t0 = time.time()
+    with pytest.warns(UserWarning, match='WFL_TASK_FAILED'):
+        out = iterable_loop(2, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _hang_or_fail,
+                            flag_dir=tmp_path, task_timeout=1.0, task_retries=1)
+    out = list(out)
+
+    assert time.time() - t0 < 10.0
+    assert [at.info['orig_i'] for at in out] == list(range(6))
+    assert [at.info.get('WFL_TASK_FAILED', False) for at in out] == [False, True, False, False, False, False]
+    # subprocess of each attempt killed along with its worker, and reaped by init (not necessarily
+    # immediately) since it is orphaned
+    pid = int((tmp_path / 'pid_1').read_text())
+    t_kill = time.time()
+    with pytest.raises(ProcessLookupError):
+        while time.time() - t_kill < 30.0:
+            os.kill(pid, 0)
+            time.sleep(0.1)
+
+    # failure not retained when rerun succeeds
+    del out[1].info['hang']
+    out = iterable_loop(2, 1, ConfigSet_in(input_configs=out), ConfigSet_out(), _hang_or_fail,
+                        flag_dir=tmp_path, task_timeout=1.0)
+    assert not any(['WFL_TASK_FAILED' in at.info for at in out])
+
+
+def _slow_first_attempt(ats, flag_dir):
+    for at in ats:
+        if at.info['orig_i'] == 0 and not (flag_dir / 'started').exists():
+            (flag_dir / 'started').touch()
+            time.sleep(60)
+        time.sleep(0.1)
+    return [at for at in ats]
+
+
+def test_speculative(tmp_path):
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(6)]
+
+    t0 = time.time()
+    out = iterable_loop(2, 1, ConfigSet_in(input_configs=ats), ConfigSet_out(), _slow_first_attempt,
+                        flag_dir=tmp_path, speculative=True)
+
+    assert time.time() - t0 < 10.0
+    assert [at.info['orig_i'] for at in out] == list(range(6))
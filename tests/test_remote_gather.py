@@ -0,0 +1,252 @@
+import json
+import os
+import re
+
+import pytest
+from ase.atoms import Atoms
+
+pytest.importorskip('expyre')
+
+from wfl.configset import ConfigSet_in, ConfigSet_out
+import wfl.pipeline.remote
+from wfl.pipeline.remote import do_remotely
+from wfl.utils.misc import chdir
+
+
+class _FakeScheduler:
+    """queuing system where each job is done after a given number of status queries, and runs when its
+    results are gathered"""
+    def __init__(self, n_queries_to_finish, stage_root, item_time=None):
+        self.n_queries_to_finish = n_queries_to_finish
+        self.stage_root = stage_root
+        self.item_time = item_time
+        self.n_queries = 0
+        self.jobs = []
+        self.gathered = []
+
+
+    def status(self):
+        self.n_queries += 1
+        for job in self.jobs:
+            if job.remote_status == 'queued' and self.n_queries >= job.finish_query:
+                job.remote_status = 'done'
+
+
+def _fake_expyre(scheduler, fail=[], fail_after_run=[]):
+    class _FakeExPyRe:
+        def __init__(self, name, function, kwargs, **_):
+            self.id = name
+            self.chunk_i = int(re.search(r'_chunk_([0-9]+)', name).group(1))
+            self.resubmitted = '_resubmit_' in name
+            self.system_name = 'fake'
+            self.function = function
+            self.kwargs = kwargs
+            self.remote_status = None
+            self.n_items = len(kwargs['indexed_items'])
+            self.stage_dir = scheduler.stage_root / name
+            scheduler.jobs.append(self)
+
+        def start(self, **_):
+            self.remote_status = 'queued'
+            if self.resubmitted:
+                self.finish_query = scheduler.n_queries + 1
+            else:
+                self.finish_query = scheduler.n_queries_to_finish[self.chunk_i]
+
+        def sync_remote_results_status(self, sync_all=True, **_):
+            scheduler.status()
+
+        def get_results(self, **_):
+            scheduler.gathered.append(self.chunk_i)
+            if self.chunk_i in fail and not self.resubmitted:
+                raise RuntimeError(f'job {self.id} failed')
+            self.stage_dir.mkdir(parents=True, exist_ok=True)
+            if scheduler.item_time is not None:
+                # job run time from item_time with one worker
+                for filename, t in [('_expyre_job_started', 0.0),
+                                    ('_expyre_job_succeeded', self.n_items * scheduler.item_time)]:
+                    (self.stage_dir / filename).touch()
+                    os.utime(self.stage_dir / filename, (1000.0 + t, 1000.0 + t))
+            with chdir(self.stage_dir):
+                results = self.function(**self.kwargs)
+            if self.chunk_i in fail_after_run:
+                # e.g. post_run_commands or stage back of files failed
+                raise RuntimeError(f'job {self.id} failed after running function')
+            return results, '', ''
+
+        def mark_processed(self):
+            pass
+
+    return _FakeExPyRe
+
+
+def _tag(ats):
+    out = []
+    for at in ats:
+        at = at.copy()
+        at.info['tagged'] = True
+        out.append(at)
+    return out
+
+
+@pytest.fixture
+def fake_scheduler(monkeypatch, tmp_path):
+    def _setup(n_queries_to_finish, fail=[], fail_after_run=[], stage_root=tmp_path / 'stage', **kwargs):
+        scheduler = _FakeScheduler(n_queries_to_finish, stage_root, **kwargs)
+        monkeypatch.setattr(wfl.pipeline.remote, 'ExPyRe', _fake_expyre(scheduler, fail, fail_after_run))
+        monkeypatch.setattr(wfl.pipeline.remote, '_remote_status', lambda xpr: xpr.remote_status)
+        return scheduler
+    return _setup
+
+
+def _remote_info(**kwargs):
+    return {'sys_name': 'fake', 'job_name': 'test', 'resources': {'max_time': '1h', 'num_cores': 1},
+            'job_chunksize': 2, 'check_interval': 0, **kwargs}
+
+
+def test_gather_as_completed(fake_scheduler):
+    # last job finishes first
+    scheduler = fake_scheduler([4, 3, 2, 1])
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(8)]
+
+    out = do_remotely(_remote_info(), iterable=ConfigSet_in(input_configs=ats), configset_out=ConfigSet_out(),
+                      op=_tag, args=(), quiet=True)
+
+    assert [at.info['orig_i'] for at in out] == list(range(8))
+    assert all([at.info['tagged'] for at in out])
+    # each job gathered as soon as it is done
+    assert scheduler.gathered == [3, 2, 1, 0]
+    # one status query per check interval for all jobs
+    assert scheduler.n_queries == 4
+
+
+def test_gather_skip_failures(fake_scheduler):
+    scheduler = fake_scheduler([1, 2, 1, 1], fail=[2])
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(8)]
+
+    out = list(do_remotely(_remote_info(skip_failures=True), iterable=ConfigSet_in(input_configs=ats),
+                           configset_out=ConfigSet_out(), op=_tag, args=(), quiet=True))
+
+    assert scheduler.gathered == [0, 2, 3, 1]
+    assert [at.info['orig_i'] for at in out] == list(range(8))
+    assert [at.info.get('EXPYRE_REMOTE_JOB_FAILED', False) for at in out] == [False] * 4 + [True] * 2 + [False] * 2
+
+
+def test_gather_timeout(fake_scheduler):
+    fake_scheduler([1, 10 ** 9])
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(4)]
+
+    with pytest.raises(wfl.pipeline.remote.ExPyReTimeoutError):
+        with pytest.warns(UserWarning):
+            do_remotely(_remote_info(timeout=1), iterable=ConfigSet_in(input_configs=ats),
+                        configset_out=ConfigSet_out(), op=_tag, args=(), quiet=True)
+
+
+def test_gather_timeout_per_job(fake_scheduler):
+    # jobs run one after another, each within timeout, but all together take longer
+    scheduler = fake_scheduler([2, 4, 6])
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(6)]
+
+    out = do_remotely(_remote_info(timeout=1, check_interval=0.4), iterable=ConfigSet_in(input_configs=ats),
+                      configset_out=ConfigSet_out(), op=_tag, args=(), quiet=True)
+
+    assert [at.info['orig_i'] for at in out] == list(range(6))
+    assert scheduler.gathered == [0, 1, 2]
+
+
+def test_pack_jobs(fake_scheduler, tmp_path, capsys):
+    scheduler = fake_scheduler([1] * 4, stage_root=tmp_path, item_time=20.0)
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i, 'cost': 1.0}) for at_i in range(10)]
+    ats[3].info['cost'] = 4.0
+    timings_file = tmp_path / 'item_times.json'
+    remote_info = _remote_info(job_chunksize='auto', job_walltime=120, item_time=10.0, num_workers=2,
+                               timings_file=str(timings_file))
+
+    out = do_remotely(remote_info, iterable=ConfigSet_in(input_configs=ats), configset_out=ConfigSet_out(),
+                      op=_tag, args=(), cost_key='cost')
+
+    assert [at.info['orig_i'] for at in out] == list(range(10))
+    # up to 120 s * 2 workers / 10 s = 24 units of cost per job
+    assert [job.n_items for job in scheduler.jobs] == [10]
+    assert 'Created 1 jobs for 10 items, estimated job time up to 65 s' in capsys.readouterr().err
+    # measured from job run time, 10 items * 20 s with 1 worker, per unit cost with 2 workers
+    assert json.load(open(timings_file)) == {'test': pytest.approx(10 * 20.0 * 2 / 13.0)}
+
+    # smaller jobs with measured item time
+    remote_info['item_time'] = None
+    # time spec or number of sec
+    for job_walltime in ['1m', 60.0]:
+        remote_info['job_walltime'] = job_walltime
+        scheduler = fake_scheduler([1] * 8)
+        out = do_remotely(remote_info, iterable=ConfigSet_in(input_configs=ats), configset_out=ConfigSet_out(),
+                          op=_tag, args=(), cost_key='cost', quiet=True)
+
+        assert [at.info['orig_i'] for at in out] == list(range(10))
+        # up to 60 s * 2 workers / 30.8 s = 3.9 units of cost per job, most expensive item on its own
+        assert [job.n_items for job in scheduler.jobs] == [3, 1, 3, 3]
+
+
+def test_no_timing_without_auto(fake_scheduler, monkeypatch, tmp_path):
+    fake_scheduler([1, 1], item_time=20.0)
+    monkeypatch.setattr(wfl.pipeline.remote.expyre.config, 'local_stage_dir', str(tmp_path))
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(4)]
+
+    out = do_remotely(_remote_info(), iterable=ConfigSet_in(input_configs=ats), configset_out=ConfigSet_out(),
+                      op=_tag, args=(), quiet=True)
+
+    assert [at.info['orig_i'] for at in out] == list(range(4))
+    assert not (tmp_path / 'wfl_item_times.json').exists()
+
+
+def test_pack_jobs_needs_item_time(fake_scheduler, tmp_path):
+    fake_scheduler([1])
+    remote_info = _remote_info(job_chunksize='auto', timings_file=str(tmp_path / 'item_times.json'))
+    with pytest.raises(ValueError):
+        do_remotely(remote_info, iterable=[Atoms('H')], configset_out=ConfigSet_out(), op=_tag, args=(), quiet=True)
+
+
+def _fail_first_time(ats, flag_dir):
+    for at in ats:
+        with open(flag_dir / 'calls', 'a') as fout:
+            fout.write(f'{at.info["orig_i"]}\n')
+        if at.info.get('fail_once') and not (flag_dir / 'failed').exists():
+            (flag_dir / 'failed').touch()
+            raise RuntimeError('preempted')
+    return _tag(ats)
+
+
+@pytest.mark.parametrize('resubmit', [True, False])
+def test_resubmit_missing_items(fake_scheduler, tmp_path, resubmit):
+    fake_scheduler([1, 1])
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(6)]
+    ats[4].info['fail_once'] = True
+
+    remote_info = _remote_info(job_chunksize=3, skip_failures=not resubmit, resubmit_failures=1 if resubmit else 0)
+    with pytest.warns(UserWarning, match='Failed in remote job test_chunk_1'):
+        out = list(do_remotely(remote_info, iterable=ConfigSet_in(input_configs=ats), configset_out=ConfigSet_out(),
+                               op=_fail_first_time, args=(), kwargs={'flag_dir': tmp_path}, quiet=True))
+
+    assert [at.info['orig_i'] for at in out] == list(range(6))
+    calls = [int(orig_i) for orig_i in (tmp_path / 'calls').read_text().split()]
+    if resubmit:
+        # only item that failed and item that was not reached are rerun
+        assert calls == [0, 1, 2, 3, 4, 4, 5]
+        assert all([at.info['tagged'] for at in out])
+    else:
+        # completed item is harvested, others are marked as failed
+        assert calls == [0, 1, 2, 3, 4]
+        assert ['tagged' in at.info for at in out] == [True] * 4 + [False] * 2
+        assert ['EXPYRE_REMOTE_JOB_FAILED' in at.info for at in out] == [False] * 4 + [True] * 2
+
+
+def test_failed_job_all_items_harvested(fake_scheduler):
+    fake_scheduler([1, 1], fail_after_run=[1])
+    ats = [Atoms('H', cell=[5.0] * 3, pbc=[True] * 3, info={'orig_i': at_i}) for at_i in range(4)]
+
+    # no skip_failures or resubmission needed, since all items of failed job were completed
+    with pytest.warns(UserWarning, match='Failed in remote job test_chunk_1'):
+        out = list(do_remotely(_remote_info(), iterable=ConfigSet_in(input_configs=ats), configset_out=ConfigSet_out(),
+                               op=_tag, args=(), quiet=True))
+
+    assert [at.info['orig_i'] for at in out] == list(range(4))
+    assert all([at.info['tagged'] for at in out])
@@ -18,3 +18,65 @@ def test_replace_eval_in_strs():
     drepl = replace_eval_in_strs(d, {'v0': v0, 'v1': v1}, n_float_sig_figs=2)
 
     assert drepl == dref
+
+
+def test_calculator_cache():
+    from ase.calculators.emt import EMT
+    from wfl.utils import parallel
+
+    # not cached by default outside of pool workers
+    calc = parallel.construct_calculator_picklesafe((EMT, [], {}))
+    assert parallel.construct_calculator_picklesafe((EMT, [], {})) is not calc
+    assert parallel.construct_calculator_picklesafe((EMT, [], {}), cache=True) is \
+        parallel.construct_calculator_picklesafe((EMT, [], {}), cache=True)
+    parallel.evict_calculator()
+
+    was_enabled = parallel.enable_calculator_cache()
+    calc = parallel.construct_calculator_picklesafe((EMT, [], {}))
+    assert parallel.construct_calculator_picklesafe((EMT, None, None)) is not calc
+    assert parallel.construct_calculator_picklesafe((EMT, [], {})) is calc
+    assert parallel.construct_calculator_picklesafe((EMT, [], {}), cache=False) is not calc
+
+    assert parallel.evict_calculator((EMT, [], {})) == 1
+    assert parallel.construct_calculator_picklesafe((EMT, [], {})) is not calc
+
+    # least recently used is evicted beyond size limit
+    parallel.set_calculator_cache_size(1)
+    try:
+        calc = parallel.construct_calculator_picklesafe((EMT, [], {}))
+        parallel.construct_calculator_picklesafe((EMT, None, None))
+        assert parallel.construct_calculator_picklesafe((EMT, [], {})) is not calc
+    finally:
+        parallel.set_calculator_cache_size(8)
+        parallel.evict_calculator()
+        parallel.enable_calculator_cache(was_enabled)
+
+
+def test_chdir_threads(tmp_path):
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _write_in(subdir):
+        (tmp_path / subdir).mkdir()
+        with misc.chdir(tmp_path / subdir):
+            with open('here', 'w') as fout:
+                fout.write(subdir)
+        return os.getcwd()
+
+    cwd = os.getcwd()
+    with ThreadPoolExecutor(4) as executor:
+        assert list(executor.map(_write_in, [f'd{i}' for i in range(8)])) == [cwd] * 8
+    for i in range(8):
+        assert (tmp_path / f'd{i}' / 'here').read_text() == f'd{i}'
+
+
+def test_calculator_cache_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    from ase.calculators.emt import EMT
+    from wfl.utils import parallel
+
+    with ThreadPoolExecutor(2) as executor:
+        calcs = list(executor.map(lambda _: parallel.construct_calculator_picklesafe((EMT, [], {})), range(2)))
+    # each thread has its own cache, so calculators are not shared between threads
+    assert calcs[0] is not parallel.construct_calculator_picklesafe((EMT, [], {}))
+    parallel.evict_calculator()
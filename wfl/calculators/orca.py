@@ -388,15 +388,15 @@ class BasinHoppingORCA(Calculator):
         forces_array
 
         """
-        base_dir = os.getcwd()
+        # files are addressed by path rather than by changing directory,
+        # so that runs are safe in threads of the same process
         tmp = self._make_tempdir()
-        os.chdir(tmp)
 
         try:
-            energy_array, forces_array = self._calc_one_run()
+            energy_array, forces_array = self._calc_one_run(tmp)
         except Exception as e:
             print(
-                f"Error encountered in job {os.getcwd()} with the "
+                f"Error encountered in job {tmp} with the "
                 f"calculation:")
             traceback.print_exc(e)
 
@@ -409,13 +409,17 @@ class BasinHoppingORCA(Calculator):
             if os.path.isdir(tmp):
                 shutil.rmtree(tmp)
 
-        os.chdir(base_dir)
         return energy_array, forces_array
 
-    def _calc_one_run(self):
+    def _calc_one_run(self, workdir="."):
         """This is one set of basin hopping calculations from scratch,
         temporary directory not included yet
 
+        Parameters
+        ----------
+        workdir: path-like, default "."
+            directory to run calculations in
+
         Returns
         -------
         energy_array
@@ -431,7 +435,7 @@ class BasinHoppingORCA(Calculator):
         for i_hop in range(self.n_hop):
             try:
                 at = self._copy_atoms()
-                at.calc = self._generate_new_calculator(init)
+                at.calc = self._generate_new_calculator(init, workdir)
 
                 init = False  # do this only once, even if initial
                 # calculation fails
@@ -443,11 +447,12 @@ class BasinHoppingORCA(Calculator):
                     f"Calculation failed at {i_hop}, continuing -- err is: "
                     f"{e}")
             finally:
+                seed_path = os.path.join(workdir, self.seed)
                 for extension in ["gbw", "inp", "out", "ase", "engrad"]:
                     # saving out, wavefunction and energy results as well
                     try:
-                        shutil.copy(f"{self.seed}.{extension}",
-                                    f"{self.seed}.{i_hop}.{extension}")  #
+                        shutil.copy(f"{seed_path}.{extension}",
+                                    f"{seed_path}.{i_hop}.{extension}")  #
                         # saving the output file
                     except FileNotFoundError:
                         pass
@@ -455,8 +460,8 @@ class BasinHoppingORCA(Calculator):
                 if not self.chained_hops and i_hop != 0:
                     # always use the first calculation's wavefunction as
                     # the starting point
-                    if os.path.isfile(f"{self.seed}.0.gbw"):
-                        shutil.copy(f"{self.seed}.0.gbw", f"{self.seed}.gbw")
+                    if os.path.isfile(f"{seed_path}.0.gbw"):
+                        shutil.copy(f"{seed_path}.0.gbw", f"{seed_path}.gbw")
                     else:
                         sys.stderr.write(
                             f"Have not found {self.seed}.0.gbw after hop "
@@ -563,7 +568,7 @@ class BasinHoppingORCA(Calculator):
         return ase.Atoms(self.atoms.get_chemical_symbols(),
                          positions=self.atoms.get_positions())
 
-    def _generate_new_calculator(self, initial=False):
+    def _generate_new_calculator(self, initial=False, workdir="."):
         """Creates a single use ORCA calculator with the perturbations
 
         Parameters
@@ -572,6 +577,8 @@ class BasinHoppingORCA(Calculator):
             True  -> No mix, no autostart in case there is a .gbw file in
             the directory
             False -> n_rot number of mixes generated
+        workdir : path-like, default "."
+            directory for calculator files
         """
         if initial:
             rot_string = "AutoStart false"
@@ -579,7 +586,7 @@ class BasinHoppingORCA(Calculator):
             rot_string = self._generate_perturbations()
 
         calc = ExtendedORCA(
-            label=self.seed,
+            label=os.path.join(workdir, self.seed),
             orca_command=self.orca_command,
             charge=0, mult=self.get_multiplicity(),
             task='engrad',
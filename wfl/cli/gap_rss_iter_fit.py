@@ -39,6 +39,7 @@ import wfl.select_configs.convex_hull
 import wfl.select_configs.simple_filters
 from wfl.configset import ConfigSet_in, ConfigSet_out
 from wfl.generate_configs import md, minim, supercells
+from wfl.pipeline import Pipeline
 from wfl.select_configs.flat_histogram import biased_select_conf
 from wfl.selection_space import val_relative_to_nearby_composition_volume_min
 from wfl.descriptor_heuristics import descriptors_from_length_scales
@@ -778,20 +779,35 @@ def RSS_minima_diverse(run_dir, groups, step_params, Zs,
         # ID preconditioner needed to make it not hang with multiprocessing - need to investigate why default, 'auto',
         # which should always result in None, hangs.  Could be weird volume jumps related to symmetrization cause
         # preconditioner neighbor list to go crazy.
-        trajs = minim.run(groups[grp_label]['cur_confs'],
-                          ConfigSet_out(file_root=run_dir,
-                                        output_files=f'minim_traj.{grp_label}.xyz',
-                                        all_or_none=True, force=True),
-                          calculator=(Potential, None, {'param_filename': prev_GAP}),
-                          precon='ID', keep_symmetry=True, **minim_kwargs)
-
-        print_log('selecting minima from trajectories')
-        # select minima from trajs
-        minima = wfl.select_configs.simple_filters.apply(trajs, ConfigSet_out(file_root=run_dir,
-                                                                              output_files=f'minima.{grp_label}.xyz',
-                                                                              all_or_none=True, force=True),
-                                                         wfl.select_configs.simple_filters.InfoAllStartWith(
-                                                             ('minim_config_type', 'minim_last')))
+        minim_calculator = (Potential, None, {'param_filename': prev_GAP})
+        if get_entire_trajectories:
+            trajs = minim.run(groups[grp_label]['cur_confs'],
+                              ConfigSet_out(file_root=run_dir,
+                                            output_files=f'minim_traj.{grp_label}.xyz',
+                                            all_or_none=True, force=True),
+                              calculator=minim_calculator, precon='ID', keep_symmetry=True, **minim_kwargs)
+
+            print_log('selecting minima from trajectories')
+            # select minima from trajs
+            minima = wfl.select_configs.simple_filters.apply(
+                trajs, ConfigSet_out(file_root=run_dir, output_files=f'minima.{grp_label}.xyz',
+                                     all_or_none=True, force=True),
+                wfl.select_configs.simple_filters.InfoAllStartWith(('minim_config_type', 'minim_last')))
+        else:
+            # trajectories are not needed, so select minimum of each trajectory in the same task that
+            # minimizes it, without writing trajectories to a file
+            minim_kwargs = minim_kwargs.copy()
+            chunksize = minim_kwargs.pop('chunksize', 10)
+            # same per-process random seeding as minim.run()
+            initializer = None if 'WFL_DETERMINISTIC_HACK' in os.environ else np.random.seed
+            minima = (Pipeline()
+                      .map(minim.run_op, calculator=minim_calculator, precon='ID', keep_symmetry=True,
+                           **minim_kwargs)
+                      .map(wfl.select_configs.simple_filters.InfoAllStartWith(('minim_config_type', 'minim_last')))
+                      .run(groups[grp_label]['cur_confs'],
+                           ConfigSet_out(file_root=run_dir, output_files=f'minima.{grp_label}.xyz',
+                                         all_or_none=True, force=True),
+                           chunksize=chunksize, initializer=initializer, hash_ignore=['initializer']))
 
         if select_convex_hull:
             print_log('selecting convex hull of minima')
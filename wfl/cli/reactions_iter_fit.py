@@ -400,8 +400,8 @@ def read_previous_gap_models(active_iter):
 
 
 def calc_gap_committee(input_glob, gap_fn_list, run_dir, prefix="gap."):
-    # GAP models
-    gap_model_list = [(Potential, "", dict(param_filename=fn)) for fn in gap_fn_list]
+    # GAP models, constructed once since configs are evaluated one at a time below
+    gap_model_list = [Potential(param_filename=fn) for fn in gap_fn_list]
 
     # process file names
     input_files = sorted(glob(os.path.join(os.path.abspath(run_dir), input_glob)))
@@ -420,9 +420,10 @@ def calc_gap_committee(input_glob, gap_fn_list, run_dir, prefix="gap."):
 
     # the calculation with all models
     configset_out.pre_write()
-    for chunk in configset_in.group_iter():
-        out_chunk = committee.calculate_committee(chunk, gap_model_list, output_prefix="gap_committee_{}_",
-                                                  properties=['energy', 'forces'])
+    # stream configs of each file, so that whole (possibly large) trajectory files are never in memory
+    for chunk in configset_in.group_iter(lazy=True):
+        out_chunk = (committee.calculate_committee(at, gap_model_list, output_prefix="gap_committee_{}_",
+                                                   properties=['energy', 'forces']) for at in chunk)
         configset_out.write(out_chunk, from_input_file=configset_in.get_current_input_file())
     configset_out.end_write()
 
@@ -1,20 +1,33 @@
 import glob
 import os
+import shutil
+import functools
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import time
 import traceback
 
 from pathlib import Path
 import tempfile
 
+import numpy as np
+
 import ase.io
 from ase import Atoms
 from ase.io.formats import filetype as ase_filetype
 
+from wfl.utils import xyz_index
+from wfl.utils.columnar import is_columnar, ColumnarConfigs, ColumnarWriter
+from wfl.utils.compression import compression_of, uncompressed_name, open_text
+
 try:
     from abcd import ABCD
     from abcd.database import AbstractABCD
 except ModuleNotFoundError:
     ABCD = None
+    AbstractABCD = None
 
 
 def _fmt(title, obj):
@@ -26,16 +39,72 @@ def _fmt(title, obj):
     return f'\n   {title}: {ss}'
 
 
+# max number of frames of an indexed file that are parsed together by one prefetch task
+PREFETCH_BLOCK_FRAMES = 1000
+
+
+def _iread(filename, index, parallel_io):
+    # ase.io.iread, decompressing (gzip or zstd) file if needed
+    if compression_of(filename) is None:
+        yield from ase.io.iread(filename, index=index, parallel=parallel_io)
+    else:
+        with open_text(filename) as fin:
+            yield from ase.io.iread(fin, index=index, format=ase_filetype(uncompressed_name(filename), read=False))
+
+
+def _prefetch_read(filename, index, frames, parallel_io):
+    # read (in prefetch worker process) one block of frames, or entire file if frames is None
+    if frames is None:
+        return list(_iread(filename, index, parallel_io))
+    if is_columnar(filename):
+        return list(ColumnarConfigs(filename).iter_atoms(frames))
+    # parent process has already written index, so this is just a read of the sidecar file
+    return list(xyz_index.read_frames(filename, xyz_index.get_index(filename, write=False), frames))
+
+
+def _is_numeric(v):
+    # numbers or bools, or array of them
+    dtype = np.asarray(v).dtype
+    return np.issubdtype(dtype, np.number) or np.issubdtype(dtype, np.bool_)
+
+
+# ABCD connections by (URL, process id), shared by all ConfigSets of a process
+_abcd_connections = {}
+
+
 def _parse_abcd(abcd_conn):
     if isinstance(abcd_conn, str):
-        return ABCD.from_url(abcd_conn)
-    elif abcd_conn is None or isinstance(abcd_conn, AbstractABCD):
+        # do not reuse connections inherited from parent process (e.g. in pool workers), since
+        # database clients are not fork-safe
+        conn_key = (abcd_conn, os.getpid())
+        if conn_key not in _abcd_connections:
+            _abcd_connections[conn_key] = ABCD.from_url(abcd_conn)
+        return _abcd_connections[conn_key]
+    elif (abcd_conn is None or (AbstractABCD is not None and isinstance(abcd_conn, AbstractABCD)) or
+          all([hasattr(abcd_conn, method) for method in ['push', 'get_atoms', 'count']])):
         return abcd_conn
     else:
         raise RuntimeError('Got abcd_conn type {}, not None or ABCD or URL string'.format(type(abcd_conn)))
 
 
-class ConfigSet_in:
+class _ABCDConnState:
+    """Mixin for pickling ConfigSets with ABCD connection as URL, if known, so that unpickled copies
+    (e.g. in pool workers) reconnect rather than trying to pickle the database client"""
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if state.get('abcd_url') is not None:
+            state['abcd'] = None
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if state.get('abcd_url') is not None:
+            self.abcd = _parse_abcd(self.abcd_url)
+
+
+class ConfigSet_in(_ABCDConnState):
     """Thin input layer for Set of atomic configurations, files or ABCD queries or list of Atoms.
 
     Notes
@@ -45,7 +114,8 @@ class ConfigSet_in:
     Parameters
     ----------
     abcd_conn: str / AbstractABCD, default None
-        ABCD connection URL or ABCD object
+        ABCD connection URL or ABCD object.  Connections from URLs are shared by all ConfigSets
+        in a process, and pickled ConfigSets (e.g. sent to pool workers) reconnect using the URL.
     file_root: str, default ``
         path to prepend to every file name
     input_files: str / iterable(str) / 2-tuple(str) / iterable(2-tuple(str))
@@ -53,6 +123,8 @@ class ConfigSet_in:
         The latter only works with more than one tuple. 
         Index here overrides separate default_index arg. 
         pathlib.Path may be used instead of str. 
+        Directories containing columnar binary stores (see wfl.utils.columnar) are read as well,
+        with columns memory-mapped, and files with suffix '.gz' or '.zst' are decompressed as they are read.
     default_index: str, default `:`
         default indexing, applied to all files unless overridden by indexing specified in input_files argument
     input_queries: dict/str / iterable(dict/str)
@@ -63,6 +135,14 @@ class ConfigSet_in:
         ConfigSet_in objects to be merged
     parallel_io: bool, default False
         parallel ASE atomic config input
+    frame_index: bool, default True
+        use persistent byte-offset index of frames (hidden sidecar file next to each extxyz input file,
+        created if needed) to seek directly to frames selected by non-trivial indices, random access, or
+        subset_iter(), and to get len() without parsing
+    prefetch: int, default 0
+        if > 0, iteration over input files parses up to this many upcoming files (or blocks of
+        PREFETCH_BLOCK_FRAMES frames of indexed files) ahead in as many background processes, while
+        configs are still returned in order.  Memory use is bounded by prefetch + 1 parsed blocks.
     verbose: bool, default False
         verbose output
     """
@@ -70,7 +150,7 @@ class ConfigSet_in:
     def __init__(self, abcd_conn=None,
                  file_root='', input_files=None, default_index=':',
                  input_queries=None, input_configs=None, input_configsets=None,
-                 parallel_io=False, verbose=False):
+                 parallel_io=False, frame_index=True, prefetch=0, verbose=False):
 
         # is there a nicer way of testing this?
         assert sum([i is not None for i in [input_files, input_queries, input_configs, input_configsets]]) <= 1
@@ -79,9 +159,12 @@ class ConfigSet_in:
 
         self.verbose = verbose
         self.parallel_io = parallel_io
+        self.frame_index = frame_index
+        self.prefetch = prefetch
 
         # parse ABCD URL if provided
         self.abcd = _parse_abcd(abcd_conn)
+        self.abcd_url = abcd_conn if isinstance(abcd_conn, str) else None
 
         # copy input args to self attributes
         self.input_files = None
@@ -180,6 +263,7 @@ class ConfigSet_in:
 
         if not any(self.get_input_type()):
             self.abcd = configset.abcd
+            self.abcd_url = configset.abcd_url
             if configset.input_files is not None:
                 self.input_files = configset.input_files.copy()
             if configset.input_queries is not None:
@@ -211,10 +295,14 @@ class ConfigSet_in:
                 for at in self.abcd.get_atoms(q):
                     yield at
         elif self.input_files is not None:
-            for fin in self.input_files:
-                self.current_input_file = fin[0]
-                for at in ase.io.iread(fin[0], index=fin[1], parallel=self.parallel_io):
+            if self.prefetch > 0:
+                for at in self._iter_prefetch():
                     yield at
+            else:
+                for fin in self.input_files:
+                    self.current_input_file = fin[0]
+                    for at in self._iter_file(fin):
+                        yield at
             self.current_input_file = None
         elif self.input_configs is not None:
             for at_group in self.input_configs:
@@ -222,13 +310,335 @@ class ConfigSet_in:
                     yield at
 
 
-    def group_iter(self):
+    def _iter_prefetch(self):
+        # iterate over all input files, parsing upcoming blocks in background processes
+        def _blocks():
+            for fin in self.input_files:
+                file_frames = self._file_frames(fin)
+                if file_frames is None:
+                    yield fin[0], fin[1], None
+                else:
+                    frames = file_frames[1]
+                    for block_start in range(0, len(frames), PREFETCH_BLOCK_FRAMES):
+                        yield fin[0], fin[1], frames[block_start:block_start + PREFETCH_BLOCK_FRAMES]
+
+        executor = ProcessPoolExecutor(max_workers=self.prefetch)
+        pending = deque()
+
+        def _yield_next():
+            filename, future = pending.popleft()
+            ats = future.result()
+            self.current_input_file = filename
+            yield from ats
+
+        try:
+            for filename, index, frames in _blocks():
+                pending.append((filename, executor.submit(_prefetch_read, filename, index, frames,
+                                                          self.parallel_io)))
+                if len(pending) > self.prefetch:
+                    yield from _yield_next()
+            while len(pending) > 0:
+                yield from _yield_next()
+        finally:
+            # in case iteration was abandoned early
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+
+    def _iter_file(self, fin):
+        # iterate over one item of self.input_files, only seeking to frames for non-trivial index
+        file_frames = self._file_frames(fin) if fin[1] != ':' or is_columnar(fin[0]) else None
+        if file_frames is not None:
+            read_frames, frames = file_frames
+            return read_frames(frames)
+        else:
+            return _iread(fin[0], fin[1], self.parallel_io)
+
+
+    def _file_frames(self, fin):
+        """Random-access reader of one input file and frames selected by its index
+
+        Parameters
+        ----------
+        fin: 2-tuple(Path, index)
+            item of self.input_files
+
+        Returns
+        -------
+        (read_frames, frames) or None if file cannot be randomly accessed, where read_frames(frames)
+            returns a generator of Atoms
+        """
+        if is_columnar(fin[0]):
+            columnar_configs = ColumnarConfigs(fin[0])
+            return columnar_configs.iter_atoms, xyz_index.select_frames(len(columnar_configs), fin[1])
+        if not self.frame_index or self.parallel_io or not xyz_index.is_indexable(fin[0]):
+            return None
+        try:
+            offsets = xyz_index.get_index(fin[0])
+        except ValueError as exc:
+            if self.verbose:
+                print(f'failed to index {fin[0]}: {exc}')
+            return None
+        return (functools.partial(xyz_index.read_frames, fin[0], offsets),
+                xyz_index.select_frames(len(offsets) - 1, fin[1]))
+
+
+    def __len__(self):
+        """Number of configs, using frame index for files where possible, otherwise by iterating"""
+        if self.input_queries is not None:
+            return sum([self.abcd.count(q) for q in self.input_queries])
+        elif self.input_files is not None:
+            n = 0
+            for fin in self.input_files:
+                file_frames = self._file_frames(fin)
+                if file_frames is not None:
+                    n += len(file_frames[1])
+                else:
+                    n += sum([1 for _ in _iread(fin[0], fin[1], self.parallel_io)])
+            return n
+        elif self.input_configs is not None:
+            return sum([len(at_group) for at_group in self.input_configs])
+        else:
+            return 0
+
+
+    def len_if_known(self):
+        """Number of configs if it is known without reading or scanning them, i.e. for in-memory configs,
+        columnar stores, and xyz files with an up to date frame index, otherwise None"""
+        if self.input_files is not None:
+            n = 0
+            for fin in self.input_files:
+                if is_columnar(fin[0]):
+                    n_frames = len(ColumnarConfigs(fin[0]))
+                else:
+                    if not self.frame_index or self.parallel_io or not xyz_index.is_indexable(fin[0]):
+                        return None
+                    offsets = xyz_index.get_index(fin[0], build=False)
+                    if offsets is None:
+                        return None
+                    n_frames = len(offsets) - 1
+                n += len(xyz_index.select_frames(n_frames, fin[1]))
+            return n
+        elif self.input_configs is not None:
+            if not all([hasattr(at_group, '__len__') for at_group in self.input_configs]):
+                return None
+            return sum([len(at_group) for at_group in self.input_configs])
+        elif self.input_queries is not None:
+            return None
+        else:
+            return 0
+
+
+    def __getitem__(self, i):
+        """Random access to a single config by its position in the iteration order"""
+        if not isinstance(i, (int, np.integer)):
+            raise TypeError(f'ConfigSet_in indices must be integers, not {type(i)}')
+        if i < 0:
+            i += len(self)
+        try:
+            return next(self.subset_iter([i]))
+        except StopIteration:
+            raise IndexError(f'ConfigSet_in index {i} out of range') from None
+
+
+    def subset_iter(self, indices):
+        """Iterate over configs selected by index, seeking directly to them in indexed files.
+        ``get_current_input_file()`` is set as for regular iteration.
+
+        Parameters
+        ----------
+        indices: iterable(int)
+            Indices into the iteration order of all configs.  Configs are returned in sorted order
+            of indices, repeated values lead to multiple copies of a config, and values outside
+            0..len(self)-1 are ignored.
+
+        Returns
+        -------
+        generator returning Atoms
+        """
+        indices = np.sort(np.asarray(list(indices), dtype=int))
+        indices = indices[indices >= 0]
+        self.current_input_file = None
+
+        if self.input_files is not None:
+            all_file_frames = [self._file_frames(fin) for fin in self.input_files]
+            if all([file_frames is not None for file_frames in all_file_frames]):
+                first_i = 0
+                for fin, (read_frames, frames) in zip(self.input_files, all_file_frames):
+                    file_indices = indices[np.searchsorted(indices, first_i):
+                                           np.searchsorted(indices, first_i + len(frames))] - first_i
+                    first_i += len(frames)
+                    if len(file_indices) == 0:
+                        continue
+                    self.current_input_file = fin[0]
+                    for at in read_frames([frames[i] for i in file_indices]):
+                        yield at
+                self.current_input_file = None
+                return
+        elif self.input_configs is not None and all([hasattr(at_group, '__len__')
+                                                      for at_group in self.input_configs]):
+            # otherwise (some group with no len()), fall back to iteration below before yielding anything
+            first_i = 0
+            for at_group in self.input_configs:
+                n_group = len(at_group)
+                for i in indices[np.searchsorted(indices, first_i):np.searchsorted(indices, first_i + n_group)]:
+                    yield at_group[i - first_i]
+                first_i += n_group
+            return
+
+        # general case, iterate and pick out selected configs
+        if len(indices) == 0:
+            return
+        cur_i = 0
+        for at_i, at in enumerate(self):
+            while cur_i < len(indices) and indices[cur_i] == at_i:
+                yield at
+                cur_i += 1
+            if cur_i >= len(indices):
+                break
+
+
+    def get_columns(self, info_keys=None, arrays_keys=None, with_natoms=False, with_volume=False,
+                    with_numbers=False, missing=None):
+        """Get numeric info and/or arrays values of all configs as arrays, in a single pass that
+        skips parsing of unrequested data where possible: columnar stores are read directly from their
+        columns, extxyz files that can be indexed are read from comment lines only if no per-atom
+        quantities are requested, and only requested fields are fetched for ABCD queries if possible
+        (no per-atom quantities or volume, and missing is None).
+
+        Parameters
+        ----------
+        info_keys: str / list(str), default None
+            Atoms.info keys to get, falling back to calculator results (e.g. "energy") if not in info
+        arrays_keys: str / list(str), default None
+            Atoms.arrays keys to get, concatenated over all configs
+        with_natoms: bool, default False
+            also return number of atoms of each config as "natoms"
+        with_volume: bool, default False
+            also return cell volume of each config as "volume"
+        with_numbers: bool, default False
+            also return atomic numbers, concatenated over all configs, as "numbers"
+        missing: scalar, default None
+            value to use for scalar info quantities that are missing, or None to raise KeyError.  If numeric,
+            info quantities must be numeric too, otherwise ValueError is raised.
+
+        Returns
+        -------
+        columns: dict(str: np.ndarray)
+            array for each requested key, with one row per config (info, "natoms", "volume")
+            or per atom (arrays, "numbers")
+        """
+        if isinstance(info_keys, str):
+            info_keys = [info_keys]
+        if isinstance(arrays_keys, str):
+            arrays_keys = [arrays_keys]
+        info_keys = list(info_keys) if info_keys is not None else []
+        arrays_keys = list(arrays_keys) if arrays_keys is not None else []
+
+        # each item is list of blocks, which are python lists of per-config values or np.ndarrays of many rows
+        blocks = {k: [[]] for k in info_keys + arrays_keys}
+        extra_keys = [k for k, w in [('natoms', with_natoms), ('volume', with_volume), ('numbers', with_numbers)] if w]
+        blocks.update({k: [[]] for k in extra_keys})
+
+        def _info_value(info, results, k):
+            if k in info:
+                return info[k]
+            if k in results:
+                return results[k]
+            if missing is None:
+                raise KeyError(f'info key {k} missing from config')
+            return missing
+
+        def _add_config(natoms, cell, info, results, arrays):
+            for k in info_keys:
+                blocks[k][-1].append(_info_value(info, results, k))
+            for k in arrays_keys:
+                blocks[k][-1].append(arrays[k] if k in arrays else results[k])
+            if with_natoms:
+                blocks['natoms'][-1].append(natoms)
+            if with_volume:
+                blocks['volume'][-1].append(abs(np.linalg.det(cell)) if cell is not None else 0.0)
+            if with_numbers:
+                blocks['numbers'][-1].append(arrays['numbers'])
+
+        def _add_atoms(at):
+            results = at.calc.results if at.calc is not None and hasattr(at.calc, 'results') else {}
+            _add_config(len(at), at.cell.array, at.info, results, at.arrays)
+
+        def _add_block(k, v):
+            blocks[k].append(v)
+            blocks[k].append([])
+
+        headers_only = len(arrays_keys) == 0 and not with_numbers
+        if (self.input_queries is not None and headers_only and not with_volume and missing is None and
+                hasattr(self.abcd, 'property')):
+            # fetch only requested fields from database
+            for q in self.input_queries:
+                n_configs = self.abcd.count(q)
+                for k, abcd_k in [(k, k) for k in info_keys] + ([('natoms', 'n_atoms')] if with_natoms else []):
+                    values = self.abcd.property(abcd_k, q)
+                    if len(values) != n_configs:
+                        raise KeyError(f'info key {k} missing from {n_configs - len(values)} configs in query {q}')
+                    _add_block(k, np.asarray(values))
+        elif self.input_files is not None:
+            for fin in self.input_files:
+                if is_columnar(fin[0]):
+                    cc = ColumnarConfigs(fin[0])
+                    frames = xyz_index.select_frames(len(cc), fin[1])
+                    atom_rows = (np.concatenate([np.arange(cc.atom_offsets[i], cc.atom_offsets[i + 1]) for i in frames])
+                                 if len(frames) > 0 else np.zeros(0, dtype=int))
+                    for k in info_keys:
+                        _add_block(k, cc.info_column(k, missing=missing)[frames])
+                    for k in arrays_keys:
+                        _add_block(k, cc.arrays_column(k)[atom_rows])
+                    if with_natoms:
+                        _add_block('natoms', cc.natoms[frames])
+                    if with_volume:
+                        _add_block('volume', np.abs(np.linalg.det(cc.core('cell')[frames])))
+                    if with_numbers:
+                        _add_block('numbers', cc.core('numbers')[atom_rows])
+                elif headers_only and self.frame_index and xyz_index.is_indexable(fin[0]):
+                    offsets = xyz_index.get_index(fin[0])
+                    frames = xyz_index.select_frames(len(offsets) - 1, fin[1])
+                    for natoms, info in xyz_index.read_frame_headers(fin[0], offsets, frames):
+                        _add_config(natoms, info['Lattice'] if 'Lattice' in info else None, info, {}, {})
+                else:
+                    for at in self._iter_file(fin):
+                        _add_atoms(at)
+        else:
+            for at in self:
+                _add_atoms(at)
+
+        columns = {}
+        for k, k_blocks in blocks.items():
+            if k in arrays_keys or k == 'numbers':
+                # per-atom values, concatenate per-config arrays as well as blocks
+                k_blocks = [np.asarray(v) for b in k_blocks for v in (b if isinstance(b, list) else [b])]
+            else:
+                k_blocks = [np.asarray(b) for b in k_blocks if len(b) > 0]
+            columns[k] = np.concatenate(k_blocks) if len(k_blocks) > 0 else np.zeros(0)
+            if (k in info_keys and missing is not None and _is_numeric(missing) and
+                    not _is_numeric(columns[k])):
+                raise ValueError(f'info key {k} has non-numeric values (dtype {columns[k].dtype}), '
+                                 f'cannot combine with numeric missing value {missing}')
+        return columns
+
+
+    def group_iter(self, lazy=False):
         """Iterate over configs in class in groups. Groups returned depend on how the configs were suplied on initialization. 
 
        * If the class was initialized with queries for an ABCD database: single group correponds to single input query. 
        * If multiple input files were given: ``list(Atoms)`` from a single input file are yielded. 
        * Otherwise yield elements from ``self.input_configs``. 
-        
+
+        Parameters
+        ----------
+        lazy: bool, default False
+            yield each group from input files as a generator that reads configs as they are needed,
+            instead of a list, so that an entire file never needs to be in memory.  Each group must be
+            consumed (or abandoned) before moving to the next one, and ``get_current_input_file()`` 
+            refers to the file of the group being consumed.
         """
         self.current_input_file = None
 
@@ -238,7 +648,12 @@ class ConfigSet_in:
         elif self.input_files is not None:
             for fin in self.input_files:
                 self.current_input_file = fin[0]
-                yield ase.io.read(fin[0], index=fin[1])
+                if lazy:
+                    yield self._iter_file(fin)
+                elif is_columnar(fin[0]) or compression_of(fin[0]) is not None:
+                    yield list(self._iter_file(fin))
+                else:
+                    yield ase.io.read(fin[0], index=fin[1])
             self.current_input_file = None
         elif self.input_configs is not None:
             for at_group in self.input_configs:
@@ -265,7 +680,8 @@ class ConfigSet_in:
             # keep nesting in case the configs are stored as list of lists of Atoms
             return ConfigSet_in(input_configs=self.input_configs)
         else:
-            return ConfigSet_in(input_configs=list(self))
+            # list comprehension rather than list(self), which would call (possibly expensive) len(self)
+            return ConfigSet_in(input_configs=[at for at in self])
 
 
     def is_one_file(self):
@@ -277,7 +693,8 @@ class ConfigSet_in:
             Filename as string, False otherwhise
         """
 
-        if self.input_files is not None and len(self.input_files) == 1 and self.input_files[0][1] == ':':
+        if (self.input_files is not None and len(self.input_files) == 1 and self.input_files[0][1] == ':' and
+                not is_columnar(self.input_files[0][0]) and compression_of(self.input_files[0][0]) is None):
             return self.input_files[0][0]
         else:
             return False
@@ -303,9 +720,15 @@ class ConfigSet_in:
         if scratch:
             fd_scratch, filename = tempfile.mkstemp(prefix=filename.stem + '.', suffix=filename.suffix, dir=filename.parent)
             os.close(fd_scratch)
-        with open(filename, 'w') as fout:
+        if is_columnar(filename):
+            fout = ColumnarWriter(filename)
+            fout.write(self)
+            fout.close()
+            return filename
+
+        with open_text(filename, 'w') as fout:
             for at in self:
-                ase.io.write(fout, at, format=ase.io.formats.filetype(filename, read=False))
+                ase.io.write(fout, at, format=ase.io.formats.filetype(uncompressed_name(filename), read=False))
 
         return filename
 
@@ -324,7 +747,7 @@ class ConfigSet_in:
         return s
 
 
-class ConfigSet_out:
+class ConfigSet_out(_ABCDConnState):
     """Thin output layer for configurations into files, ABCD, or atomic configs
 
     Notes
@@ -334,15 +757,21 @@ class ConfigSet_out:
     Parameters
     ----------
     abcd_conn: str / AbstractABCD, default None
-        ABCD connection URL or ABCD object
+        ABCD connection URL or ABCD object.  Connections from URLs are shared by all ConfigSets
+        in a process, and pickled ConfigSets (e.g. sent to pool workers) reconnect using the URL.
     set_tags: dict
         dict of tags and value to set in every config
     file_root: str, default ``
         path to prepend to every file name
     output_files: str / pathlib.Path / dict / list(len=1) / tuple(len=1), default=None
-        output file, or dict mapping from input to output files
+        output file, or dict mapping from input to output files.  Output files with
+        suffix '.cols' are written as columnar binary stores (see wfl.utils.columnar), and
+        those with suffix '.gz' or '.zst' are compressed with gzip or zstd
     output_abcd: bool, default False
         write output to ABCD
+    abcd_batch_size: int, default 100
+        number of configs to accumulate before pushing them to ABCD in one call.  Smaller batches are
+        also pushed if the write() flush_interval has passed since the last push, and by end_write().
     force: bool, default False
         write even if doing so will overwrite (file) or some config with set_tags already exist (ABCD)
     all_or_none: bool, default True
@@ -350,14 +779,25 @@ class ConfigSet_out:
         when output is complete
     parallel_io: bool, default False
         parallel ASE atomic config output
+    compression_level: int, default None
+        compression level for compressed output files, None for library default (gzip 9, zstd 3)
+    compression_threads: int, default 0
+        number of threads for zstd compression, 0 to compress in writing thread, -1 for one per CPU
+    write_behind: int, default 0
+        if > 0, file output is done by a background thread, so write() returns as soon as configs
+        are queued.  Up to this many groups are queued (write() blocks when the queue is full),
+        and all queued groups for the same file are formatted and written in one batch. Atoms must
+        not be modified after being passed to write().  end_write() waits for all writing to finish,
+        and raises any exception that occurred in the writer thread.
     verbose: bool, default False
         verbose output
     """
 
 
     def __init__(self, abcd_conn=None, set_tags=None,
-                 file_root='', output_files=None, output_abcd=False,
-                 force=None, all_or_none=True, parallel_io=False, verbose=False):
+                 file_root='', output_files=None, output_abcd=False, abcd_batch_size=100,
+                 force=None, all_or_none=True, parallel_io=False, compression_level=None, compression_threads=0,
+                 write_behind=0, verbose=False):
         if all_or_none:
             # make sure force is set correctly
             if force is None:
@@ -370,16 +810,24 @@ class ConfigSet_out:
 
         self.verbose = verbose
         self.parallel_io = parallel_io
+        self.compression_level = compression_level
+        self.compression_threads = compression_threads
+        self.write_behind = write_behind
 
         # properties needed elsewhere
         self.current_output_file = None
+        self.current_output_filename = None
         self.tmp_output_files = None
         self.last_flush = time.time()
+        self._write_queue = None
+        self._writer = None
+        self._writer_exc = None
 
         # make sure output_files and output_abcd are not both set
         assert output_files is None or not output_abcd
 
         self.abcd = _parse_abcd(abcd_conn)
+        self.abcd_url = abcd_conn if isinstance(abcd_conn, str) else None
 
         # set set_tags from arguments
         if set_tags is not None and not isinstance(set_tags, dict):
@@ -392,6 +840,8 @@ class ConfigSet_out:
         self.all_or_none = all_or_none
 
         self.output_abcd = output_abcd
+        self.abcd_batch_size = abcd_batch_size
+        self._abcd_buffer = []
         self.output_files = None
         self.output_files_map = None
         self.output_configs = None
@@ -482,7 +932,9 @@ class ConfigSet_out:
         """ Cleans outputs held in the class, if any."""
         self.output_configs = None
         self.current_output_file = None
+        self.current_output_filename = None
         self.tmp_output_files = None
+        self._abcd_buffer = []
 
         if self.output_files is not None:
             self.tmp_output_files = []
@@ -495,13 +947,15 @@ class ConfigSet_out:
         
             Parameters
             ----------
-            ats: Atoms / list(Atoms)
-                Atoms to write
+            ats: Atoms / list(Atoms) / iterable(Atoms)
+                Atoms to write.  Iterables that are not lists or tuples (e.g. a group from 
+                ``ConfigSet_in.group_iter(lazy=True)``) are written to files as they are iterated over, 
+                without being stored in memory (except when using write_behind).
             from_input_file: str or Path, default None
                 If ConfigSet_out was initialised with dict(input_file=output_file, ...):
                 input file based on which the corresponding output file is selected.  
             flush_interval: int, default 10
-                Interval (s) for writing to files. 
+                Interval (s) for writing to files, or pushing incomplete batches to ABCD. 
         """
 
         # promote to iterable(Atoms)
@@ -510,19 +964,27 @@ class ConfigSet_out:
 
         # set tags
         if self.set_tags is not None:
-            for at in ats:
-                at.info.update(self.set_tags)
+            if isinstance(ats, (list, tuple)):
+                for at in ats:
+                    at.info.update(self.set_tags)
+            else:
+                ats = self._set_tags_iter(ats)
 
         if self.output_files is None and not self.output_abcd:
             # save for later return as list(Atoms) or list(list(Atoms))
+            if not isinstance(ats, (list, tuple)):
+                ats = list(ats)
             self.output_configs.append(ats)
             if self.verbose:
                 print('write wrote {} configs to self.output_configs as group'.format(len(ats)))
         elif self.output_abcd:
-            # save to database
-            self.abcd.push(ats)
-            if self.verbose:
-                print('write wrote {} to {}'.format(len(ats), self.abcd))
+            # save to database, in batches
+            self._abcd_buffer.extend(ats)
+            cur_time = time.time()
+            if (len(self._abcd_buffer) >= self.abcd_batch_size or
+                    (flush_interval >= 0 and cur_time >= self.last_flush + flush_interval)):
+                self._push_abcd_buffer()
+                self.last_flush = cur_time
         else:
             # write to files
             try:
@@ -532,44 +994,135 @@ class ConfigSet_out:
                 raise RuntimeError('Failed to get output filename from map \'{}\' and input file \'{}\''.format(
                     self.output_files_map, from_input_file))
 
-            if self.all_or_none:
-                use_output_filename = real_output_filename.parent / ('tmp.' + str(real_output_filename.name))
+            if self.write_behind > 0:
+                self._queue_write(list(ats), real_output_filename, flush_interval)
             else:
-                use_output_filename = real_output_filename
+                self._write_to_file(ats, real_output_filename, flush_interval)
 
-            # this assumes each output file is hit only once
-            # should we think about how to deal with appending?
-            if self.current_output_file is None or self.current_output_file.name != str(use_output_filename):
-                if self.current_output_file:
-                    self.current_output_file.close()
-                self.current_output_file = open(use_output_filename, 'w')
 
-                if self.all_or_none:
-                    self.tmp_output_files.append((real_output_filename, use_output_filename))
+    def _push_abcd_buffer(self):
+        # push accumulated configs to ABCD
+        if len(self._abcd_buffer) > 0:
+            self.abcd.push(self._abcd_buffer)
+            if self.verbose:
+                print('write wrote {} to {}'.format(len(self._abcd_buffer), self.abcd))
+        self._abcd_buffer = []
+
+
+    def _set_tags_iter(self, ats):
+        # set tags while lazily iterating over ats
+        for at in ats:
+            at.info.update(self.set_tags)
+            yield at
+
+
+    def _write_to_file(self, ats, real_output_filename, flush_interval):
+        # write configs to (possibly temporary version of) real_output_filename, opening it if needed
+        if self.all_or_none:
+            use_output_filename = real_output_filename.parent / ('tmp.' + str(real_output_filename.name))
+        else:
+            use_output_filename = real_output_filename
+
+        # this assumes each output file is hit only once
+        # should we think about how to deal with appending?
+        if self.current_output_file is None or self.current_output_filename != use_output_filename:
+            if self.current_output_file:
+                self.current_output_file.close()
+            if is_columnar(real_output_filename):
+                self.current_output_file = ColumnarWriter(use_output_filename)
+            else:
+                self.current_output_file = open_text(use_output_filename, 'w',
+                                                     compression=compression_of(real_output_filename),
+                                                     level=self.compression_level, threads=self.compression_threads)
+            self.current_output_filename = use_output_filename
+
+            if self.all_or_none:
+                self.tmp_output_files.append((real_output_filename, use_output_filename))
 
-            ase.io.write(self.current_output_file, ats, format=ase_filetype(self.current_output_file.name, read=False),
+        if isinstance(self.current_output_file, ColumnarWriter):
+            self.current_output_file.write(ats)
+        else:
+            ase.io.write(self.current_output_file, ats, format=ase_filetype(uncompressed_name(real_output_filename),
+                                                                            read=False),
                          parallel=self.parallel_io)
 
-            # flush if enough time has passed
-            cur_time = time.time()
-            if flush_interval >= 0 and cur_time >= self.last_flush + flush_interval:
-                self.current_output_file.flush()
-                self.last_flush = cur_time
+        # flush if enough time has passed
+        cur_time = time.time()
+        if flush_interval >= 0 and cur_time >= self.last_flush + flush_interval:
+            self.current_output_file.flush()
+            self.last_flush = cur_time
 
-            if self.verbose:
-                print('ConfigSet_out.write wrote {} to {}'.format(len(ats), self.current_output_file.name))
+        if self.verbose:
+            print('ConfigSet_out.write wrote {} to {}'.format(len(ats) if isinstance(ats, (list, tuple)) else 'group',
+                                                              self.current_output_filename))
+
+
+    def _queue_write(self, ats, real_output_filename, flush_interval):
+        # pass configs to writer thread, starting it if needed
+        if self._writer_exc is not None:
+            raise RuntimeError('ConfigSet_out writer thread failed') from self._writer_exc
+        if self._writer is None:
+            self._write_queue = queue.Queue(maxsize=self.write_behind)
+            self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+            self._writer.start()
+        self._write_queue.put((ats, real_output_filename, flush_interval))
+
+
+    def _writer_loop(self):
+        # body of writer thread, ends when it gets None from queue
+        done = False
+        while not done:
+            batch = [self._write_queue.get()]
+            # gather everything else that is already queued
+            while batch[-1] is not None:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            if self._writer_exc is not None:
+                # failed earlier, keep draining queue so that write() does not block
+                continue
+
+            try:
+                # write consecutive groups with same output file in a single call
+                while len(batch) > 0:
+                    ats, real_output_filename, flush_interval = batch.pop(0)
+                    ats = list(ats)
+                    while len(batch) > 0 and batch[0][1] == real_output_filename:
+                        ats.extend(batch.pop(0)[0])
+                    self._write_to_file(ats, real_output_filename, flush_interval)
+            except Exception as exc:
+                self._writer_exc = exc
 
 
     def end_write(self):
-        """Finalize writing to outputs: close files, rename temporary files. """
+        """Finalize writing to outputs: wait for writer thread, close files, rename temporary files. """
+        if self._writer is not None:
+            self._write_queue.put(None)
+            self._writer.join()
+            self._writer = None
+            self._write_queue = None
+
         # end writing
         try:
             self.current_output_file.close()
         except AttributeError:
             pass
 
+        if self._writer_exc is not None:
+            # leave temporary files in place, since output is incomplete
+            writer_exc = self._writer_exc
+            self._writer_exc = None
+            raise RuntimeError('ConfigSet_out writer thread failed') from writer_exc
+
+        if self.output_abcd:
+            self._push_abcd_buffer()
+
         if self.output_configs is not None or self.output_abcd:
-            # configs are in array, nothing to do
+            # configs are in array or database, nothing more to do
             return
 
         # rename files if needed for all-or-none
@@ -577,6 +1130,9 @@ class ConfigSet_out:
             if self.verbose:
                 print('renaming', self.tmp_output_files)
             for real_name, tmp_name in self.tmp_output_files:
+                if real_name.is_dir():
+                    # columnar store, cannot be replaced by rename
+                    shutil.rmtree(real_name)
                 os.rename(tmp_name, real_name)
             self.tmp_output_files = None
 
@@ -4,6 +4,7 @@ Collisions of molecules for reactivity search
 
 import os
 import traceback
+from collections import deque
 from tempfile import mkdtemp
 import functools
 
@@ -24,6 +25,7 @@ from wfl.configset import ConfigSet_in, ConfigSet_out
 from wfl.pipeline import iloop, iloop_docstring_post
 from wfl.reactions_processing import trajectory_processing
 from wfl.utils import vector_utils
+from wfl.utils.misc import chdir
 from wfl.utils.parallel import construct_calculator_picklesafe
 
 
@@ -255,9 +257,11 @@ def post_process_collision_op(seed, calc,
 
     # write the converged frames to file as well
     cfs_out_min_converged = ConfigSet_out(output_files=f"{seed}.relax_converged.xyz", force=force)
-    for atl in cfs_inter.group_iter():
-        if "config_type" in atl[-1].info.keys() and atl[-1].info['config_type'] == 'minim_last_converged':
-            cfs_out_min_converged.write(atl[-1])
+    for atl in cfs_inter.group_iter(lazy=True):
+        # only last config of trajectory is needed
+        at_last = deque(atl, maxlen=1)[-1]
+        if "config_type" in at_last.info.keys() and at_last.info['config_type'] == 'minim_last_converged':
+            cfs_out_min_converged.write(at_last)
     cfs_out_min_converged.end_write()
 
     if do_neb and do_ts_irc:
@@ -320,24 +324,23 @@ def run_pair(molecule1, molecule2, calc, seed="collision", nsteps=1000, **collis
 def run_collision_dir_management(indices, fragments, param_filename, rundir=None, **collide_kwargs):
     if rundir is None:
         rundir = os.getcwd()
-    workdir = os.getcwd()  # this is where we are coming back at the end
 
     fmt_num = f"{indices[0]:0>2}-{indices[1]:0>2}"
 
     # create unique directory and run the collision
     tmp = mkdtemp(prefix=f'collision_{fmt_num}_', dir=rundir)
     print(f"Temporary directory is {tmp}")
-    os.chdir(tmp)
 
-    pot = quippy.potential.Potential('', param_filename=os.path.abspath(param_filename))
+    param_filename = os.path.abspath(param_filename)
+    # run_pair writes its files to current directory, so change to tmp (thread-safe, see chdir)
+    with chdir(tmp):
+        pot = quippy.potential.Potential('', param_filename=param_filename)
 
-    try:
-        run_pair(fragments[indices[0]], fragments[indices[1]], pot, **collide_kwargs)
-    except Exception as e:
-        print(f"Error encountered with collision at: {tmp}:")
-        traceback.print_exc(e)
-    finally:
-        os.chdir(workdir)
+        try:
+            run_pair(fragments[indices[0]], fragments[indices[1]], pot, **collide_kwargs)
+        except Exception as e:
+            print(f"Error encountered with collision at: {tmp}:")
+            traceback.print_exc(e)
 
 
 parallel_collision = functools.partial(iloop, run_collision_dir_management)
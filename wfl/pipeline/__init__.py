@@ -3,3 +3,7 @@ assert iterable_loop
 assert iloop
 assert iloop_docstring_pre
 assert iloop_docstring_post
+from .pool import persistent_pool
+assert persistent_pool
+from .compose import Pipeline
+assert Pipeline
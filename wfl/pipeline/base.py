@@ -18,7 +18,7 @@ iloop_docstring_pre = """inputs: iterable
 iloop_docstring_post = """iterable_loop_related:
         npool: int, default os.environ['WFL_AUTOPARA_NPOOL']
             number of processes to parallelize over, 0 for running in serial
-        chunksize: int, default 1 (kwargs only)
+        chunksize: int / 'auto', default 1 (kwargs only)
             number of items from iterable to pass to each invocation of operation (pass to iterable_loop())
         skip_failed: bool, default True
             skip function calls that return None
@@ -28,7 +28,29 @@ iloop_docstring_post = """iterable_loop_related:
             RemoteInfo kwrgs with keys that match end of stack trace with function names separated by '.'.
         label: str, default None
             label to use for operation, to match to remote_info dict keys.  If none, use calling routine 
-            filename '::' calling function (pass to iterable_loop())"""
+            filename '::' calling function (pass to iterable_loop())
+        cache: ResultCache / str, default env var WFL_AUTOPARA_CACHE_DIR
+            on-disk cache of results of each chunk, or its directory (pass to iterable_loop())
+        journal: bool / str, default True if env var WFL_AUTOPARA_JOURNAL is set
+            journal completed chunks so that interrupted run can be resumed (pass to iterable_loop())
+        transport: 'pickle' / 'shared_memory', default 'pickle'
+            how to pass Atoms to and from pool workers (pass to iterable_loop())
+        cost_fn: callable, default None
+            estimated cost of each item, to run most expensive first (pass to iterable_loop())
+        cost_key: str, default None
+            Atoms.info key with estimated cost of each item, alternative to cost_fn (pass to iterable_loop())
+        ordered: bool, default True
+            write outputs in same order as inputs (pass to iterable_loop())
+        in_flight_per_process: int, default 4
+            maximum chunks per process read but not yet written (pass to iterable_loop())
+        executor: 'processes' / 'threads', default 'processes'
+            run op in processes or threads (pass to iterable_loop())
+        task_timeout: float, default None
+            wall time limit per item of each chunk (pass to iterable_loop())
+        task_retries: int, default 0
+            number of times to rerun a failed chunk (pass to iterable_loop())
+        speculative: bool, default False
+            run duplicates of straggler chunks once all are handed out (pass to iterable_loop())"""
 
 
 def iloop(func, *args, def_npool=None, def_chunksize=1, iterable_arg=0, def_skip_failed=True,
@@ -85,24 +107,43 @@ def iloop(func, *args, def_npool=None, def_chunksize=1, iterable_arg=0, def_skip
     skip_failed = kwargs.pop('skip_failed', def_skip_failed)
     remote_info = kwargs.pop('remote_info', def_remote_info)
     label = kwargs.pop('label', def_label)
+    cache = kwargs.pop('cache', None)
+    journal = kwargs.pop('journal', None)
+    transport = kwargs.pop('transport', 'pickle')
+    cost_fn = kwargs.pop('cost_fn', None)
+    cost_key = kwargs.pop('cost_key', None)
+    ordered = kwargs.pop('ordered', True)
+    in_flight_per_process = kwargs.pop('in_flight_per_process', 4)
+    executor = kwargs.pop('executor', 'processes')
+    task_timeout = kwargs.pop('task_timeout', None)
+    task_retries = kwargs.pop('task_retries', 0)
+    speculative = kwargs.pop('speculative', False)
 
     return iterable_loop(npool, chunksize, inputs, outputs, func, iterable_arg, skip_failed,
-                         initializer, initargs, remote_info, label, hash_ignore, *args[2:], **kwargs)
+                         initializer, initargs, remote_info, label, hash_ignore, *args[2:], cache=cache,
+                         journal=journal, transport=transport, cost_fn=cost_fn, cost_key=cost_key, ordered=ordered,
+                         in_flight_per_process=in_flight_per_process, executor=executor, task_timeout=task_timeout,
+                         task_retries=task_retries, speculative=speculative, **kwargs)
 
 # do we want to allow for ops that only take singletons, not iterables, as input, maybe with chunksize=0?
 # that info would have to be passed down to _wrapped_op so it passes a singleton rather than a list into op
 #
 # some ifs (int positional vs. str keyword) could be removed if we required that the iterable be passed into a kwarg.
 def iterable_loop(npool=None, chunksize=1, iterable=None, configset_out=None, op=None, iterable_arg=0, skip_failed=True,
-                  initializer=None, initargs=None, remote_info=None, label=None, hash_ignore=[], *args, **kwargs):
+                  initializer=None, initargs=None, remote_info=None, label=None, hash_ignore=[], *args,
+                  cache=None, journal=None, transport='pickle', cost_fn=None, cost_key=None, ordered=True,
+                  in_flight_per_process=4, executor='processes', task_timeout=None, task_retries=0, speculative=False,
+                  **kwargs):
     """parallelize some operation over an iterable
 
     Parameters
     ----------
     npool: int, default os.environ['WFL_AUTOPARA_NPOOL']
-        number of processes to parallelize over, 0 for running in serial
-    chunksize: int, default 1
-        number of items from iterable to pass to kach invocation of operation
+        number of processes to parallelize over, 0 for running in serial.  Inside a
+        wfl.pipeline.persistent_pool() context, its pool is used instead of creating a new one.
+    chunksize: int / 'auto', default 1
+        number of items from iterable to pass to kach invocation of operation, or 'auto' to size chunks
+        from measured time per item (see wfl.pipeline.pool.do_in_pool)
     iterable: iterable, default None
         iterable to loop over, often ConfigSet_in but could also be other things like range()
     configset_out: ConfigSet_out, default None
@@ -128,6 +169,44 @@ def iterable_loop(npool=None, chunksize=1, iterable=None, configset_out=None, op
         if it's already done
     args: list
         positional arguments to op
+    cache: ResultCache / str / Path, default None
+        on-disk cache of results of each chunk (see wfl.pipeline.cache), or its directory, so that only
+        chunks with changed op, args, kwargs or inputs are computed.  If None, use env var
+        WFL_AUTOPARA_CACHE_DIR if set.  Not used for remote execution.
+    journal: bool / str / Path, default None
+        journal results of each chunk as it completes, to this file or if True to a hidden file next to
+        first output file, so that a rerun after an interruption only computes remaining chunks.
+        If None, True if env var WFL_AUTOPARA_JOURNAL is set.  Not used for remote execution.
+    transport: 'pickle' / 'shared_memory', default 'pickle'
+        how to pass items and results to and from multiprocessing.Pool workers, 'shared_memory' to
+        place numeric arrays of Atoms in shared memory blocks rather than pickling them
+    cost_fn: callable, default None
+        estimated cost of an item (e.g. len(at)**3 for DFT), to run items longest processing time first
+        so that expensive items do not start last.  Outputs are still written in the original order.
+        For remote execution, used to pack items into jobs (RemoteInfo job_chunksize='auto').
+    cost_key: str, default None
+        Atoms.info key with estimated cost of each item, alternative to cost_fn
+    ordered: bool, default True
+        write outputs in same order as iterable, holding results of chunks that complete early in a bounded
+        reorder buffer.  If False, write them as soon as they complete, for consumers that do not care about
+        order.  Not used for remote execution.
+    in_flight_per_process: int, default 4
+        maximum number of chunks per process that are read from iterable but not yet written, so that
+        memory use is proportional to number of processes rather than length of iterable, None for no
+        limit.  Not used for remote execution.
+    executor: 'processes' / 'threads', default 'processes'
+        run op in npool processes, or in npool threads of this process for ops that mostly wait for
+        external executables (e.g. DFT codes).  See wfl.pipeline.pool.do_in_pool for restrictions on
+        ops run in threads.  Not used for remote execution.
+    task_timeout: float, default None
+        wall time limit (sec) per item, after which a chunk is killed, and rerun or marked as failed with
+        info['WFL_TASK_FAILED'] (see wfl.pipeline.pool.do_in_pool).  Not used for remote execution.
+    task_retries: int, default 0
+        number of times to rerun a chunk that timed out, raised an exception, or whose process died.
+        Not used for remote execution.
+    speculative: bool, default False
+        once all chunks have been handed out, run duplicates of straggler chunks on idle processes.
+        Not used for remote execution.
     kwargs: dict
         keyword arguments to op
 
@@ -183,9 +262,13 @@ def iterable_loop(npool=None, chunksize=1, iterable=None, configset_out=None, op
 
     if remote_info is not None:
         out = do_remotely(remote_info, hash_ignore, chunksize, iterable, configset_out,
-                          op, iterable_arg, skip_failed, initializer, initargs, args, kwargs)
+                          op, iterable_arg, skip_failed, initializer, initargs, args, kwargs, cost_fn=cost_fn,
+                          cost_key=cost_key)
     else:
         out = do_in_pool(npool, chunksize, iterable, configset_out, op, iterable_arg,
-                         skip_failed, initializer, initargs, args, kwargs)
+                         skip_failed, initializer, initargs, args, kwargs, hash_ignore=hash_ignore, cache=cache,
+                         journal=journal, transport=transport, cost_fn=cost_fn, cost_key=cost_key, ordered=ordered,
+                         in_flight_per_process=in_flight_per_process, executor=executor, task_timeout=task_timeout,
+                         task_retries=task_retries, speculative=speculative)
 
     return out
@@ -0,0 +1,212 @@
+"""Content-addressed on-disk cache of results of chunks of pipeline operations
+
+Each chunk is identified by a hash of the operation, its arguments (except those listed
+in hash_ignore), and the contents of the input items of the chunk, so that rerunning a
+(partially) changed set of inputs only recomputes chunks whose inputs or parameters changed.
+"""
+
+import os
+import hashlib
+import pickle
+import warnings
+from pathlib import Path
+
+import numpy as np
+from ase.atoms import Atoms
+
+
+def _update_hash_atoms(h, at):
+    # canonical hash of structure, info and arrays (independent of dict ordering)
+    for v in [at.numbers, at.positions, at.cell.array, at.pbc]:
+        h.update(np.ascontiguousarray(v).tobytes())
+    for k in sorted(at.info):
+        h.update(pickle.dumps((k, at.info[k])))
+    for k in sorted(at.arrays):
+        if k not in ['numbers', 'positions']:
+            h.update(k.encode())
+            h.update(np.ascontiguousarray(at.arrays[k]).tobytes())
+    if at.calc is not None and hasattr(at.calc, 'results'):
+        for k in sorted(at.calc.results):
+            h.update(pickle.dumps((k, at.calc.results[k])))
+
+
+def op_hash(op, args, kwargs, hash_ignore=[], initializer=None, initargs=None):
+    """Hash of operation and its parameters, without the input items
+
+    Parameters
+    ----------
+    op: callable
+        operation
+    args: list
+        positional arguments to op, with int elements of hash_ignore excluded
+    kwargs: dict
+        keyword arguments to op, with str elements of hash_ignore excluded
+    hash_ignore: list(int / str), default []
+        arguments to exclude from hash, with "initializer" also excluding initializer and initargs
+    initializer, initargs: callable, list, default None
+        pool initializer and its arguments
+
+    Returns
+    -------
+    hashlib sha256 object, which can be copied and updated with items
+    """
+    h = hashlib.sha256()
+    h.update(pickle.dumps(op))
+    for arg_i, arg in enumerate(args):
+        if arg_i not in hash_ignore:
+            h.update(pickle.dumps(arg))
+    for arg_key in sorted(kwargs):
+        if arg_key not in hash_ignore:
+            h.update(pickle.dumps((arg_key, kwargs[arg_key])))
+    if 'initializer' not in hash_ignore:
+        h.update(pickle.dumps((initializer, initargs)))
+    return h
+
+
+def chunk_key(base_hash, items):
+    """Key for one chunk of input items
+
+    Parameters
+    ----------
+    base_hash: hashlib object
+        hash of operation, from op_hash()
+    items: iterable
+        input items (Atoms or other picklable objects)
+
+    Returns
+    -------
+    str hex digest
+    """
+    h = base_hash.copy()
+    for item in items:
+        if isinstance(item, Atoms):
+            _update_hash_atoms(h, item)
+        else:
+            h.update(pickle.dumps(item))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """On-disk store of results of chunks, one pickle file per chunk key, with least recently
+    used entries evicted when the total size exceeds a limit
+
+    Parameters
+    ----------
+    cache_dir: str / Path
+        directory for cache files, created if needed
+    max_size: int, default None
+        maximum total size of cache files in bytes, None for no limit
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+    def _path(self, key):
+        return self.cache_dir / (key + '.pckl')
+
+
+    def get(self, key):
+        """Get results of a chunk
+
+        Parameters
+        ----------
+        key: str
+            chunk key from chunk_key()
+
+        Returns
+        -------
+        list of results, or None if not in cache
+        """
+        try:
+            with open(self._path(key), 'rb') as fin:
+                results = pickle.load(fin)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # mark as recently used
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return results
+
+
+    def put(self, key, results):
+        """Store results of a chunk, evicting least recently used entries if needed
+
+        Parameters
+        ----------
+        key: str
+            chunk key from chunk_key()
+        results: list
+            results of op for each item in chunk
+        """
+        tmp_path = self.cache_dir / ('tmp.' + key + f'.{os.getpid()}.pckl')
+        try:
+            with open(tmp_path, 'wb') as fout:
+                pickle.dump(results, fout)
+            os.replace(tmp_path, self._path(key))
+        except Exception as exc:
+            warnings.warn(f'Failed to store results in cache {self.cache_dir}: {exc}')
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return
+
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+
+    def evict(self, max_size):
+        """Remove least recently used entries until total size is at most max_size
+
+        Parameters
+        ----------
+        max_size: int
+            maximum total size in bytes
+        """
+        entries = []
+        for f in self.cache_dir.glob('*.pckl'):
+            if f.name.startswith('tmp.'):
+                continue
+            try:
+                stat = f.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, f))
+        total_size = sum([e[1] for e in entries])
+        for _, size, f in sorted(entries, key=lambda e: e[0]):
+            if total_size <= max_size:
+                break
+            try:
+                f.unlink()
+            except OSError:
+                pass
+            total_size -= size
+
+
+def get_cache(cache):
+    """Get ResultCache from cache argument
+
+    Parameters
+    ----------
+    cache: ResultCache / str / Path / None
+        cache, or directory for cache, or None to use env var WFL_AUTOPARA_CACHE_DIR if set,
+        with optional size limit (bytes) in WFL_AUTOPARA_CACHE_MAX_SIZE
+
+    Returns
+    -------
+    ResultCache or None
+    """
+    if cache is None:
+        if 'WFL_AUTOPARA_CACHE_DIR' not in os.environ:
+            return None
+        max_size = os.environ.get('WFL_AUTOPARA_CACHE_MAX_SIZE')
+        return ResultCache(os.environ['WFL_AUTOPARA_CACHE_DIR'],
+                           max_size=int(max_size) if max_size is not None else None)
+    if isinstance(cache, ResultCache):
+        return cache
+    return ResultCache(cache)
@@ -0,0 +1,189 @@
+"""Composition of several operations into one streaming pipeline
+
+Consecutive per-item operations (e.g. minimize, then filter, then calculate descriptor) are fused into
+a single operation, so each chunk of configs goes through all of them in one worker task, without being
+written to and re-read from files in between.  Operations that need all configs at once (barriers, e.g.
+selection) get the output of the preceding operations from memory, or from an optional checkpoint file.
+"""
+
+from ase.atoms import Atoms
+
+from wfl.configset import ConfigSet_in, ConfigSet_out
+from .base import iterable_loop
+from .pool import apply_op
+
+
+def fused_op(atoms, stages):
+    """Apply a sequence of per-item operations to a chunk of configs
+
+    Parameters
+    ----------
+    atoms: list(Atoms)
+        input configs
+    stages: list((callable, int / str, tuple, dict))
+        operations, each with the position (int) or keyword (str) of their iterable argument, and their
+        positional and keyword arguments, as for iterable_loop().  Each operation is called once with
+        the outputs of the previous one for all configs in the chunk.
+
+    Returns
+    -------
+    list of outputs, each a list(Atoms) with outputs of final operation that descend from
+        corresponding input config, or None if there are none
+    """
+    groups = [[at] for at in atoms]
+    for op, iterable_arg, args, kwargs in stages:
+        items = [at for group in groups for at in group]
+        if len(items) > 0:
+            outputs = apply_op(op, iterable_arg, args, kwargs, items)
+        else:
+            outputs = []
+
+        # regroup outputs by input config they descend from, dropping failed (None) ones and
+        # flattening those that return several configs
+        new_groups = []
+        output_i = 0
+        for group in groups:
+            new_group = []
+            for output in outputs[output_i:output_i + len(group)]:
+                if output is None:
+                    continue
+                if isinstance(output, Atoms):
+                    new_group.append(output)
+                else:
+                    new_group.extend(output)
+            output_i += len(group)
+            new_groups.append(new_group)
+        groups = new_groups
+
+    return [group if len(group) > 0 else None for group in groups]
+
+
+class Pipeline:
+    """Chain of operations on configs, run by streaming each chunk of configs through consecutive
+    per-item operations in one task, with intermediate results kept in memory unless a checkpoint
+    is requested
+
+    Example::
+
+        selected = (Pipeline()
+                    .map(minim.run_op, calculator=calc, precon='ID')
+                    .map(simple_filters.InfoAllStartWith(('minim_config_type', 'minim_last')))
+                    .checkpoint(ConfigSet_out(output_files='minima.xyz', all_or_none=True, force=True))
+                    .barrier(convex_hull.select, info_field='minim_energy')
+                    .run(inputs, ConfigSet_out(output_files='selected.xyz')))
+    """
+    def __init__(self):
+        self.stages = []
+
+
+    def map(self, op, *args, iterable_arg=0, **kwargs):
+        """Add a per-item operation
+
+        Parameters
+        ----------
+        op: callable
+            operation, which takes a list of configs and returns a list of the same length with, for each
+            input config, an Atoms, a list(Atoms), or None (e.g. not selected by a filter)
+        iterable_arg: int / str, default 0
+            position or keyword of list of configs in op arguments
+        args, kwargs:
+            positional and keyword arguments of op
+
+        Returns
+        -------
+        self
+        """
+        self.stages.append(('map', (op, iterable_arg, tuple(args), kwargs)))
+        return self
+
+
+    def barrier(self, func, *args, **kwargs):
+        """Add an operation that needs all configs at once, e.g. selection
+
+        Parameters
+        ----------
+        func: callable
+            called as func(inputs, outputs, *args, **kwargs) with ConfigSet_in inputs and ConfigSet_out
+            outputs, returning ConfigSet_in with its outputs, e.g. wfl.select_configs.convex_hull.select
+        args, kwargs:
+            additional positional and keyword arguments of func
+
+        Returns
+        -------
+        self
+        """
+        self.stages.append(('barrier', (func, args, kwargs)))
+        return self
+
+
+    def checkpoint(self, outputs):
+        """Save the output of the previous stage, e.g. to inspect it or to skip the preceding stages when
+        rerunning the pipeline after an interruption
+
+        Parameters
+        ----------
+        outputs: ConfigSet_out
+            where to save configs
+
+        Returns
+        -------
+        self
+        """
+        if len(self.stages) == 0 or self.stages[-1][0] == 'checkpoint':
+            raise ValueError('checkpoint must follow a map or barrier stage')
+        self.stages.append(('checkpoint', outputs))
+        return self
+
+
+    def run(self, inputs, outputs, **iterable_loop_kwargs):
+        """Run the pipeline
+
+        Parameters
+        ----------
+        inputs: ConfigSet_in / list(Atoms)
+            input configs
+        outputs: ConfigSet_out
+            where to write output of final stage.  Output files can only be mapped to input files
+            (output_files dict) if all stages are map stages.  The final stage cannot also have a
+            checkpoint.
+        iterable_loop_kwargs:
+            keyword arguments for iterable_loop() calls that run fused map stages, e.g. npool,
+            chunksize, initializer, executor
+
+        Returns
+        -------
+        ConfigSet_in with output of final stage
+        """
+        if not isinstance(inputs, ConfigSet_in):
+            inputs = ConfigSet_in(input_configs=inputs)
+
+        # group stages into segments of consecutive map stages or a single barrier, each with its output
+        segments = []
+        for kind, stage in self.stages:
+            if kind == 'checkpoint':
+                segments[-1][2] = stage
+            elif kind == 'map' and len(segments) > 0 and segments[-1][0] == 'map' and segments[-1][2] is None:
+                segments[-1][1].append(stage)
+            elif kind == 'map':
+                segments.append(['map', [stage], None])
+            else:
+                segments.append(['barrier', stage, None])
+        if len(segments) > 0 and segments[-1][2] is not None:
+            raise ValueError('checkpoint of final stage would not be written, use run() outputs instead')
+
+        cur = inputs
+        for segment_i, (kind, stage, segment_outputs) in enumerate(segments):
+            if segment_i == len(segments) - 1:
+                segment_outputs = outputs
+            elif segment_outputs is None:
+                # in memory
+                segment_outputs = ConfigSet_out()
+
+            if kind == 'map':
+                cur = iterable_loop(iterable=cur, configset_out=segment_outputs, op=fused_op, stages=stage,
+                                    **iterable_loop_kwargs)
+            else:
+                func, args, kwargs = stage
+                cur = func(cur, segment_outputs, *args, **kwargs)
+
+        return cur
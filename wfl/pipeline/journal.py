@@ -0,0 +1,135 @@
+"""Journal of completed chunks of a pipeline operation, so that an interrupted run can be resumed
+
+The journal is an append-only file of pickled records.  The first record is the hash of the
+operation and its parameters, and each following one is a completed chunk, as its range of
+input item indices, hash of its input items, and its results.  Only the position of each record
+in the file is kept in memory, and results are read back from the file when they are needed.
+"""
+
+import os
+import pickle
+from pathlib import Path
+
+
+def journal_path(configset_out):
+    """Default journal file for a ConfigSet_out, hidden file next to its first output file
+
+    Parameters
+    ----------
+    configset_out: ConfigSet_out
+        output configset
+
+    Returns
+    -------
+    Path or None if configset_out has no output files
+    """
+    if configset_out is None or configset_out.output_files is None or len(configset_out.output_files) == 0:
+        return None
+    output_file = Path(configset_out.output_files[0])
+    return output_file.parent / ('.' + output_file.name + '.wfl_journal')
+
+
+class ChunkJournal:
+    """Journal of completed chunks
+
+    Parameters
+    ----------
+    path: str / Path
+        journal file.  Existing records are reused if it was written by the same op (same op_key),
+        otherwise it is overwritten.
+    op_key: str
+        key identifying op and its parameters, e.g. from wfl.pipeline.cache.op_hash().hexdigest()
+    """
+
+    def __init__(self, path, op_key):
+        self.path = Path(path)
+        self.op_key = op_key
+        # (key, position of record in file) of each chunk, by range of input item indices
+        self.chunks = {}
+
+        good_pos = 0
+        try:
+            with open(self.path, 'rb') as fin:
+                if pickle.load(fin) == op_key:
+                    good_pos = fin.tell()
+                    while True:
+                        try:
+                            start, end, key, _ = pickle.load(fin)
+                        except EOFError:
+                            break
+                        self.chunks[(start, end)] = (key, good_pos)
+                        good_pos = fin.tell()
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # truncated (interrupted while writing) or otherwise corrupted record, keep
+            # everything before it
+            pass
+
+        if good_pos == 0:
+            with open(self.path, 'wb') as fout:
+                pickle.dump(op_key, fout)
+                fout.flush()
+                os.fsync(fout.fileno())
+        else:
+            # drop any partial record at end
+            os.truncate(self.path, good_pos)
+        self._fout = open(self.path, 'ab')
+
+
+    def __len__(self):
+        return len(self.chunks)
+
+
+    def get(self, start, end, key):
+        """Results of a completed chunk
+
+        Parameters
+        ----------
+        start, end: int
+            range of input item indices in chunk
+        key: str
+            hash of items in chunk, from wfl.pipeline.cache.chunk_key()
+
+        Returns
+        -------
+        list of results, or None if chunk is not completed
+        """
+        entry = self.chunks.get((start, end))
+        if entry is None or entry[0] != key:
+            return None
+        with open(self.path, 'rb') as fin:
+            fin.seek(entry[1])
+            return pickle.load(fin)[3]
+
+
+    def record(self, start, end, key, outputs):
+        """Record a completed chunk, synced to disk before returning
+
+        Parameters
+        ----------
+        start, end: int
+            range of input item indices in chunk
+        key: str
+            hash of items in chunk, from wfl.pipeline.cache.chunk_key()
+        outputs: list
+            results of op for each item in chunk
+        """
+        pos = self._fout.tell()
+        pickle.dump((start, end, key, outputs), self._fout)
+        self._fout.flush()
+        os.fsync(self._fout.fileno())
+        self.chunks[(start, end)] = (key, pos)
+
+
+    def close(self, remove=False):
+        """Close journal file
+
+        Parameters
+        ----------
+        remove: bool, default False
+            remove journal file, e.g. because results have been completely written
+        """
+        self._fout.close()
+        if remove:
+            self.path.unlink()
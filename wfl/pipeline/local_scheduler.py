@@ -0,0 +1,226 @@
+"""Local stand-in for a remote queuing system, to test and benchmark remote execution
+(wfl.pipeline.remote.do_remotely) without a configured ExPyRe system
+
+Jobs run as subprocesses on the local host, in their ExPyRe stage directories, after a simulated
+queue delay, on a limited number of simulated nodes, and optionally are killed part way through to
+simulate failures such as preemption.
+"""
+
+import os
+import random
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import expyre.config
+from expyre.schedulers.base import Scheduler
+from expyre.system import System
+
+
+class LocalProcessScheduler(Scheduler):
+    """ExPyRe scheduler that runs jobs as local subprocesses
+
+    Parameters
+    ----------
+    host: str, default None
+        ignored, jobs always run on local host
+    remsh_cmd: str, default None
+        ignored
+    num_nodes: int, default 1
+        number of simulated nodes.  Jobs are started in order of submission once enough nodes are free.
+    queue_delay: float, default 0.0
+        minimum time (sec) each job spends queued after it is submitted
+    failure_rate: float, default 0.0
+        probability of each job being killed, as if its node failed or it was preempted
+    failure_time: float, default 0.0
+        time (sec) after start at which jobs chosen to fail are killed
+    seed: int, default None
+        seed for random choice of jobs that fail
+    """
+    def __init__(self, host=None, remsh_cmd=None, num_nodes=1, queue_delay=0.0, failure_rate=0.0, failure_time=0.0,
+                 seed=None):
+        super().__init__(host, remsh_cmd)
+        self.num_nodes = num_nodes
+        self.queue_delay = queue_delay
+        self.failure_rate = failure_rate
+        self.failure_time = failure_time
+        self.random = random.Random(seed)
+
+        # jobs by remote id, in order of submission
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.n_status_queries = 0
+
+
+    def submit(self, id, remote_dir, partition, commands, max_time, header, node_dict, no_default_header=False,
+               script_exec='/bin/bash', pre_submit_cmds=[], verbose=False):
+        """Submit a job, see expyre.schedulers.slurm.Slurm.submit()
+
+        Returns
+        -------
+        str remote job id
+        """
+        pre_commands = ([f'export EXPYRE_NUM_CORES_PER_NODE={node_dict["num_cores_per_node"]}'] +
+                        Scheduler.node_dict_env_var_commands(node_dict))
+        pre_commands = [line.format(**node_dict) for line in pre_commands]
+        # one single-core task per core, like a typical header of a real system
+        pre_commands += [f'export EXPYRE_NTASKS_PER_NODE={node_dict["num_cores_per_node"]}',
+                         'export EXPYRE_NCORES_PER_TASK=1',
+                         f'cd {remote_dir}']
+
+        script = '#!' + script_exec + '\n'
+        script += '\n'.join([line.rstrip() for line in pre_commands + commands]) + '\n'
+        with open(Path(remote_dir) / 'job.script.local', 'w') as fout:
+            fout.write(script)
+
+        with self.lock:
+            remote_id = str(len(self.jobs) + 1)
+            self.jobs[remote_id] = {'id': id, 'remote_dir': remote_dir, 'script_exec': script_exec,
+                                    'num_nodes': node_dict['num_nodes'], 'max_time': max_time,
+                                    'queued_until': time.monotonic() + self.queue_delay, 'held': False,
+                                    'fail': self.random.random() < self.failure_rate,
+                                    'process': None, 'start_time': None, 'status': 'queued'}
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run_queue, daemon=True)
+                self.thread.start()
+
+        return remote_id
+
+
+    def status(self, remote_ids, verbose=False):
+        """Determine status of jobs, see expyre.schedulers.slurm.Slurm.status()
+
+        Returns
+        -------
+        dict { str remote_id: str status}
+        """
+        if isinstance(remote_ids, str):
+            remote_ids = [remote_ids]
+
+        with self.lock:
+            self.n_status_queries += 1
+            out = {}
+            for remote_id in remote_ids:
+                job = self.jobs.get(remote_id)
+                if job is None:
+                    out[remote_id] = 'done'
+                elif job['status'] == 'queued' and job['held']:
+                    out[remote_id] = 'held'
+                else:
+                    out[remote_id] = job['status']
+        return out
+
+
+    def hold(self, remote_ids, verbose=False):
+        self._set_held(remote_ids, True)
+
+
+    def release(self, remote_ids, verbose=False):
+        self._set_held(remote_ids, False)
+
+
+    def cancel(self, remote_ids, verbose=False):
+        if isinstance(remote_ids, str):
+            remote_ids = [remote_ids]
+        with self.lock:
+            for remote_id in remote_ids:
+                job = self.jobs[remote_id]
+                if job['status'] == 'running':
+                    self._kill(job)
+                if job['status'] in ['queued', 'running']:
+                    job['status'] = 'other'
+
+
+    def _set_held(self, remote_ids, held):
+        if isinstance(remote_ids, str):
+            remote_ids = [remote_ids]
+        with self.lock:
+            for remote_id in remote_ids:
+                self.jobs[remote_id]['held'] = held
+
+
+    def _kill(self, job):
+        # kill job and any processes it started
+        try:
+            os.killpg(job['process'].pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        job['process'].wait()
+
+
+    def _run_queue(self):
+        # update running jobs, and start queued jobs on free nodes, until no jobs are left
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                free_nodes = self.num_nodes
+                for job in self.jobs.values():
+                    if job['status'] != 'running':
+                        continue
+                    elapsed = now - job['start_time']
+                    if job['process'].poll() is not None:
+                        job['status'] = 'done' if job['process'].returncode == 0 else 'failed'
+                    elif job['fail'] and elapsed >= self.failure_time:
+                        self._kill(job)
+                        job['status'] = 'failed'
+                    elif job['max_time'] is not None and elapsed >= job['max_time']:
+                        self._kill(job)
+                        job['status'] = 'timeout'
+                    else:
+                        free_nodes -= job['num_nodes']
+
+                # first come, first served, without backfilling
+                for job in self.jobs.values():
+                    if job['status'] != 'queued' or job['held']:
+                        continue
+                    if now < job['queued_until'] or job['num_nodes'] > free_nodes:
+                        break
+                    with open(Path(job['remote_dir']) / f'job.{job["id"]}.stdout', 'w') as stdout, \
+                         open(Path(job['remote_dir']) / f'job.{job["id"]}.stderr', 'w') as stderr:
+                        job['process'] = subprocess.Popen([job['script_exec'], 'job.script.local'],
+                                                          cwd=job['remote_dir'], stdout=stdout, stderr=stderr,
+                                                          start_new_session=True)
+                    job['start_time'] = now
+                    job['status'] = 'running'
+                    free_nodes -= job['num_nodes']
+
+                if not any([job['status'] in ['queued', 'running'] for job in self.jobs.values()]):
+                    self.thread = None
+                    return
+            time.sleep(0.02)
+
+
+def add_local_system(sys_name='local_sim', num_cores_per_node=None, max_time=None, **scheduler_kwargs):
+    """Add a system that runs jobs with a LocalProcessScheduler to the ExPyRe configuration, so it
+    can be used as RemoteInfo sys_name.  ExPyRe must already be initialized (expyre.config.init()),
+    e.g. with a config.json containing only '{"systems": {}}'.
+
+    Parameters
+    ----------
+    sys_name: str, default 'local_sim'
+        name of system
+    num_cores_per_node: int, default os.cpu_count()
+        number of cores of each simulated node
+    max_time: int, default None
+        max run time (sec) of jobs, None for no limit
+    scheduler_kwargs:
+        keyword arguments of LocalProcessScheduler, e.g. num_nodes, queue_delay, failure_rate
+
+    Returns
+    -------
+    LocalProcessScheduler of system
+    """
+    if expyre.config.db is None:
+        raise RuntimeError('add_local_system requires ExPyRe to be initialized with expyre.config.init()')
+    if num_cores_per_node is None:
+        num_cores_per_node = os.cpu_count()
+
+    scheduler = LocalProcessScheduler(**scheduler_kwargs)
+    # jobs run directly in their stage dirs, since there is no remote host
+    expyre.config.systems[sys_name] = System(host=None, scheduler=lambda host: scheduler,
+                                             partitions={'local': {'num_cores': num_cores_per_node,
+                                                                   'max_time': max_time, 'max_mem': None}})
+    return scheduler
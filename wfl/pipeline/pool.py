@@ -3,12 +3,27 @@ import os
 import warnings
 
 import functools
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import deque, OrderedDict
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from multiprocessing.pool import Pool
 
+from ase.atoms import Atoms
+
 from wfl.configset import ConfigSet_in
 from wfl.mpipool_support import wfl_mpipool
+from wfl.utils.parallel import enable_calculator_cache, evict_calculator
 
-from .utils import grouper
+from .utils import grouper, AutoChunker
+from .cache import get_cache, op_hash, chunk_key
+from .journal import ChunkJournal, journal_path
+from . import transport as shm_transport
+from .supervised import SupervisedPool
 
 
 def _wrapped_op(op, iterable_arg, args, kwargs, item_inputs):
@@ -45,6 +60,8 @@ def _wrapped_op(op, iterable_arg, args, kwargs, item_inputs):
     else:
         u_args = args
         if iterable_arg is not None:
+            # copy, since kwargs may be shared with other calls (e.g. in other threads)
+            kwargs = kwargs.copy()
             kwargs[iterable_arg] = item_list
 
     outputs = op(*u_args, **kwargs)
@@ -53,20 +70,480 @@ def _wrapped_op(op, iterable_arg, args, kwargs, item_inputs):
     return zip(outputs, [item_input[1] for item_input in item_inputs])
 
 
+def apply_op(op, iterable_arg, args, kwargs, items):
+    """Call an operation on a chunk of items in the current process, as a pipeline task would
+
+    Parameters
+    ----------
+    op: callable
+        function to call
+    iterable_arg: int / str
+        position (int) or keyword (str) of list of items in op arguments
+    args: tuple
+        positional args of op
+    kwargs: dict
+        keyword args of op
+    items: list
+        items to pass to op
+
+    Returns
+    -------
+    list with output of op for each item, None for all items if op returned None
+    """
+    return [output for output, _ in _wrapped_op(op, iterable_arg, args, kwargs, [(item, None) for item in items])]
+
+
+def _wrapped_op_shm(op, iterable_arg, args, kwargs, packed_item_inputs):
+    """Wrap an operation like _wrapped_op, but with item inputs and outputs transported through
+    shared memory (see wfl.pipeline.transport)
+
+    Parameters:
+    -----------
+        op, iterable_arg, args, kwargs:
+            see _wrapped_op()
+        packed_item_inputs: 2-tuple
+            header of items packed by transport.pack(), and list of quantities to be passed back
+            with the output
+
+    Returns:
+    -------
+        2-tuple with header of packed outputs, and list of quantities passed back with them
+    """
+    header, passed_back = packed_item_inputs
+    # parent unlinks input block once this task is done
+    items = shm_transport.unpack(header, unlink=False)
+    outputs = [output for output, _ in _wrapped_op(op, iterable_arg, args, kwargs, list(zip(items, passed_back)))]
+    shm, out_header = shm_transport.pack(outputs)
+    # parent unlinks output block after reading it
+    shm.close()
+    return out_header, passed_back
+
+
+# static part of tasks (op, iterable_arg, args, kwargs), set once in each pool worker by _init_worker()
+_worker_static = None
+
+
+def _init_worker(static, initializer, initargs):
+    """Pool worker initializer that stores static arguments of tasks, then calls user initializer
+
+    Parameters:
+    -----------
+        static: tuple
+            (op, iterable_arg, args, kwargs), prepended to item inputs of each task
+        initializer: callable
+            user initializer, called with initargs if not None
+        initargs: list
+            positional arguments for initializer
+    """
+    global _worker_static
+    _worker_static = static
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _static_task(wrapper, task):
+    # call wrapper (_wrapped_op or _wrapped_op_shm) with static arguments stored in this worker
+    return wrapper(*_worker_static, task)
+
+
+# static parts of tasks of recent do_in_pool calls using a persistent pool, by call id
+_worker_call_statics = OrderedDict()
+
+# persistent pool created by persistent_pool() context manager, used by do_in_pool
+_persistent_pool = None
+
+
+def _persistent_static_task(wrapper, task, call_id, static_file):
+    # call wrapper with static arguments of do_in_pool call, loading them (and calling initializer)
+    # the first time this worker gets a task from that call
+    if call_id not in _worker_call_statics:
+        with open(static_file, 'rb') as fin:
+            op, iterable_arg, args, kwargs, initializer, initargs = pickle.load(fin)
+        if initializer is not None:
+            initializer(*initargs)
+        _worker_call_statics[call_id] = (op, iterable_arg, args, kwargs)
+        while len(_worker_call_statics) > 2:
+            _worker_call_statics.popitem(last=False)
+    return wrapper(*_worker_call_statics[call_id], task)
+
+
+class _PersistentPool:
+    # multiprocessing.Pool kept open across do_in_pool calls, with directory for static arguments of calls
+    def __init__(self, npool, max_tasks_per_worker):
+        self.npool = npool
+        self.pid = os.getpid()
+        # start resource tracker before forking, for shared memory transport
+        try:
+            shm_transport.start_resource_tracker()
+        except ImportError:
+            # python < 3.8, no shared memory transport
+            pass
+        self.pool = Pool(npool, maxtasksperchild=max_tasks_per_worker)
+        self.static_dir = tempfile.mkdtemp(prefix='wfl_persistent_pool_')
+        self.n_calls = 0
+
+    def write_static(self, static):
+        self.n_calls += 1
+        call_id = f'{os.getpid()}_{self.n_calls}'
+        static_file = os.path.join(self.static_dir, call_id + '.pckl')
+        with open(static_file, 'wb') as fout:
+            pickle.dump(static, fout)
+        return call_id, static_file
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        shutil.rmtree(self.static_dir, ignore_errors=True)
+
+
+@contextmanager
+def persistent_pool(npool=None, max_tasks_per_worker=None):
+    """Context manager for a multiprocessing pool that is reused by all do_in_pool (and therefore
+    iterable_loop) calls with npool != 0 inside it, rather than starting a new pool for each call.
+    Worker processes, imported modules, and calculators cached by
+    wfl.utils.parallel.construct_calculator_picklesafe persist from one call to the next.
+
+    Parameters
+    ----------
+    npool: int, default os.environ['WFL_AUTOPARA_NPOOL']
+        number of worker processes
+    max_tasks_per_worker: int, default None
+        replace each worker process after it has done this many tasks (chunks), e.g. to contain
+        memory leaks.  None to keep workers for the lifetime of the pool.
+
+    Yields
+    ------
+    multiprocessing.pool.Pool
+    """
+    global _persistent_pool
+
+    if npool is None:
+        npool = int(os.environ.get('WFL_AUTOPARA_NPOOL', 0))
+    if npool <= 0:
+        raise ValueError(f'persistent_pool requires npool > 0, got {npool}')
+    if _persistent_pool is not None and _persistent_pool.pid == os.getpid():
+        raise RuntimeError('persistent_pool cannot be nested')
+    if wfl_mpipool:
+        warnings.warn('persistent_pool is not used with mpipool')
+
+    _persistent_pool = _PersistentPool(npool, max_tasks_per_worker)
+    try:
+        yield _persistent_pool.pool
+    finally:
+        _persistent_pool.close()
+        _persistent_pool = None
+
+
+class _TaskWindow:
+    # limit on number of tasks handed out to pool but not yet released by consumer of results, so
+    # that pool does not run arbitrarily far ahead of consumer (e.g. reorder buffer)
+    def __init__(self, size):
+        self.semaphore = threading.Semaphore(size) if size is not None else None
+        self.closed = False
+
+    def tasks(self, tasks):
+        # yield (task index, task) pairs, waiting for a free slot before each one
+        for task_i, task in enumerate(tasks):
+            if self.semaphore is not None:
+                # check periodically if window was closed, so pool is never stuck waiting
+                while not self.semaphore.acquire(timeout=1.0):
+                    if self.closed:
+                        return
+            if self.closed:
+                return
+            yield task_i, task
+
+    def release(self):
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+    def close(self):
+        self.closed = True
+        self.release()
+
+
+def _indexed_task(task_f, indexed_task):
+    # call task_f on a task, returning its index along with result.  Runs in pool workers, where
+    # calculators are cached so they are constructed once per worker rather than once per chunk
+    enable_calculator_cache()
+    task_i, task = indexed_task
+    return task_i, task_f(task)
+
+
+def _shm_tasks(indexed_tasks, sent_shms):
+    # pack each chunk into shared memory, keeping track of blocks by task index so they can be unlinked later
+    for task_i, items_inputs_group in indexed_tasks:
+        shm, header = shm_transport.pack([item_input[0] for item_input in items_inputs_group])
+        sent_shms[task_i] = shm
+        yield task_i, (header, [item_input[1] for item_input in items_inputs_group])
+
+
+def _shm_results(results, sent_shms):
+    # unpack results from shared memory, unlinking input blocks of completed tasks
+    try:
+        for task_i, (out_header, passed_back) in results:
+            shm = sent_shms.pop(task_i)
+            shm.close()
+            shm.unlink()
+            yield task_i, zip(shm_transport.unpack(out_header), passed_back)
+    finally:
+        for shm in sent_shms.values():
+            shm.close()
+            shm.unlink()
+        sent_shms.clear()
+
+
+def _executor_map(executor, f, tasks, max_in_flight=None, ordered=True):
+    """Map over tasks with a concurrent.futures-style executor (e.g. mpipool.MPIExecutor), with at most
+    max_in_flight tasks submitted but not yet returned
+
+    Parameters:
+    -----------
+        executor: Executor
+            executor with submit() method
+        f: callable
+            function to call on each task
+        tasks: iterable
+            tasks, read only as free slots become available
+        max_in_flight: int, default None
+            maximum number of tasks submitted whose results have not been returned, None for no limit
+        ordered: bool, default True
+            return results in order of tasks, otherwise in order of completion
+
+    Returns:
+    -------
+        iterator over results
+    """
+    tasks = iter(tasks)
+    pending = deque()
+    tasks_left = True
+    try:
+        while True:
+            while tasks_left and (max_in_flight is None or len(pending) < max_in_flight):
+                try:
+                    task = next(tasks)
+                except StopIteration:
+                    tasks_left = False
+                    break
+                pending.append(executor.submit(f, task))
+            if len(pending) == 0:
+                return
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield future.result()
+    finally:
+        # if closed early, e.g. after an exception, don't start tasks that are still queued
+        for future in pending:
+            future.cancel()
+
+
+def _drain_after_error(results, window):
+    # on first exception from pool, stop handing out tasks but keep collecting results of tasks already
+    # running, so they can be journaled or cached, then re-raise exception
+    results = iter(results)
+    exc = None
+    while True:
+        try:
+            result = next(results)
+        except StopIteration:
+            break
+        except Exception as cur_exc:
+            if exc is None:
+                exc = cur_exc
+                window.close()
+            continue
+        yield result
+    if exc is not None:
+        raise exc
+
+
+def _ordered_results(results, window, ordered):
+    # yield (task index, result group) pairs in order of task index if ordered, buffering results
+    # that complete early, otherwise as they complete, freeing a window slot for each one
+    buffered = {}
+    next_i = 0
+    for task_i, result_group in results:
+        if not ordered:
+            window.release()
+            yield task_i, result_group
+            continue
+        buffered[task_i] = result_group
+        while next_i in buffered:
+            window.release()
+            yield next_i, buffered.pop(next_i)
+            next_i += 1
+
+
+def _supervised_tasks(indexed_tasks):
+    # remove failure marks left in items by an earlier run, like do_remotely does
+    for task_i, items_inputs_group in indexed_tasks:
+        for item, _ in items_inputs_group:
+            if isinstance(item, Atoms) and 'WFL_TASK_FAILED' in item.info:
+                del item.info['WFL_TASK_FAILED']
+        yield task_i, items_inputs_group
+
+
+def _failed_task(indexed_task, reason):
+    # result of a chunk that failed all its attempts, with inputs marked as failed instead of outputs
+    task_i, items_inputs_group = indexed_task
+    warnings.warn(f'Chunk of {len(items_inputs_group)} items failed, marking with info["WFL_TASK_FAILED"]: {reason}')
+    outputs = []
+    for item, passed_back in items_inputs_group:
+        if isinstance(item, Atoms):
+            item = item.copy()
+            item.info['WFL_TASK_FAILED'] = True
+        else:
+            item = None
+        outputs.append((item, passed_back))
+    return task_i, outputs
+
+
+def _lpt_order(items_inputs, cost_fn, cost_key):
+    # sort items by decreasing cost (longest processing time first), passing back original index
+    # along with the original passed back quantity
+    items_inputs = list(items_inputs)
+    if cost_fn is not None:
+        costs = [cost_fn(item_input[0]) for item_input in items_inputs]
+    else:
+        costs = [item_input[0].info[cost_key] for item_input in items_inputs]
+    order = sorted(range(len(items_inputs)), key=lambda item_i: -costs[item_i])
+    return [(items_inputs[item_i][0], (item_i, items_inputs[item_i][1])) for item_i in order]
+
+
+def _restore_order(results, ordered=True):
+    # reorder results of items that were sorted by _lpt_order() back to the original order,
+    # yielding each as soon as all earlier ones are available, or if not ordered just remove
+    # original index
+    buffered = {}
+    next_i = 0
+    for result_group in results:
+        if not ordered:
+            yield [(output, passed_back) for output, (_, passed_back) in result_group]
+            continue
+        for output, (item_i, passed_back) in result_group:
+            buffered[item_i] = (output, passed_back)
+        ordered_group = []
+        while next_i in buffered:
+            ordered_group.append(buffered.pop(next_i))
+            next_i += 1
+        yield ordered_group
+
+
+def _report_done(results, chunker):
+    # report each completed chunk to the AutoChunker that created it
+    for task_i, result_group in results:
+        result_group = list(result_group)
+        chunker.done(len(result_group))
+        yield task_i, result_group
+
+
+class _DoneChunks:
+    """Look up each chunk in journal and cache as it is read from the iterable, passing on only the
+    chunks that need to be computed, and keep track of the order of done and computed chunks so their
+    results can be merged.  Chunks may be read in a pool's task handler thread, so the record of
+    chunk order is a deque, appended to by the reader and consumed by the thread merging results.
+    """
+    def __init__(self, base_hash, journal, cache):
+        self.base_hash = base_hash
+        self.journal = journal
+        self.cache = cache
+        # for each chunk in order, (None, zip of outputs and passed back quantities) if done, else (task index, None)
+        self.entries = deque()
+        # key and range of items of each chunk that is computed, by task index
+        self.todo = {}
+        self.n_chunks = 0
+        self.n_done = 0
+
+
+    def chunks(self, chunks):
+        # yield chunks that are not yet done
+        chunk_start = 0
+        task_i = 0
+        for chunk in chunks:
+            key = chunk_key(self.base_hash, [item_input[0] for item_input in chunk])
+            chunk_range = (chunk_start, chunk_start + len(chunk))
+            chunk_start += len(chunk)
+            self.n_chunks += 1
+
+            chunk_done_outputs = self.journal.get(*chunk_range, key) if self.journal is not None else None
+            if chunk_done_outputs is None and self.cache is not None:
+                chunk_done_outputs = self.cache.get(key)
+
+            if chunk_done_outputs is not None:
+                self.n_done += 1
+                self.entries.append((None, zip(chunk_done_outputs, [item_input[1] for item_input in chunk])))
+            else:
+                # record before yielding, so entry exists by the time its result comes back
+                self.todo[task_i] = (key, chunk_range)
+                self.entries.append((task_i, None))
+                task_i += 1
+                yield chunk
+
+
+    def store(self, results):
+        # store (task index, result group) pairs in journal and (unless some items failed) in cache as soon as
+        # they are available.  Chunks that failed all attempts in a SupervisedPool are stored in neither, so
+        # they are rerun next time
+        for task_i, result_group in results:
+            key, chunk_range = self.todo.pop(task_i)
+            result_group = list(result_group)
+            chunk_outputs = [result[0] for result in result_group]
+            task_failed = any([isinstance(output, Atoms) and 'WFL_TASK_FAILED' in output.info
+                               for output in chunk_outputs])
+            if self.journal is not None and not task_failed:
+                self.journal.record(*chunk_range, key, chunk_outputs)
+            if self.cache is not None and not task_failed and all([output is not None for output in chunk_outputs]):
+                self.cache.put(key, chunk_outputs)
+            yield task_i, result_group
+
+
+    def merge(self, results, ordered=True):
+        # merge (task index, result group) pairs of computed chunks, in order of task index if ordered, with
+        # results of chunks that were already done, in original order if ordered, otherwise as soon as possible
+        for task_i, result_group in results:
+            if ordered:
+                while self.entries[0][0] is None:
+                    yield self.entries.popleft()[1]
+                entry_task_i, _ = self.entries.popleft()
+                assert entry_task_i == task_i
+            else:
+                yield from self._pop_done()
+            yield result_group
+        # all chunks have been read once all results are available
+        yield from self._pop_done()
+
+
+    def _pop_done(self):
+        while len(self.entries) > 0:
+            entry_task_i, done_group = self.entries.popleft()
+            if entry_task_i is None:
+                yield done_group
+
+
 # do we want to allow for ops that only take singletons, not iterables, as input, maybe with chunksize=0?
 # that info would have to be passed down to _wrapped_op so it passes a singleton rather than a list into op
 #
 # some ifs (int positional vs. str keyword) could be removed if we required that the iterable be passed into a kwarg.
 def do_in_pool(npool=None, chunksize=1, iterable=None, configset_out=None, op=None, iterable_arg=0,
-               skip_failed=True, initializer=None, initargs=None, args=[], kwargs={}):
+               skip_failed=True, initializer=None, initargs=None, args=[], kwargs={}, hash_ignore=[], cache=None,
+               journal=None, transport='pickle', cost_fn=None, cost_key=None, ordered=True,
+               in_flight_per_process=4, executor='processes', task_timeout=None, task_retries=0, speculative=False):
     """parallelize some operation over an iterable
     
     Parameters
     ----------
     npool: int, default os.environ['WFL_AUTOPARA_NPOOL']
-        number of processes to parallelize over, 0 for running in serial
-    chunksize: int, default 1
-        number of items from iterable to pass to kach invocation of operation
+        number of processes to parallelize over, 0 for running in serial.  Inside a persistent_pool()
+        context, any npool > 0 uses the persistent pool, and the default is its number of processes.
+    chunksize: int / 'auto', default 1
+        number of items from iterable to pass to kach invocation of operation.  If 'auto', sized to take
+        os.environ['WFL_AUTOPARA_CHUNK_TARGET_TIME'] (default 1 s) each based on measured throughput,
+        and shrinking towards the end of the iterable (see wfl.pipeline.utils.AutoChunker).  'auto' is
+        1 when cache or journal are used, since their chunks must be reproducible.
     iterable: iterable, default None
         iterable to loop over, often ConfigSet_in but could also be other things like range()
     configset_out: ConfigSet_out, defaulat None
@@ -84,7 +561,61 @@ def do_in_pool(npool=None, chunksize=1, iterable=None, configset_out=None, op=No
     args: list
         positional arguments to op
     kwargs: dict
-        keyword arguments to op
+        keyword arguments to op.  With multiprocessing.Pool, op, args and kwargs are sent to each
+        worker once, when it starts, rather than with each chunk.
+    hash_ignore: list(int / str), default []
+        args (int) and kwargs (str) of op to ignore when computing keys of cached results
+    cache: ResultCache / str / Path, default None
+        cache of results of each chunk (see wfl.pipeline.cache), or its directory. Chunks whose op, args,
+        kwargs, and inputs are unchanged are not rerun. If None, use env var WFL_AUTOPARA_CACHE_DIR if set.
+    journal: bool / str / Path, default None
+        journal results of each chunk as it is completed to this file (see wfl.pipeline.journal), or if
+        True to a hidden file next to first output file of configset_out.  A rerun with same op, args,
+        kwargs, and inputs (e.g. after the previous one was killed) reuses the journaled chunks.
+        Journal is removed once output is complete.  If None, True if env var WFL_AUTOPARA_JOURNAL is set.
+    transport: 'pickle' / 'shared_memory', default 'pickle'
+        how to pass items and results between parent and multiprocessing.Pool workers.  'shared_memory'
+        places numeric arrays of Atoms in multiprocessing.shared_memory blocks and pickles only
+        the rest (info, non-numeric arrays, etc), which is faster for large configs.  Ignored for
+        serial and mpipool execution.
+    cost_fn: callable, default None
+        function returning estimated cost (e.g. time) of an item, e.g. len(at)**3 * n_kpoints for DFT.
+        If present, all items are read in advance and run in order of decreasing cost (longest
+        processing time first), so that expensive items do not start last.  Outputs are still
+        written in the original order.
+    cost_key: str, default None
+        Atoms.info key containing estimated cost of each item, alternative to cost_fn
+    ordered: bool, default True
+        write results in same order as iterable.  Chunks may complete out of order, and are held
+        in a reorder buffer until all earlier chunks are done.  If False, results are written as soon
+        as they are available, for consumers that do not care about order (from_input_file mapping
+        to output files is still maintained).
+    in_flight_per_process: int, default 4
+        maximum number of chunks per pool process that are read from iterable but whose results have
+        not been written yet (queued, running, or in reorder buffer), so that memory use is proportional
+        to number of processes rather than length of iterable.  None for no limit.
+    executor: 'processes' / 'threads', default 'processes'
+        run op in npool processes (multiprocessing.Pool, or mpipool if enabled), or in npool threads of
+        this process (concurrent.futures.ThreadPoolExecutor), e.g. for ops that mostly wait for external
+        executables such as DFT codes, avoiding memory use of processes and pickling of items.  Ops run in
+        threads must not change the working directory except with wfl.utils.misc.chdir(), and should get
+        calculators as (constructor, args, kwargs) recipes, which construct_calculator_picklesafe() keeps
+        separately for each thread, rather than as a shared Calculator.  transport and persistent_pool()
+        are not used with threads.
+    task_timeout: float, default None
+        wall time limit (sec) per item.  A chunk that takes longer than task_timeout times its number of
+        items is killed, together with any subprocesses (e.g. DFT codes) started by op.  If task_timeout,
+        task_retries, or speculative are set, chunks are run by a wfl.pipeline.supervised.SupervisedPool,
+        and a chunk that times out, raises an exception, or whose process dies is rerun up to task_retries
+        times.  If it still fails, its input configs are written to the output with
+        info['WFL_TASK_FAILED'] = True (other items become None) rather than raising.  Only used with
+        executor='processes' and npool > 0, without mpipool or persistent_pool(), and with
+        transport='pickle'.
+    task_retries: int, default 0
+        number of times to rerun a chunk that failed
+    speculative: bool, default False
+        once all chunks have been handed out, run duplicates of chunks that have been running longer
+        than the median chunk on idle processes, keeping whichever result comes first
 
     Returns
     -------
@@ -92,9 +623,33 @@ def do_in_pool(npool=None, chunksize=1, iterable=None, configset_out=None, op=No
     """
     if initargs is None:
         initargs = []
+    if transport not in ['pickle', 'shared_memory']:
+        raise ValueError(f'Unknown transport {transport}')
+    if executor not in ['processes', 'threads']:
+        raise ValueError(f'Unknown executor {executor}')
+
+    # ignore persistent pool inherited by worker processes forked after it was created
+    if _persistent_pool is not None and _persistent_pool.pid == os.getpid():
+        persistent = _persistent_pool
+    else:
+        persistent = None
 
     if npool is None:
-        npool = int(os.environ.get('WFL_AUTOPARA_NPOOL', 0))
+        if persistent is not None:
+            npool = persistent.npool
+        else:
+            npool = int(os.environ.get('WFL_AUTOPARA_NPOOL', 0))
+
+    supervised = False
+    if task_timeout is not None or task_retries > 0 or speculative:
+        if npool > 0 and executor == 'processes' and not wfl_mpipool and persistent is None:
+            supervised = True
+            if transport != 'pickle':
+                warnings.warn(f'transport {transport} is not used with task_timeout, task_retries, or speculative')
+                transport = 'pickle'
+        else:
+            warnings.warn('task_timeout, task_retries, and speculative are only used with executor="processes" '
+                          'and npool > 0, without mpipool or persistent_pool')
 
     # actually do the work locally
     if configset_out is not None:
@@ -102,12 +657,101 @@ def do_in_pool(npool=None, chunksize=1, iterable=None, configset_out=None, op=No
 
     did_no_work = True
 
+    cache = get_cache(cache)
+    if journal is None:
+        journal = journal_path(configset_out) if 'WFL_AUTOPARA_JOURNAL' in os.environ else None
+    elif journal is True:
+        journal = journal_path(configset_out)
+        if journal is None:
+            warnings.warn('Not journaling completed chunks because there are no output files')
+    elif journal is False:
+        journal = None
+
+    if cache is not None or journal is not None:
+        try:
+            base_hash = op_hash(op, args, kwargs, hash_ignore, initializer, initargs)
+        except Exception as exc:
+            warnings.warn(f'Not using cache or journal for {op} because its arguments cannot be hashed: {exc}')
+            cache = None
+            journal = None
+
     if isinstance(iterable, ConfigSet_in):
-        items_inputs_generator = grouper(chunksize, ((item, iterable.get_current_input_file()) for item in iterable))
+        items_inputs = ((item, iterable.get_current_input_file()) for item in iterable)
+    else:
+        items_inputs = ((item, None) for item in iterable)
+
+    if cost_fn is not None or cost_key is not None:
+        items_inputs = _lpt_order(items_inputs, cost_fn, cost_key)
+
+    chunker = None
+    if chunksize == 'auto':
+        if cache is not None or journal is not None:
+            # chunks must be reproducible to be found in cache or journal
+            chunksize = 1
+        else:
+            # only if known without an extra pass over inputs
+            if isinstance(items_inputs, list):
+                n_items = len(items_inputs)
+            elif isinstance(iterable, ConfigSet_in):
+                n_items = iterable.len_if_known()
+            else:
+                try:
+                    n_items = len(iterable)
+                except TypeError:
+                    n_items = None
+            # thread pool, mpipool and supervised pool tasks are submitted and results consumed in same thread, so
+            # chunker cannot wait for them, but the tasks are only read as slots become available
+            chunker = AutoChunker(items_inputs, npool, n_items=n_items,
+                                  max_outstanding=None if (npool > 0 and (executor == 'threads' or wfl_mpipool or
+                                                                          supervised))
+                                  else -1)
+    if chunker is not None:
+        items_inputs_generator = iter(chunker)
     else:
-        items_inputs_generator = grouper(chunksize, ((item, None) for item in iterable))
+        items_inputs_generator = grouper(chunksize, items_inputs)
 
-    if npool > 0:
+    done_chunks = None
+    if cache is not None or journal is not None:
+        # look up chunks as they are read, so iterable is still streamed
+        if journal is not None:
+            journal = ChunkJournal(journal, base_hash.hexdigest())
+        done_chunks = _DoneChunks(base_hash, journal, cache)
+        items_inputs_generator = done_chunks.chunks(items_inputs_generator)
+
+    if npool > 0 and (executor == 'threads' or wfl_mpipool or supervised):
+        # thread pool or mpipool tasks are submitted in this thread by _executor_map, which bounds them itself,
+        # and supervised pool tasks are read in this thread only when a process is free
+        window = _TaskWindow(None)
+    else:
+        # bound number of chunks that are read, queued, running, or waiting in reorder buffer behind a slow
+        # chunk, so memory is proportional to pool size rather than size of iterable
+        window = _TaskWindow(in_flight_per_process * max(npool, 1) if in_flight_per_process is not None else None)
+    indexed_tasks = window.tasks(items_inputs_generator)
+
+    thread_pool = None
+    if npool > 0 and executor == 'threads':
+        # use threads in this process, no pickling of op, args, kwargs, or items
+        sys.stderr.write(f'Running {op} with {npool} threads, chunksize={chunksize}\n')
+        thread_pool = ThreadPoolExecutor(npool, initializer=initializer, initargs=initargs)
+        thread_results = _executor_map(thread_pool,
+                                       functools.partial(_indexed_task, functools.partial(_wrapped_op, op,
+                                                                                          iterable_arg, args,
+                                                                                          kwargs)),
+                                       indexed_tasks, max_in_flight=(in_flight_per_process * npool
+                                                                     if in_flight_per_process is not None else None),
+                                       ordered=ordered)
+        results = thread_results
+    elif supervised:
+        sys.stderr.write(f'Running {op} with npool={npool} supervised processes, chunksize={chunksize}\n')
+        # workers are forked, so static op, args, and kwargs are not pickled
+        pool = SupervisedPool(npool, functools.partial(_indexed_task, functools.partial(_static_task, _wrapped_op)),
+                              initializer=_init_worker,
+                              initargs=((op, iterable_arg, args, kwargs), initializer, initargs),
+                              timeout=((lambda indexed_task: task_timeout * len(indexed_task[1]))
+                                       if task_timeout is not None else None),
+                              retries=task_retries, speculative=speculative, on_fail=_failed_task)
+        results = pool.imap_unordered(_supervised_tasks(indexed_tasks))
+    elif npool > 0:
         # use multiprocessing
         sys.stderr.write(f'Running {op} with npool={npool}, chunksize={chunksize}\n')
         if wfl_mpipool:
@@ -119,46 +763,109 @@ def do_in_pool(npool=None, chunksize=1, iterable=None, configset_out=None, op=No
                 _ = wfl_mpipool.map(functools.partial(_wrapped_op, initializer, None, initargs, {}),
                                     grouper(1, ((None, None) for i in range(wfl_mpipool.size))))
             pool = wfl_mpipool
+            # mpipool cannot address each worker, so static arguments are sent with every task
+            results = _executor_map(pool, functools.partial(_indexed_task, functools.partial(_wrapped_op, op,
+                                                                                             iterable_arg, args,
+                                                                                             kwargs)),
+                                    indexed_tasks, max_in_flight=(in_flight_per_process * pool.size
+                                                                  if in_flight_per_process is not None else None),
+                                    ordered=ordered)
         else:
-            if initializer is not None:
-                initializer_args = {'initializer': initializer, 'initargs': initargs}
+            if persistent is not None:
+                if npool != persistent.npool:
+                    warnings.warn(f'persistent pool ignores npool={npool}, uses its {persistent.npool} processes')
+                pool = persistent.pool
+                # workers load static op, args, and kwargs from file once per call
+                call_id, static_file = persistent.write_static((op, iterable_arg, args, kwargs,
+                                                                initializer, initargs))
+                task_f = functools.partial(_persistent_static_task, call_id=call_id, static_file=static_file)
             else:
-                initializer_args = {}
-            pool = Pool(npool, **initializer_args)
-
-        if wfl_mpipool:
-            map_f = pool.map
-        else:
-            map_f = pool.imap
-        results = map_f(functools.partial(_wrapped_op, op, iterable_arg, args, kwargs), items_inputs_generator)
-
-        if not wfl_mpipool:
-            # only close pool if its from multiprocessing.pool
-            pool.close()
+                if transport == 'shared_memory':
+                    # start resource tracker before forking, so workers share it
+                    shm_transport.start_resource_tracker()
+                # send static op, args, and kwargs to each worker once, so each task only contains its items
+                pool = Pool(npool, initializer=_init_worker,
+                            initargs=((op, iterable_arg, args, kwargs), initializer, initargs))
+                task_f = _static_task
 
-        # always loop over results to trigger lazy imap()
-        for result_group in results:
-            if configset_out is not None:
-                for at, from_input_file in result_group:
-                    if skip_failed and at is None:
-                        continue
-                    did_no_work = False
-                    configset_out.write(at, from_input_file=from_input_file)
+            # results in order of completion, reordered below if needed, so that a slow chunk does not
+            # hold up results of chunks that complete after it
+            map_f = pool.imap_unordered
+            if transport == 'shared_memory':
+                sent_shms = {}
+                results = map_f(functools.partial(_indexed_task, functools.partial(task_f, _wrapped_op_shm)),
+                                _shm_tasks(indexed_tasks, sent_shms))
+            else:
+                results = map_f(functools.partial(_indexed_task, functools.partial(task_f, _wrapped_op)),
+                                indexed_tasks)
+            if cache is not None or journal is not None:
+                results = _drain_after_error(results, window)
+            if transport == 'shared_memory':
+                results = _shm_results(results, sent_shms)
 
+            if persistent is None:
+                # only close pool if its from multiprocessing.pool and not persistent
+                pool.close()
     else:
         # do directly, still not trivial because of chunksize
-        for items_inputs_group in items_inputs_generator:
-            result_group = _wrapped_op(op, iterable_arg, args, kwargs, items_inputs_group)
+        results = ((task_i, _wrapped_op(op, iterable_arg, args, kwargs, items_inputs_group))
+                   for task_i, items_inputs_group in indexed_tasks)
+
+    if chunker is not None:
+        results = _report_done(results, chunker)
+    if done_chunks is not None:
+        results = done_chunks.store(results)
+    results = _ordered_results(results, window, ordered)
+    if done_chunks is not None:
+        results = done_chunks.merge(results, ordered)
+    else:
+        results = (result_group for _, result_group in results)
+    if cost_fn is not None or cost_key is not None:
+        results = _restore_order(results, ordered)
+
+    if npool == 0:
+        # calculators constructed by serial op are only reused within this call
+        cache_was_enabled = enable_calculator_cache()
 
+    # always loop over results to trigger lazy imap()
+    try:
+        for result_group in results:
             if configset_out is not None:
                 for at, from_input_file in result_group:
                     if skip_failed and at is None:
                         continue
                     did_no_work = False
                     configset_out.write(at, from_input_file=from_input_file)
+    finally:
+        # make sure pool stops waiting for more chunks, e.g. if op raised an exception
+        window.close()
+        if chunker is not None:
+            chunker.close()
+        if thread_pool is not None:
+            # cancels chunks submitted but not started
+            thread_results.close()
+            thread_pool.shutdown(wait=False)
+        if supervised:
+            pool.close()
+        if npool == 0:
+            evict_calculator()
+            enable_calculator_cache(cache_was_enabled)
+
+    if done_chunks is not None and done_chunks.n_done > 0:
+        sys.stderr.write(f'Reused journaled or cached results for {done_chunks.n_done} of {done_chunks.n_chunks} '
+                         f'chunks of {op}\n')
 
     if configset_out is not None:
         configset_out.end_write()
+
+    if npool > 0 and executor == 'processes' and not wfl_mpipool and persistent is not None:
+        os.remove(static_file)
+
+    if journal is not None:
+        # all results are now safely in their final location
+        journal.close(remove=True)
+
+    if configset_out is not None:
         if did_no_work:
             return ConfigSet_in()
         else:
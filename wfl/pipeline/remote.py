@@ -1,18 +1,156 @@
 import sys
 import os
+import re
+import json
+import pickle
+import time
 import warnings
+from pathlib import Path
+
+import numpy as np
 
 from ase.atoms import Atoms
 
-from wfl.configset import ConfigSet_in, ConfigSet_out
+from wfl.configset import ConfigSet_in
 from .utils import grouper, RemoteInfo
-from .pool import do_in_pool
+from .pool import do_in_pool, apply_op
+
+import expyre.config
+from expyre import ExPyRe, ExPyReTimeoutError
+from expyre.resources import Resources
+from expyre.units import time_to_sec
+
+
+# directory (relative to remote job run dir) where outputs of items are saved as they are completed
+_ITEM_RESULTS_DIR = '_wfl_item_results'
+
+
+def _item_results_op(indexed_items, op, iterable_arg, args, kwargs, results_dir):
+    # call op on chunk of (item index, item) pairs, and save output of each item by its index as soon
+    # as chunk is done, so that outputs of completed items can be harvested even if job does not finish
+    outputs = apply_op(op, iterable_arg, args, kwargs, [item for _, item in indexed_items])
+    os.makedirs(results_dir, exist_ok=True)
+    results_file = Path(results_dir) / f'{indexed_items[0][0]}.pckl'
+    with open(str(results_file) + '.tmp', 'wb') as fout:
+        pickle.dump(dict(zip([item_i for item_i, _ in indexed_items], outputs)), fout)
+    os.replace(str(results_file) + '.tmp', results_file)
+    # outputs are returned from saved files, not through pool
+    return None
+
+
+def _harvest_item_results(results_dir):
+    # outputs of all items saved by _item_results_op, by item index
+    outputs = {}
+    for results_file in Path(results_dir).glob('*.pckl'):
+        with open(results_file, 'rb') as fin:
+            outputs.update(pickle.load(fin))
+    return outputs
+
+
+def _run_items(indexed_items, chunksize, op, iterable_arg, skip_failed, initializer, initargs, args, kwargs):
+    """run op on items in a remote job, saving outputs of items as they are completed
+
+    Parameters
+    ----------
+    indexed_items: list((int, item))
+        items, each with its index among all items of do_remotely() call
+
+    See pipeline.iterable_loop() for other args
+
+    Returns
+    -------
+    dict with output of each item, by index
+    """
+    # remote job will have to set npool appropriately for its node
+    do_in_pool(npool=None, chunksize=chunksize, iterable=indexed_items, configset_out=None, op=_item_results_op,
+               skip_failed=skip_failed, initializer=initializer, initargs=initargs, args=(),
+               kwargs={'op': op, 'iterable_arg': iterable_arg, 'args': args, 'kwargs': kwargs,
+                       'results_dir': _ITEM_RESULTS_DIR})
+    return _harvest_item_results(_ITEM_RESULTS_DIR)
+
+
+def _remote_status(xpr):
+    # remote (queuing system) status of job as of last sync of status, None if not synced yet
+    return list(expyre.config.db.jobs(id=re.escape(xpr.id)))[0]['remote_status']
+
+
+def _num_workers(remote_info):
+    # number of items a job processes concurrently, by default one per core
+    if remote_info.num_workers is not None:
+        return remote_info.num_workers
+    resources = Resources(**remote_info.resources)
+    if resources.n[1] == 'cores':
+        return resources.n[0]
+    _, node_dict = resources.find_nodes(expyre.config.systems[remote_info.sys_name].partitions,
+                                        exact_fit=remote_info.exact_fit, partial_node=remote_info.partial_node)
+    return node_dict['num_cores']
+
+
+def _timings_file(remote_info):
+    if remote_info.timings_file is not None:
+        return Path(remote_info.timings_file)
+    if expyre.config.local_stage_dir is None:
+        return None
+    return Path(expyre.config.local_stage_dir) / 'wfl_item_times.json'
+
+
+def _item_time(remote_info):
+    # time per item (or unit of cost) for one worker, given or measured in previous run
+    if remote_info.item_time is not None:
+        return remote_info.item_time
+    timings_file = _timings_file(remote_info)
+    if timings_file is None or not timings_file.is_file():
+        return None
+    with open(timings_file) as fin:
+        return json.load(fin).get(remote_info.job_name)
+
+
+def _record_item_time(remote_info, xprs, job_costs, num_workers, quiet=False):
+    # record time per item (or unit of cost) for one worker, from run times of jobs that succeeded
+    item_times = []
+    for xpr, job_cost in zip(xprs, job_costs):
+        try:
+            started = (xpr.stage_dir / '_expyre_job_started').stat().st_mtime
+            succeeded = (xpr.stage_dir / '_expyre_job_succeeded').stat().st_mtime
+        except (AttributeError, OSError):
+            continue
+        if job_cost > 0:
+            item_times.append((succeeded - started) * num_workers / job_cost)
+
+    timings_file = _timings_file(remote_info)
+    if len(item_times) == 0 or timings_file is None:
+        return
+
+    item_time = float(np.median(item_times))
+    if not quiet:
+        sys.stderr.write(f'Measured time per item {item_time:.3g} s for {remote_info.job_name}\n')
+    timings = {}
+    if timings_file.is_file():
+        with open(timings_file) as fin:
+            timings = json.load(fin)
+    timings[remote_info.job_name] = item_time
+    with open(timings_file, 'w') as fout:
+        json.dump(timings, fout, indent=4)
+
 
-from expyre import ExPyRe
+def _pack_jobs(items_inputs_costs, job_cost):
+    # group consecutive items into jobs with total cost up to job_cost, each with at least one item
+    job = []
+    job_total = 0.0
+    for item_input_cost in items_inputs_costs:
+        if len(job) > 0 and job_total + item_input_cost[2] > job_cost:
+            yield job
+            job = []
+            job_total = 0.0
+        job.append(item_input_cost)
+        job_total += item_input_cost[2]
+    if len(job) > 0:
+        yield job
 
 
 def do_remotely(remote_info, hash_ignore=[], chunksize=1, iterable=None, configset_out=None, op=None, iterable_arg=0,
-                skip_failed=True, initializer=None, initargs=None, args=[], kwargs={}, quiet=False):
+                skip_failed=True, initializer=None, initargs=None, args=[], kwargs={}, quiet=False, cost_fn=None,
+                cost_key=None):
     """run tasks as series of remote jobs
 
     Parameters
@@ -21,6 +159,10 @@ def do_remotely(remote_info, hash_ignore=[], chunksize=1, iterable=None, configs
         object with all information on remote job, including system, resources, job chunksize, etc, or dict of kwargs for its constructor
     quiet: bool, default False
         do not output (to stderr) progress info
+    cost_fn: callable, default None
+        estimated cost of an item, used to pack items into jobs with job_chunksize='auto'
+    cost_key: str, default None
+        Atoms.info key with estimated cost of each item, alternative to cost_fn
 
     See pipeline.iterable_loop() for other args
     """
@@ -30,52 +172,103 @@ def do_remotely(remote_info, hash_ignore=[], chunksize=1, iterable=None, configs
     if not isinstance(remote_info, RemoteInfo):
         remote_info = RemoteInfo(**remote_info)
 
-    if remote_info.job_chunksize < 0:
-        remote_info.job_chunksize = -remote_info.job_chunksize * chunksize
+    if remote_info.job_chunksize != 'auto' and remote_info.job_chunksize < 0:
+        # with chunksize='auto', count job_chunksize in items
+        remote_info.job_chunksize = -remote_info.job_chunksize * (chunksize if chunksize != 'auto' else 1)
+
+    if cost_fn is not None:
+        _cost = cost_fn
+    elif cost_key is not None:
+        def _cost(item):
+            return item.info[cost_key]
+    else:
+        def _cost(item):
+            return 1.0
+
+    # job timing only if needed to pack jobs or explicitly requested
+    timed = (remote_info.job_chunksize == 'auto' or remote_info.item_time is not None or
+             remote_info.timings_file is not None)
+    if timed:
+        num_workers = _num_workers(remote_info)
+        item_time = _item_time(remote_info)
+    else:
+        num_workers = None
+        item_time = None
 
     if isinstance(iterable, ConfigSet_in):
-        items_inputs_generator = grouper(remote_info.job_chunksize, ((item, iterable.get_current_input_file()) for item in iterable))
+        items_inputs_costs = ((item, iterable.get_current_input_file(), _cost(item)) for item in iterable)
+    else:
+        items_inputs_costs = ((item, None, _cost(item)) for item in iterable)
+
+    if remote_info.job_chunksize == 'auto':
+        if item_time is None:
+            raise ValueError(f'job_chunksize "auto" for {remote_info.job_name} needs item_time, since no time '
+                             'was recorded in a previous run')
+        if remote_info.job_walltime is not None:
+            job_walltime = remote_info.job_walltime
+            if not isinstance(job_walltime, (int, float)):
+                job_walltime = time_to_sec(job_walltime)
+        else:
+            job_walltime = 0.8 * time_to_sec(remote_info.resources['max_time'])
+        items_inputs_generator = _pack_jobs(items_inputs_costs, job_walltime * num_workers / item_time)
     else:
-        items_inputs_generator = grouper(remote_info.job_chunksize, ((item, None) for item in iterable))
+        items_inputs_generator = grouper(remote_info.job_chunksize, items_inputs_costs)
+
+    def _create_job(job_name, indexed_items):
+        # ignore configset out for hashing of inputs, since that doesn't affect function
+        # calls that have to happen (also it's not repeatable for some reason)
+        return ExPyRe(name=job_name, pre_run_commands=remote_info.pre_cmds, post_run_commands=remote_info.post_cmds,
+                      hash_ignore=hash_ignore + ['configset_out'],
+                      env_vars=remote_info.env_vars, input_files=remote_info.input_files,
+                      output_files=remote_info.output_files, function=_run_items,
+                      kwargs={'indexed_items': indexed_items, 'chunksize': chunksize, 'op': op,
+                              'iterable_arg': iterable_arg, 'skip_failed': skip_failed, 'initializer': initializer,
+                              'initargs': initargs, 'args': args, 'kwargs': kwargs})
 
     # create all jobs (count on expyre detection of identical jobs to avoid rerunning things unnecessarily)
     xprs = []
     # place to keep track of input files, one per input item, so that output can go to corresponding file
     input_files = []
-    # list of all items, wastes space so used only if remote_info.skip_failures is True
+    # list of all items, wastes space so used only if failed jobs are skipped or resubmitted
     all_items = []
+    # index of first item, number of items, and total and max cost of items, in each job
+    job_starts = []
+    job_n_items = []
+    job_costs = []
+    job_max_costs = []
     for chunk_i, items_gen in enumerate(items_inputs_generator):
         items = []
-        for (item, cur_input_file) in items_gen:
+        costs = []
+        for (item, cur_input_file, cost) in items_gen:
             if isinstance(item, Atoms) and 'EXPYRE_REMOTE_JOB_FAILED' in item.info:
                 del item.info['EXPYRE_REMOTE_JOB_FAILED']
 
             items.append(item)
             input_files.append(cur_input_file)
+            costs.append(cost)
 
-        if remote_info.skip_failures:
+        job_starts.append(len(input_files) - len(items))
+        job_n_items.append(len(items))
+        job_costs.append(sum(costs))
+        job_max_costs.append(max(costs))
+        if remote_info.skip_failures or remote_info.resubmit_failures > 0:
             all_items.append(items)
 
         job_name = remote_info.job_name + f'_chunk_{chunk_i}'
         if not quiet:
             sys.stderr.write(f'Creating job {job_name}\n')
 
-        if isinstance(iterable, ConfigSet_in):
-            job_iterable = ConfigSet_in(input_configs=items)
-        else:
-            job_iterable = items
-        co = ConfigSet_out()
-        # remote job will have to set npool appropriately for its node
-        # ignore configset out for hashing of inputs, since that doesn't affect function
-        # calls that have to happen (also it's not repeatable for some reason)
-        xprs.append(ExPyRe(name=job_name, pre_run_commands=remote_info.pre_cmds, post_run_commands=remote_info.post_cmds,
-                            hash_ignore=hash_ignore + ['configset_out'],
-                            env_vars=remote_info.env_vars, input_files=remote_info.input_files,
-                            output_files=remote_info.output_files, function=do_in_pool,
-                            kwargs={'npool': None, 'chunksize': chunksize, 'iterable': job_iterable,
-                                    'configset_out': co, 'op': op, 'iterable_arg': iterable_arg,
-                                    'skip_failed': skip_failed, 'initializer': initializer,
-                                    'initargs': initargs, 'args': args, 'kwargs': kwargs}))
+        xprs.append(_create_job(job_name, list(enumerate(items, job_starts[-1]))))
+
+    if not quiet:
+        sys.stderr.write(f'Created {len(xprs)} jobs for {sum(job_n_items)} items')
+        if item_time is not None and len(xprs) > 0:
+            # each job limited by its total work spread over workers, or by its most expensive item
+            job_times = [max(job_cost / num_workers, job_max_cost) * item_time
+                         for job_cost, job_max_cost in zip(job_costs, job_max_costs)]
+            sys.stderr.write(f', estimated job time up to {max(job_times):.0f} s, expected makespan '
+                             f'{max(job_times):.0f} s if all jobs run at once, {sum(job_times):.0f} s if one at a time')
+        sys.stderr.write('\n')
 
     # start jobs (shouldn't do anything if they've already been started)
     for xpr in xprs:
@@ -84,46 +277,98 @@ def do_remotely(remote_info, hash_ignore=[], chunksize=1, iterable=None, configs
         xpr.start(resources=remote_info.resources, system_name=remote_info.sys_name, header_extra=remote_info.header_extra,
                   exact_fit=remote_info.exact_fit, partial_node=remote_info.partial_node)
 
-    # gather results and write them to original configset_out
+    # gather results as jobs complete, in any order, and write them to original configset_out in order
     configset_out.pre_write()
-    at_i = 0
-    for chunk_i, xpr in enumerate(xprs):
-        if not quiet:
-            sys.stderr.write(f'Gathering results for {xpr.id}\n')
+    timeout = time_to_sec(remote_info.timeout)
+    # like waiting in get_results() for each job in turn, time out only if no job finishes for this long
+    last_done_time = time.time()
+    # outstanding jobs, including resubmitted ones, with index of job whose items they run
+    pending = [(chunk_i, xpr) for chunk_i, xpr in enumerate(xprs)]
+    all_xprs = list(xprs)
+    # outputs of completed items of each job, by item index
+    job_outputs = [{} for _ in xprs]
+    n_resubmits = [0] * len(xprs)
+    # outputs of completed jobs that cannot be written until preceding jobs are done, by job index
+    reorder_buffer = {}
+    next_chunk_i = 0
+    while len(pending) > 0:
+        # one status query (and stage back of files) for all outstanding jobs, rather than one per job
+        pending[0][1].sync_remote_results_status(sync_all=True)
+        out_of_time = (timeout is not None) and (timeout > 0) and (time.time() - last_done_time > timeout)
 
-        try:
-            ats_out, stdout, stderr = xpr.get_results(timeout=remote_info.timeout, check_interval=remote_info.check_interval)
-        except Exception as exc:
-            warnings.warn(f'Failed in remote job {xpr.id} on {xpr.system_name}')
-            if not remote_info.skip_failures:
-                raise
-            if len(all_items) > 0 and isinstance(all_items[chunk_i][0], Atoms):
-                # get ready to write input configs to output
-                ats_out = ConfigSet_in(input_configs=all_items[chunk_i])
-                for at in ats_out:
-                    at.info['EXPYRE_REMOTE_JOB_FAILED'] = True
-            else:
-                # either no inputs saved or inputs aren't configurations, so skip output
-                ats_out = None
-            stdout = ''
-            stderr = ''
-
-        if ats_out is None:
-            # Skip the right number of input files. If we're here,
-            # remote_info.skip_failures must be True, so all_items should be filled
-            at_i += len(all_items[chunk_i])
-        else:
-            for at in ats_out.group_iter():
-                configset_out.write(at, from_input_file=input_files[at_i])
-                at_i += 1
-            sys.stdout.write(stdout)
-            sys.stderr.write(stderr)
+        for chunk_i, xpr in list(pending):
+            if _remote_status(xpr) in [None, 'queued', 'held', 'running'] and not out_of_time:
+                continue
+
+            if not quiet:
+                sys.stderr.write(f'Gathering results for {xpr.id}\n')
+            pending.remove((chunk_i, xpr))
+            try:
+                if _remote_status(xpr) in [None, 'queued', 'held', 'running']:
+                    raise ExPyReTimeoutError(f'Job {xpr.id} not done, and no job finished in {remote_info.timeout}')
+                last_done_time = time.time()
+                # already synced, so this returns right away unless job died
+                outputs, stdout, stderr = xpr.get_results(timeout=remote_info.timeout,
+                                                          check_interval=remote_info.check_interval, quiet=True)
+                job_outputs[chunk_i].update(outputs)
+                sys.stdout.write(stdout)
+                sys.stderr.write(stderr)
+            except Exception:
+                warnings.warn(f'Failed in remote job {xpr.id} on {xpr.system_name}')
+                # harvest outputs of items that were completed before job failed
+                job_outputs[chunk_i].update(_harvest_item_results(xpr.stage_dir / _ITEM_RESULTS_DIR))
+                missing = [item_i for item_i in range(job_starts[chunk_i], job_starts[chunk_i] + job_n_items[chunk_i])
+                           if item_i not in job_outputs[chunk_i]]
+                if len(missing) > 0 and n_resubmits[chunk_i] < remote_info.resubmit_failures and not out_of_time:
+                    # only rerun items that were not completed, in a new job
+                    n_resubmits[chunk_i] += 1
+                    job_name = remote_info.job_name + f'_chunk_{chunk_i}_resubmit_{n_resubmits[chunk_i]}'
+                    if not quiet:
+                        sys.stderr.write(f'Resubmitting {len(missing)} of {job_n_items[chunk_i]} items as job '
+                                         f'{job_name}\n')
+                    new_xpr = _create_job(job_name, [(item_i, all_items[chunk_i][item_i - job_starts[chunk_i]])
+                                                     for item_i in missing])
+                    new_xpr.start(resources=remote_info.resources, system_name=remote_info.sys_name,
+                                  header_extra=remote_info.header_extra, exact_fit=remote_info.exact_fit,
+                                  partial_node=remote_info.partial_node)
+                    pending.append((chunk_i, new_xpr))
+                    all_xprs.append(new_xpr)
+                    continue
+
+                if len(missing) > 0 and not remote_info.skip_failures:
+                    raise
+                for item_i in missing:
+                    item = all_items[chunk_i][item_i - job_starts[chunk_i]]
+                    if isinstance(item, Atoms):
+                        # write input config to output
+                        item.info['EXPYRE_REMOTE_JOB_FAILED'] = True
+                        job_outputs[chunk_i][item_i] = item
+                    else:
+                        # inputs aren't configurations, so skip output
+                        job_outputs[chunk_i][item_i] = None
+
+            reorder_buffer[chunk_i] = job_outputs[chunk_i]
+
+        # write all results that are next in order
+        while next_chunk_i in reorder_buffer:
+            outputs = reorder_buffer.pop(next_chunk_i)
+            job_outputs[next_chunk_i] = None
+            for item_i in range(job_starts[next_chunk_i], job_starts[next_chunk_i] + job_n_items[next_chunk_i]):
+                if outputs[item_i] is not None:
+                    configset_out.write(outputs[item_i], from_input_file=input_files[item_i])
+            next_chunk_i += 1
+
+        if len(pending) > 0:
+            time.sleep(remote_info.check_interval)
 
     configset_out.end_write()
 
+    if timed:
+        _record_item_time(remote_info, xprs, job_costs, num_workers, quiet=quiet)
+
     if 'WFL_AUTOPARA_REMOTE_NO_MARK_PROCESSED' not in os.environ:
         # mark as processed only after configset_out has been finished
-        for xpr in xprs:
+        for xpr in all_xprs:
             xpr.mark_processed()
 
     return configset_out.to_ConfigSet_in()
@@ -0,0 +1,245 @@
+"""Process pool that limits the wall time of each task, retries failed tasks, and optionally runs
+duplicates of straggler tasks
+
+Unlike ``multiprocessing.Pool``, each worker is a separate process in its own process group, so that
+a worker running a task that takes too long (e.g. a hung DFT code) can be killed together with any
+subprocesses it started, and replaced by a new worker.  A task that raises an exception, times out,
+or whose worker dies is rerun up to a given number of times, and then reported as failed.
+"""
+
+import os
+import signal
+import statistics
+import time
+import warnings
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+
+def _worker_loop(conn, func, initializer, initargs):
+    # own process group, so that subprocesses started by func are killed along with this worker
+    os.setpgrp()
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        try:
+            result = (True, func(task))
+        except Exception as exc:
+            result = (False, f'{type(exc).__name__}: {exc}')
+        conn.send(result)
+
+
+class _Worker:
+    # worker process, started when it is first given a task
+    def __init__(self):
+        self.process = None
+        self.conn = None
+        self.task_id = None
+        self.start_time = None
+        self.deadline = None
+
+    def start(self, func, initializer, initargs):
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=_worker_loop, args=(child_conn, func, initializer, initargs), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        if self.process is None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            # worker has not created its process group yet
+            pass
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+        self.task_id = None
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5.0)
+        except (BrokenPipeError, OSError):
+            pass
+        self.kill()
+
+
+class SupervisedPool:
+    """Pool of worker processes with per-task wall time limit, retries and speculative re-execution
+
+    Parameters
+    ----------
+    npool: int
+        number of worker processes
+    func: callable
+        function called by workers with each task
+    initializer: callable, default None
+        function to call at beginning of each worker process
+    initargs: list, default []
+        positional arguments for initializer
+    timeout: callable, default None
+        function of task returning its wall time limit (sec), or None for no limit
+    retries: int, default 0
+        number of times to rerun a task that raises an exception, times out, or whose worker dies
+    speculative: bool, default False
+        once all tasks have been handed out, use idle workers to run duplicates of tasks that have been
+        running for longer than the median time of completed tasks, keeping the result of whichever
+        copy finishes first
+    on_fail: callable, default None
+        function of task and reason for failure (str) returning result for a task that failed all its
+        attempts.  If None, raise RuntimeError instead.
+    """
+    def __init__(self, npool, func, initializer=None, initargs=[], timeout=None, retries=0, speculative=False,
+                 on_fail=None):
+        self.func = func
+        self.initializer = initializer
+        self.initargs = initargs
+        self.timeout = timeout
+        self.retries = retries
+        self.speculative = speculative
+        self.on_fail = on_fail
+        self.workers = [_Worker() for _ in range(npool)]
+
+
+    def _start(self, worker, task_id, task):
+        if worker.process is None:
+            worker.start(self.func, self.initializer, self.initargs)
+        worker.conn.send(task)
+        worker.task_id = task_id
+        worker.start_time = time.monotonic()
+        timeout = self.timeout(task) if self.timeout is not None else None
+        worker.deadline = worker.start_time + timeout if timeout is not None else None
+
+
+    def imap_unordered(self, tasks):
+        """Run func on each task, reading tasks only as workers become free
+
+        Parameters
+        ----------
+        tasks: iterable
+            tasks to pass to func
+
+        Returns
+        -------
+        iterator over results, in order of completion
+        """
+        tasks = iter(tasks)
+        tasks_left = True
+        # task, number of attempts, and workers running it, by task id
+        running = {}
+        retry = deque()
+        durations = []
+        next_task_id = 0
+        try:
+            while True:
+                # hand out new, retried, or (if nothing else is left) duplicate tasks to idle workers
+                now = time.monotonic()
+                for worker in self.workers:
+                    if worker.task_id is not None:
+                        continue
+                    if len(retry) > 0:
+                        task_id = retry.popleft()
+                        running[task_id]['attempts'] += 1
+                    elif tasks_left:
+                        try:
+                            task = next(tasks)
+                        except StopIteration:
+                            tasks_left = False
+                            continue
+                        task_id = next_task_id
+                        next_task_id += 1
+                        running[task_id] = {'task': task, 'attempts': 1, 'workers': []}
+                    else:
+                        task_id = self._straggler(running, durations, now)
+                        if task_id is None:
+                            continue
+                    self._start(worker, task_id, running[task_id]['task'])
+                    running[task_id]['workers'].append(worker)
+
+                if len(running) == 0:
+                    return
+
+                # wait for a result, a deadline, or a task to become a straggler
+                busy = [worker for worker in self.workers if worker.task_id is not None]
+                wake_times = [worker.deadline for worker in busy if worker.deadline is not None]
+                if self.speculative and not tasks_left and len(busy) < len(self.workers) and len(durations) > 0:
+                    wake_times += [worker.start_time + statistics.median(durations) for worker in busy
+                                   if len(running[worker.task_id]['workers']) == 1]
+                wait_time = max(min(wake_times) - time.monotonic(), 0.0) + 0.01 if len(wake_times) > 0 else None
+                ready = wait([worker.conn for worker in busy], timeout=wait_time)
+
+                now = time.monotonic()
+                for worker in busy:
+                    task_id = worker.task_id
+                    if task_id is None:
+                        # killed because a duplicate of its task finished first
+                        continue
+                    if worker.conn in ready:
+                        try:
+                            succeeded, result = worker.conn.recv()
+                        except (EOFError, OSError):
+                            succeeded, result = False, f'worker process died with exit code {worker.process.exitcode}'
+                            worker.kill()
+                        worker.task_id = None
+                    elif worker.deadline is not None and now >= worker.deadline:
+                        succeeded, result = False, f'timed out after {worker.deadline - worker.start_time:.1f} s'
+                        worker.kill()
+                    else:
+                        continue
+
+                    task_data = running[task_id]
+                    task_data['workers'].remove(worker)
+                    if succeeded:
+                        durations.append(now - worker.start_time)
+                        # stop duplicates of this task
+                        for other_worker in task_data['workers']:
+                            other_worker.kill()
+                        del running[task_id]
+                        yield result
+                    elif len(task_data['workers']) > 0:
+                        # a duplicate is still running
+                        continue
+                    elif task_data['attempts'] <= self.retries:
+                        warnings.warn(f'Task failed on attempt {task_data["attempts"]}, retrying: {result}')
+                        retry.append(task_id)
+                    else:
+                        del running[task_id]
+                        if self.on_fail is None:
+                            raise RuntimeError(f'Task failed after {task_data["attempts"]} attempts: {result}')
+                        yield self.on_fail(task_data['task'], result)
+        finally:
+            self.close()
+
+
+    def _straggler(self, running, durations, now):
+        # task that has been running longer than median task time, longest first, without a duplicate
+        if not self.speculative or len(durations) == 0:
+            return None
+        median_duration = statistics.median(durations)
+        stragglers = [(task_data['workers'][0].start_time, task_id) for task_id, task_data in running.items()
+                      if len(task_data['workers']) == 1 and
+                      now - task_data['workers'][0].start_time > median_duration]
+        if len(stragglers) == 0:
+            return None
+        return min(stragglers)[1]
+
+
+    def close(self):
+        """Stop all worker processes, killing those still running a task"""
+        for worker in self.workers:
+            if worker.task_id is not None:
+                worker.kill()
+            else:
+                worker.stop()
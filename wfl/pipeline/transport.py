@@ -0,0 +1,159 @@
+"""Transport of chunks of Atoms between pool processes through shared memory
+
+Numeric per-atom arrays, cells and numeric calculator results of all Atoms in a chunk are
+copied into a single ``multiprocessing.shared_memory`` block, and only a small header (block name,
+array offsets, and python objects such as ``info``) is pickled.  The process that reads a block
+unlinks it, except for blocks sent to workers, which are unlinked by the parent once the
+corresponding result has been returned.
+
+``multiprocessing.shared_memory`` (python >= 3.8) is only imported when this transport is used.
+"""
+
+import numpy as np
+from ase.atoms import Atoms
+from ase.calculators.singlepoint import SinglePointCalculator
+
+
+class _ArrayPacker:
+    # accumulate arrays, then copy them into one shared memory block
+    def __init__(self):
+        self.arrays = []
+        self.size = 0
+
+    def add(self, array):
+        array = np.ascontiguousarray(array)
+        offset = self.size
+        self.arrays.append((offset, array))
+        # keep every array 8-byte aligned
+        self.size += -(-array.nbytes // 8) * 8
+        return (offset, array.dtype.str, array.shape)
+
+    def to_shared_memory(self):
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=max(self.size, 1))
+        for offset, array in self.arrays:
+            shm.buf[offset:offset + array.nbytes] = array.reshape(-1).view(np.uint8)
+        return shm
+
+
+def _is_numeric(v):
+    return isinstance(v, np.ndarray) and v.dtype.kind in 'biufc'
+
+
+def _pack_atoms(at, packer):
+    arrays = {}
+    objects = {}
+    for k, v in at.arrays.items():
+        if _is_numeric(v):
+            arrays[k] = packer.add(v)
+        else:
+            objects[k] = v
+
+    calc = at.calc
+    calc_arrays = {}
+    calc_results = None
+    if isinstance(calc, SinglePointCalculator):
+        calc_results = {}
+        for k, v in calc.results.items():
+            if _is_numeric(v):
+                calc_arrays[k] = packer.add(v)
+            else:
+                calc_results[k] = v
+        calc = None
+
+    return ('atoms', {'cell': packer.add(at.cell.array), 'pbc': at.pbc.copy(), 'info': at.info,
+                      'constraints': at.constraints, 'arrays': arrays, 'objects': objects,
+                      'calc': calc, 'calc_results': calc_results, 'calc_arrays': calc_arrays})
+
+
+def _pack_obj(obj, packer):
+    if isinstance(obj, Atoms):
+        return _pack_atoms(obj, packer)
+    elif isinstance(obj, (list, tuple)) and len(obj) > 0 and all([isinstance(o, Atoms) for o in obj]):
+        return ('atoms_list', [_pack_atoms(at, packer) for at in obj])
+    return ('object', obj)
+
+
+def pack(objs):
+    """Pack a list of objects, with Atoms (and lists of Atoms) stored in shared memory
+
+    Parameters
+    ----------
+    objs: list
+        objects to pack
+
+    Returns
+    -------
+    shm: SharedMemory
+        block containing arrays, which must be kept until it has been read
+    header: (str, list)
+        name of block and description of packed objects, to be passed to unpack()
+    """
+    packer = _ArrayPacker()
+    packed_objs = [_pack_obj(obj, packer) for obj in objs]
+    shm = packer.to_shared_memory()
+    return shm, (shm.name, packed_objs)
+
+
+def _get_array(buf, ref):
+    offset, dtype, shape = ref
+    dtype = np.dtype(dtype)
+    n_bytes = int(np.prod(shape, dtype=int)) * dtype.itemsize
+    return np.frombuffer(buf[offset:offset + n_bytes], dtype=dtype).reshape(shape).copy()
+
+
+def _unpack_atoms(packed, buf):
+    arrays = {k: _get_array(buf, ref) for k, ref in packed['arrays'].items()}
+    at = Atoms(numbers=arrays.pop('numbers'), positions=arrays.pop('positions'),
+               cell=_get_array(buf, packed['cell']), pbc=packed['pbc'])
+    for k, v in list(arrays.items()) + list(packed['objects'].items()):
+        at.arrays[k] = v
+    at.info = packed['info']
+    at.constraints = packed['constraints']
+    if packed['calc_results'] is not None:
+        results = packed['calc_results']
+        results.update({k: _get_array(buf, ref) for k, ref in packed['calc_arrays'].items()})
+        at.calc = SinglePointCalculator(at, **results)
+    elif packed['calc'] is not None:
+        at.calc = packed['calc']
+    return at
+
+
+def unpack(header, unlink=True):
+    """Unpack objects packed by pack()
+
+    Parameters
+    ----------
+    header: (str, list)
+        header returned by pack()
+    unlink: bool, default True
+        unlink shared memory block after reading it
+
+    Returns
+    -------
+    list of objects
+    """
+    from multiprocessing import shared_memory
+    shm_name, packed_objs = header
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        objs = []
+        for kind, packed in packed_objs:
+            if kind == 'atoms':
+                objs.append(_unpack_atoms(packed, shm.buf))
+            elif kind == 'atoms_list':
+                objs.append([_unpack_atoms(p[1], shm.buf) for p in packed])
+            else:
+                objs.append(packed)
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+    return objs
+
+
+def start_resource_tracker():
+    """Start multiprocessing resource tracker, so that processes forked afterwards share it, and shared
+    memory blocks they create can be unlinked by this process without being reported as leaked"""
+    from multiprocessing import resource_tracker
+    resource_tracker.ensure_running()
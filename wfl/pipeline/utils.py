@@ -1,4 +1,7 @@
+import os
+import time
 import itertools
+import threading
 
 
 class RemoteInfo:
@@ -12,8 +15,9 @@ class RemoteInfo:
         name for job (unique within this project)
     resources: dict or Resources
         expyre.resources.Resources or kwargs for its constructor
-    job_chunksize: int, default -100
-        chunksize for each job. If negative will be multiplied by iterable_op chunksize
+    job_chunksize: int / 'auto', default -100
+        chunksize for each job. If negative will be multiplied by iterable_op chunksize.  If 'auto',
+        pack consecutive items into jobs that are each estimated to take up to job_walltime
     pre_cmds: list(str)
         commands to run before starting job
     post_cmds: list(str)
@@ -31,16 +35,34 @@ class RemoteInfo:
     partial_node: bool, default True
         allow jobs that take less than a whole node, overrides exact_fit
     timeout: int
-        time to wait in get_results before giving up
+        time to wait in get_results before giving up, i.e. for next job to finish
     check_interval: int
-        check_interval arg to pass to get_results
+        time between checks of status of all outstanding jobs
     skip_failures: bool, default False
-        skip failures in remote jobs
+        skip failures in remote jobs, writing input configs of items that were not completed to output
+        with info['EXPYRE_REMOTE_JOB_FAILED'] = True
+    job_walltime: int / float / str, default None
+        target run time of each job (sec if number, time spec if str) for job_chunksize='auto', default
+        80% of resources max_time
+    item_time: float, default None
+        estimated time (sec) for one worker to process one item, or one unit of cost if iterable_loop()
+        cost_fn or cost_key is given, for job_chunksize='auto'.  Default from time measured for jobs
+        with the same job_name in previous runs, recorded in timings_file
+    num_workers: int, default None
+        number of items each job processes concurrently, default number of cores in resources
+    timings_file: str, default None
+        JSON file to record measured item_time in, by job_name, default wfl_item_times.json in expyre
+        local stage dir.  Times are only measured and recorded if job_chunksize='auto', or item_time or
+        timings_file is given.
+    resubmit_failures: int, default 0
+        number of times to resubmit a failed job, each time only with its items that were not completed
+        (outputs of completed items are saved by the job as it goes)
     """
     def __init__(self, sys_name, job_name, resources, job_chunksize=-100, pre_cmds=[], post_cmds=[],
                  env_vars=[], input_files=[], output_files=[], header_extra=[],
                  exact_fit=True, partial_node=False, timeout=3600, check_interval=30,
-                 skip_failures=False):
+                 skip_failures=False, job_walltime=None, item_time=None, num_workers=None, timings_file=None,
+                 resubmit_failures=0):
 
         self.sys_name = sys_name
         self.job_name = job_name
@@ -60,6 +82,12 @@ class RemoteInfo:
         self.check_interval = check_interval
         self.skip_failures = skip_failures
 
+        self.job_walltime = job_walltime
+        self.item_time = item_time
+        self.num_workers = num_workers
+        self.timings_file = timings_file
+        self.resubmit_failures = resubmit_failures
+
 
     def __str__(self):
         return f'{self.sys_name} {self.job_name} {self.resources} {self.job_chunksize} {self.exact_fit} {self.partial_node} {self.timeout} {self.check_interval}'
@@ -72,3 +100,114 @@ def grouper(n, iterable):
         if not chunk:
             return
         yield chunk
+
+
+class AutoChunker:
+    """Group items into chunks sized to take a target time each, from the measured throughput
+    of chunks completed so far, with chunks shrinking near the end of the items so that the
+    last tasks finish together.
+
+    The first npool chunks have one item each.  Later chunk sizes are based on the per-item cost
+    estimated from results reported with done().  To make sure sizes can use these estimates,
+    no more than max_outstanding chunks are handed out before their results are reported.
+
+    Parameters
+    ----------
+    iterable: iterable
+        items to group
+    npool: int
+        number of processes chunks are run on
+    n_items: int, default None
+        total number of items, to shrink chunks near the end, None if unknown
+    target_time: float, default os.environ['WFL_AUTOPARA_CHUNK_TARGET_TIME'] or 1.0
+        target time (s) per chunk
+    max_chunksize: int, default 1000
+        maximum number of items in a chunk
+    max_outstanding: int, default 2 * npool
+        maximum number of chunks handed out but not yet reported with done(), None for no limit,
+        e.g. for pools that consume all tasks before returning any results
+    """
+    def __init__(self, iterable, npool, n_items=None, target_time=None, max_chunksize=1000,
+                 max_outstanding=-1):
+        self.iterable = iter(iterable)
+        self.npool = max(npool, 1)
+        self.n_items = n_items
+        if target_time is None:
+            target_time = float(os.environ.get('WFL_AUTOPARA_CHUNK_TARGET_TIME', 1.0))
+        self.target_time = target_time
+        self.max_chunksize = max_chunksize
+        if max_outstanding == -1:
+            max_outstanding = 2 * self.npool
+
+        self.n_dispatched = 0
+        self.n_done = 0
+        self.n_chunks_dispatched = 0
+        self.t_start = None
+        self.closed = False
+        if max_outstanding is not None:
+            self.outstanding = threading.Semaphore(max_outstanding)
+        else:
+            self.outstanding = None
+
+
+    def item_cost(self):
+        """Estimated time (s) per item on one process, None before any items are done"""
+        if self.n_done == 0:
+            return None
+        return (time.monotonic() - self.t_start) * self.npool / self.n_done
+
+
+    def chunksize(self):
+        """Size of next chunk"""
+        if self.n_chunks_dispatched < self.npool:
+            # probe per-item cost
+            size = 1
+        else:
+            item_cost = self.item_cost()
+            if item_cost is None:
+                size = 1
+            else:
+                size = int(self.target_time / max(item_cost, 1.0e-9))
+        if self.n_items is not None:
+            # guided self-scheduling: never more than half of a fair share of what is left
+            remaining = self.n_items - self.n_dispatched
+            size = min(size, -(-remaining // (2 * self.npool)))
+        return max(1, min(size, self.max_chunksize))
+
+
+    def __iter__(self):
+        self.t_start = time.monotonic()
+        while not self.closed:
+            if self.outstanding is not None:
+                # wait for results of earlier chunks, but check periodically if chunker was closed
+                while not self.outstanding.acquire(timeout=1.0):
+                    if self.closed:
+                        return
+                if self.closed:
+                    return
+            chunk = tuple(itertools.islice(self.iterable, self.chunksize()))
+            if not chunk:
+                return
+            self.n_dispatched += len(chunk)
+            self.n_chunks_dispatched += 1
+            yield chunk
+
+
+    def done(self, n_items):
+        """Report that results of a chunk were received
+
+        Parameters
+        ----------
+        n_items: int
+            number of items in chunk
+        """
+        self.n_done += n_items
+        if self.outstanding is not None:
+            self.outstanding.release()
+
+
+    def close(self):
+        """Stop handing out chunks"""
+        self.closed = True
+        if self.outstanding is not None:
+            self.outstanding.release()
@@ -1,3 +1,4 @@
+from collections import deque
 from os import path
 
 import ase.data
@@ -124,7 +125,8 @@ def trajectory_neb_ts_irc(configset_in, calculator, neb_kwargs=None, ts_kwargs=N
     if index_key is None:
         index_key = "neb_index"
 
-    minima = [atl[-1] for atl in configset_in.group_iter()]
+    # last config of each trajectory, without reading entire trajectories into memory
+    minima = [deque(atl, maxlen=1)[-1] for atl in configset_in.group_iter(lazy=True)]
 
     if len(minima) < 2:
         print("Not enough minimisation trajectories.")
@@ -176,7 +178,8 @@ def trajectory_neb(configset_in, configset_out, calculator, neb_kwargs=None, ind
     if index_key is None:
         index_key = "neb_index"
 
-    minima = [atl[-1] for atl in configset_in.group_iter()]
+    # last config of each trajectory, without reading entire trajectories into memory
+    minima = [deque(atl, maxlen=1)[-1] for atl in configset_in.group_iter(lazy=True)]
 
     if len(minima) < 2:
         print("Not enough minimisation trajectories.")
@@ -3,6 +3,8 @@ import warnings
 import numpy as np
 from scipy.sparse.linalg import LinearOperator, svds
 
+from wfl.configset import ConfigSet_in
+
 
 def do_svd(at_descs, num, do_vectors='vh'):
     def mv(v):
@@ -98,7 +100,12 @@ def prep_descs_and_exclude(inputs, at_descs, at_descs_info_key, exclude_list):
 
     # make array of column vectors of descriptors
     exclude_ind_list = []
-    if at_descs is None or exclude_list is not None:
+    if at_descs is None and exclude_list is None:
+        # only descriptors are needed, get them without constructing Atoms where possible
+        if not isinstance(inputs, ConfigSet_in):
+            inputs = ConfigSet_in(input_configs=inputs)
+        at_descs = inputs.get_columns(at_descs_info_key)[at_descs_info_key]
+    elif at_descs is None or exclude_list is not None:
         # go through inputs once, extract descriptors and/or create exclude list indices
         if at_descs is None:
             at_descs = []
@@ -139,18 +146,21 @@ def write_selected_and_clean(inputs, outputs, selected, at_descs_info_key=None,
     selected_s = set(selected)
     assert len(selected) == len(selected_s)
 
+    if isinstance(inputs, ConfigSet_in):
+        # seeks directly to selected configs if inputs are indexed files
+        selected_ats = inputs.subset_iter(selected)
+    else:
+        selected_ats = (at for at_i, at in enumerate(inputs) if at_i in selected_s)
+
     counter = 0
-    # inputs is an iterable, can't directly reference specific # configs,
-    # so loop through and search in set (should be fast)
-    for at_i, at in enumerate(inputs):
-        if at_i in selected_s:
-            if not keep_descriptor_info:
-                del at.info[at_descs_info_key]
-            outputs.write(at)
-            counter += 1
-            if counter >= len(selected_s):
-                # skip remaining iterator if we've used entire selected list
-                break
+    for at in selected_ats:
+        if not keep_descriptor_info:
+            del at.info[at_descs_info_key]
+        outputs.write(at)
+        counter += 1
+        if counter >= len(selected_s):
+            # skip remaining iterator if we've used entire selected list
+            break
     outputs.end_write()
 
 
@@ -1,6 +1,9 @@
 import sys
 
-from wfl.selection_space import composition_space_Zs, composition_space_coord
+import numpy as np
+
+from wfl.configset import ConfigSet_in
+from wfl.utils.vol_composition_space import composition_space_coords_from_columns
 from wfl.utils.convex_hull import find_hull
 
 
@@ -9,30 +12,26 @@ def select(inputs, outputs, info_field, Zs=None, verbose=False):
         sys.stderr.write('Returning from {__name__} since output is done\n')
         return outputs.to_ConfigSet_in()
 
+    if not isinstance(inputs, ConfigSet_in):
+        inputs = ConfigSet_in(input_configs=inputs)
+
+    columns = inputs.get_columns(info_field, with_natoms=True, with_volume=True, with_numbers=True,
+                                 missing=np.nan)
+
     if Zs is None:
-        Zs = composition_space_Zs(inputs)
+        Zs = sorted(set(columns['numbers']))
 
-    positions = []
-    avail_inds = {}
-    for at_i, at in enumerate(inputs):
-        if info_field in at.info:
-            positions.append(composition_space_coord(at, ['_V', '_x', info_field], Zs))
-            avail_inds[at_i] = len(positions) - 1
+    # only configs that have info_field are available for selection
+    avail_inds = np.where(~np.isnan(columns[info_field]))[0]
+    positions = composition_space_coords_from_columns(columns, ['_V', '_x', info_field], Zs)[avail_inds]
 
-    # convert to set for faster checking (O(1)?) of "in" below
     _, indices, _, simplices = find_hull(positions)
-    selected_indices = set(indices)
     if verbose:
         for s_i, s in enumerate(simplices):
             print('arb_polyhedra -name {} -indices {}'.format(s_i, ' '.join([str(i) for i in s])))
 
-    for at_i, at in enumerate(inputs):
-        try:
-            if avail_inds[at_i] in selected_indices:
-                outputs.write(at)
-        except KeyError:
-            # skip configs that are not in avail_inds
-            pass
+    for at in inputs.subset_iter(avail_inds[sorted(set(indices))]):
+        outputs.write(at)
 
     outputs.end_write()
     return outputs.to_ConfigSet_in()
@@ -2,6 +2,8 @@ import sys
 
 import numpy as np
 
+from wfl.configset import ConfigSet_in
+
 
 def _select_by_bin(weights, bin_edges, quantities, n, kT, verbose=False):
     if verbose:
@@ -111,26 +113,18 @@ def biased_select_conf(inputs, outputs, num, info_field, kT=-1.0, bins='auto', b
         sys.stderr.write('Returning from {__name__} since output is done\n')
         return outputs.to_ConfigSet_in()
 
-    quantities = []
-    avail_inds = {}
-    for at_i, at in enumerate(inputs):
-        try:
-            quantities.append(at.info[info_field])
-            avail_inds[at_i] = len(quantities) - 1
-        except KeyError:
-            pass
-
-    # convert to set for faster checking (O(1)?) of "in" below
-    selected_indices = set(
-        _select_indices_flat_boltzmann_biased(quantities, num, kT, bins=bins, by_bin=by_bin, verbose=verbose))
-
-    for at_i, at in enumerate(inputs):
-        try:
-            if avail_inds[at_i] in selected_indices:
-                outputs.write(at)
-        except KeyError:
-            # skip configs that are not in avail_inds
-            pass
+    if not isinstance(inputs, ConfigSet_in):
+        inputs = ConfigSet_in(input_configs=inputs)
+
+    # only configs that have info_field are available for selection
+    quantities = inputs.get_columns(info_field, missing=np.nan)[info_field]
+    avail_inds = np.where(~np.isnan(quantities))[0]
+
+    selected_indices = _select_indices_flat_boltzmann_biased(quantities[avail_inds], num, kT, bins=bins,
+                                                             by_bin=by_bin, verbose=verbose)
+
+    for at in inputs.subset_iter(avail_inds[selected_indices]):
+        outputs.write(at)
 
     outputs.end_write()
     return outputs.to_ConfigSet_in()
@@ -111,7 +111,9 @@ def by_index(inputs, outputs, indices):
     -----
     This routine depends on details of ConfigSet_in and ConfigSet_out,
     so perhaps belongs as a use case of iterable_loop, but since it can return
-    multiple outputs for a single input, this cannot be done eight now
+    multiple outputs for a single input, this cannot be done eight now.
+    Selected configs are read with ConfigSet_in.subset_iter(), so unselected configs
+    in indexed extxyz files are not parsed.
 
     """
     if outputs.is_done():
@@ -121,24 +123,9 @@ def by_index(inputs, outputs, indices):
     if len(indices) == 0:
         return outputs.to_ConfigSet_in()
 
-    indices = sorted(indices)
-    ii = iter(enumerate(inputs))
-    try:
-        at_i, at = next(ii)
-    except StopIteration:
-        return outputs.to_ConfigSet_in()
-    cur_i = np.searchsorted(indices, at_i)
-    while True:
-        if cur_i >= len(indices):
-            break
-        if indices[cur_i] == at_i:
-            outputs.write(at, from_input_file=inputs.get_current_input_file())
-            cur_i += 1
-        else:
-            try:
-                at_i, at = next(ii)
-            except StopIteration:
-                break
+    # seeks directly to selected configs if inputs are indexed files
+    for at in inputs.subset_iter(indices):
+        outputs.write(at, from_input_file=inputs.get_current_input_file())
 
     outputs.end_write()
     return outputs.to_ConfigSet_in()
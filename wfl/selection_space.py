@@ -2,7 +2,8 @@ import sys
 
 import numpy as np
 
-from wfl.utils.vol_composition_space import composition_space_Zs, composition_space_coord
+from wfl.configset import ConfigSet_in
+from wfl.utils.vol_composition_space import composition_space_coords_from_columns
 
 
 def minima_among_neighbors(positions, ranges, values, cartesian_distance=True):
@@ -63,35 +64,23 @@ def val_relative_to_nearby_composition_volume_min(inputs, outputs, vol_range, co
         sys.stderr.write(f'Returning from {__name__} since output is done\n')
         return outputs.to_ConfigSet_in()
 
+    if not isinstance(inputs, ConfigSet_in):
+        inputs = ConfigSet_in(input_configs=inputs)
+
+    columns = inputs.get_columns(info_field_in, with_natoms=True, with_volume=True, with_numbers=True)
+
     if Zs is None:
-        Zs = composition_space_Zs(inputs)
-
-    positions = []
-    values = []
-    for at_i, at in enumerate(inputs):
-        if at_i % 1000 == 1000 - 1:
-            if at_i % 10000 == 10000 - 1:
-                sys.stderr.write('{}'.format((at_i + 1) // 10000 % 10))
-            else:
-                sys.stderr.write('.')
-            if at_i % 100000 == 100000 - 1:
-                sys.stderr.write('\n')
-            sys.stderr.flush()
-        positions.append(composition_space_coord(at, ['_V', '_x'], Zs))
-        v = at.info[info_field_in]
-        if per_atom:
-            v /= len(at)
-        values.append(v)
-    positions = np.asarray(positions)
-    values = np.asarray(values)
+        Zs = sorted(set(columns['numbers']))
+
+    positions = composition_space_coords_from_columns(columns, ['_V', '_x'], Zs)
+    values = columns[info_field_in]
+    if per_atom:
+        values = values / columns['natoms']
 
     nearby_ranges = [vol_range] + [compos_range] * (len(Zs) - 1)
     minima = minima_among_neighbors(positions, nearby_ranges, values, cartesian_distance=False)
 
-    for at, minimum in zip(inputs, minima):
-        v = at.info[info_field_in]
-        if per_atom:
-            v /= len(at)
+    for at, v, minimum in zip(inputs, values, minima):
         at.info[info_field_out] = v - minimum
         outputs.write(at, from_input_file=inputs.get_current_input_file())
     outputs.end_write()
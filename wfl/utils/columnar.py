@@ -0,0 +1,418 @@
+"""Columnar binary storage of atomic configurations
+
+A columnar store is a directory (conventionally with suffix ``.cols``) containing one raw
+binary file per column, which are memory mapped on read, and a ``meta.json`` file describing
+them.  Core columns are per-config ``natoms``, ``cell``, ``pbc`` and per-atom ``numbers``,
+``positions``.  Numeric ``Atoms.info`` and ``Atoms.arrays`` items (and calculator results)
+are stored as columns of values, together with the indices of configs that have them, so
+that keys can be present only in some configs.  Other (e.g. str) info and arrays items are
+stored as one JSON line per config.
+"""
+
+import os
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+from ase.atoms import Atoms
+from ase.calculators.singlepoint import SinglePointCalculator
+
+from wfl.calculators.utils import per_atom_properties
+
+COLUMNAR_SUFFIX = '.cols'
+_META_FILE = 'meta.json'
+_OBJECTS_FILE = 'objects.jsonl'
+_core_columns = {'natoms': ('int64', []), 'cell': ('float64', [3, 3]), 'pbc': ('bool', [3]),
+                 'numbers': ('int64', []), 'positions': ('float64', [3])}
+_kinds = ['info', 'arrays', 'calc_info', 'calc_arrays']
+
+
+def is_columnar(filename):
+    """Check if a path is a columnar store (existing, or to be created based on its suffix)
+
+    Parameters
+    ----------
+    filename: str / Path
+
+    Returns
+    -------
+    bool
+    """
+    filename = Path(filename)
+    return (filename / _META_FILE).is_file() or filename.suffix == COLUMNAR_SUFFIX
+
+
+def _col_file(kind, key):
+    # keys may contain characters that are not allowed in filenames
+    return f'{kind}.{key.encode().hex()}'
+
+
+def _as_column_value(v):
+    """numpy array if v is numeric (scalar or array), otherwise None"""
+    if isinstance(v, (str, bytes, dict)) or v is None:
+        return None
+    try:
+        v = np.asarray(v)
+    except Exception:
+        return None
+    if v.dtype.kind not in 'biufc':
+        return None
+    return v
+
+
+def _to_json(v):
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    if isinstance(v, np.generic):
+        return v.item()
+    return str(v)
+
+
+class ColumnarWriter:
+    """Writer that appends configurations to a columnar store
+
+    Parameters
+    ----------
+    filename: str / Path
+        directory to create, removing it first if it exists
+    """
+
+    def __init__(self, filename):
+        self.name = str(filename)
+        self.path = Path(filename)
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self.path.mkdir(parents=True)
+
+        self.n_configs = 0
+        self.n_atoms = 0
+        # kind -> key -> [dtype, shape]
+        self.columns = {kind: {} for kind in _kinds}
+        # kind -> keys of values stored as objects in some config
+        self.object_keys = {kind: set() for kind in _kinds}
+        self.files = {}
+        self.objects_file = open(self.path / _OBJECTS_FILE, 'w')
+        self.objects_offsets = []
+        self.objects_pos = 0
+        self.closed = False
+
+
+    def _append(self, col_file, data):
+        try:
+            fout = self.files[col_file]
+        except KeyError:
+            fout = self.files[col_file] = open(self.path / col_file, 'ab')
+        fout.write(np.ascontiguousarray(data).tobytes())
+
+
+    def _append_column(self, kind, key, v, per_atom_n=None):
+        """append numeric value to column, returns False if it is incompatible with existing column"""
+        if per_atom_n is not None and (v.ndim == 0 or v.shape[0] != per_atom_n):
+            return False
+        tail_shape = list(v.shape[1:] if per_atom_n is not None else v.shape)
+        col = self.columns[kind].get(key)
+        if col is None:
+            col = self.columns[kind][key] = [v.dtype.str, tail_shape]
+        elif col[1] != tail_shape or not np.can_cast(v.dtype, np.dtype(col[0]), 'same_kind'):
+            return False
+        self._append(_col_file(kind, key), v.astype(np.dtype(col[0]), copy=False))
+        self._append(_col_file(kind, key) + '.idx', np.asarray([self.n_configs], dtype=np.int64))
+        return True
+
+
+    def write(self, ats):
+        """Append configs
+
+        Parameters
+        ----------
+        ats: Atoms / iterable(Atoms)
+            configs to write
+        """
+        if isinstance(ats, Atoms):
+            ats = [ats]
+
+        for at in ats:
+            natoms = len(at)
+            self._append('natoms', np.asarray([natoms], dtype=np.int64))
+            self._append('cell', np.asarray(at.cell.array, dtype=np.float64))
+            self._append('pbc', np.asarray(at.pbc, dtype=bool))
+            self._append('numbers', np.asarray(at.numbers, dtype=np.int64))
+            self._append('positions', np.asarray(at.positions, dtype=np.float64))
+
+            objects = {}
+            for k, v in at.info.items():
+                col_v = _as_column_value(v)
+                if col_v is None or not self._append_column('info', k, col_v):
+                    objects.setdefault('info', {})[k] = v
+            for k, v in at.arrays.items():
+                if k in ['numbers', 'positions']:
+                    continue
+                col_v = _as_column_value(v)
+                if col_v is None or not self._append_column('arrays', k, col_v, natoms):
+                    objects.setdefault('arrays', {})[k] = v
+            if at.calc is not None:
+                for k, v in getattr(at.calc, 'results', {}).items():
+                    col_v = _as_column_value(v)
+                    if k in per_atom_properties:
+                        if col_v is None or not self._append_column('calc_arrays', k, col_v, natoms):
+                            objects.setdefault('calc_arrays', {})[k] = v
+                    else:
+                        if col_v is None or not self._append_column('calc_info', k, col_v):
+                            objects.setdefault('calc_info', {})[k] = v
+
+            for kind, kind_objects in objects.items():
+                self.object_keys[kind].update(kind_objects.keys())
+            self.objects_offsets.append(self.objects_pos)
+            line = (json.dumps(objects, default=_to_json) if len(objects) > 0 else '') + '\n'
+            self.objects_file.write(line)
+            self.objects_pos += len(line.encode())
+
+            self.n_configs += 1
+            self.n_atoms += natoms
+
+
+    def flush(self):
+        for fout in self.files.values():
+            fout.flush()
+        self.objects_file.flush()
+
+
+    def close(self):
+        """Close files and write metadata, after which store can be read"""
+        if self.closed:
+            return
+        for fout in self.files.values():
+            fout.close()
+        self.objects_file.close()
+        self.objects_offsets.append(self.objects_pos)
+        with open(self.path / 'objects.offsets', 'wb') as fout:
+            fout.write(np.asarray(self.objects_offsets, dtype=np.int64).tobytes())
+
+        meta = {'format': 'wfl_columnar', 'version': 1, 'n_configs': self.n_configs, 'n_atoms': self.n_atoms,
+                'columns': {kind: {k: {'dtype': dtype, 'shape': shape} for k, (dtype, shape) in cols.items()}
+                            for kind, cols in self.columns.items()},
+                'object_keys': {kind: sorted(keys) for kind, keys in self.object_keys.items()}}
+        with open(self.path / _META_FILE, 'w') as fout:
+            json.dump(meta, fout, indent=1)
+        self.closed = True
+
+
+class ColumnarConfigs:
+    """Read access to a columnar store, with columns memory-mapped
+
+    Parameters
+    ----------
+    filename: str / Path
+        directory containing store
+    """
+
+    def __init__(self, filename):
+        self.path = Path(filename)
+        with open(self.path / _META_FILE) as fin:
+            self.meta = json.load(fin)
+        self.n_configs = self.meta['n_configs']
+        self._mmaps = {}
+        self._row_offsets = {}
+
+        self.natoms = self._map('natoms', 'int64', [], self.n_configs)
+        self.atom_offsets = np.zeros(self.n_configs + 1, dtype=np.int64)
+        self.atom_offsets[1:] = np.cumsum(self.natoms)
+
+
+    def __len__(self):
+        return self.n_configs
+
+
+    def _map(self, col_file, dtype, tail_shape, n=None):
+        if col_file not in self._mmaps:
+            dtype = np.dtype(dtype)
+            file_path = self.path / col_file
+            row_size = dtype.itemsize * int(np.prod(tail_shape))
+            if n is None:
+                n = os.path.getsize(file_path) // row_size if row_size > 0 else 0
+            if n == 0 or row_size == 0:
+                self._mmaps[col_file] = np.zeros([n] + list(tail_shape), dtype=dtype)
+            else:
+                self._mmaps[col_file] = np.memmap(file_path, dtype=dtype, mode='r', shape=tuple([n] + list(tail_shape)))
+        return self._mmaps[col_file]
+
+
+    def keys(self, kind='info'):
+        """Keys of numeric columns of a kind ('info', 'arrays', 'calc_info', 'calc_arrays')"""
+        return list(self.meta['columns'][kind].keys())
+
+
+    def core(self, name):
+        """Core column ('natoms', 'cell', 'pbc' per config, 'numbers', 'positions' per atom)"""
+        dtype, tail_shape = _core_columns[name]
+        n = self.n_configs if name in ['natoms', 'cell', 'pbc'] else int(self.atom_offsets[-1])
+        return self._map(name, dtype, tail_shape, n)
+
+
+    def column(self, key, kind='info'):
+        """Values of a numeric column, and indices of configs that have them
+
+        Parameters
+        ----------
+        key: str
+            info or arrays key
+        kind: str, default 'info'
+            'info', 'arrays', 'calc_info', or 'calc_arrays'
+
+        Returns
+        -------
+        values: np.ndarray (memory mapped)
+            values, one row per config for info, one row per atom for arrays
+        config_indices: np.ndarray(int)
+            indices of configs that have this key
+        """
+        col = self.meta['columns'][kind][key]
+        config_indices = self._map(_col_file(kind, key) + '.idx', 'int64', [])
+        if kind.endswith('arrays'):
+            n = int(np.sum(self.natoms[config_indices]))
+        else:
+            n = len(config_indices)
+        return self._map(_col_file(kind, key), col['dtype'], col['shape'], n), config_indices
+
+
+    def _objects(self, config_i):
+        offsets = self._map('objects.offsets', 'int64', [], self.n_configs + 1)
+        line = self._map(_OBJECTS_FILE, 'uint8', [])[offsets[config_i]:offsets[config_i + 1]].tobytes().strip()
+        return json.loads(line) if len(line) > 0 else {}
+
+
+    def _value(self, kind, key, config_i):
+        values, config_indices = self.column(key, kind)
+        row = np.searchsorted(config_indices, config_i)
+        if row >= len(config_indices) or config_indices[row] != config_i:
+            raise KeyError(key)
+        if kind.endswith('arrays'):
+            # first row is after per-atom values of all previous configs that have this key
+            if (kind, key) not in self._row_offsets:
+                self._row_offsets[(kind, key)] = np.concatenate([[0], np.cumsum(self.natoms[config_indices])])
+            first = self._row_offsets[(kind, key)][row]
+            return np.array(values[first:first + self.natoms[config_i]])
+        v = np.array(values[row])
+        return v.item() if v.ndim == 0 else v
+
+
+    def get_atoms(self, config_i):
+        """Create Atoms for one config
+
+        Parameters
+        ----------
+        config_i: int
+            index of config
+
+        Returns
+        -------
+        Atoms
+        """
+        atom_slice = slice(self.atom_offsets[config_i], self.atom_offsets[config_i + 1])
+        at = Atoms(numbers=self.core('numbers')[atom_slice], positions=self.core('positions')[atom_slice],
+                   cell=self.core('cell')[config_i], pbc=self.core('pbc')[config_i])
+
+        results = {}
+        for kind in _kinds:
+            for key in self.keys(kind):
+                try:
+                    v = self._value(kind, key, config_i)
+                except KeyError:
+                    continue
+                if kind == 'info':
+                    at.info[key] = v
+                elif kind == 'arrays':
+                    at.new_array(key, v)
+                else:
+                    results[key] = v
+
+        objects = self._objects(config_i)
+        at.info.update(objects.get('info', {}))
+        for k, v in objects.get('arrays', {}).items():
+            at.new_array(k, np.asarray(v))
+        for k, v in objects.get('calc_info', {}).items():
+            results[k] = np.asarray(v) if isinstance(v, list) else v
+        for k, v in objects.get('calc_arrays', {}).items():
+            results[k] = np.asarray(v)
+
+        if len(results) > 0:
+            at.calc = SinglePointCalculator(at, **results)
+
+        return at
+
+
+    def iter_atoms(self, config_indices=None):
+        """Iterate over configs
+
+        Parameters
+        ----------
+        config_indices: iterable(int), default None
+            indices of configs to return, default all
+
+        Returns
+        -------
+        generator returning Atoms
+        """
+        if config_indices is None:
+            config_indices = range(self.n_configs)
+        for config_i in config_indices:
+            yield self.get_atoms(config_i)
+
+
+    def info_column(self, key, missing=None):
+        """Per-config values of a numeric info key (or calculator result) for all configs
+
+        Parameters
+        ----------
+        key: str
+            info key, or calculator result name
+        missing: scalar, default None
+            value for configs that do not have key (including key absent from all configs), if None raise
+            KeyError for any missing value.  ValueError is raised if key has non-numeric values.
+
+        Returns
+        -------
+        np.ndarray with one row per config, memory-mapped if key is present in every config
+        """
+        # stores written before object keys were recorded have none
+        object_keys = self.meta.get('object_keys', {})
+        if missing is not None and any([key in object_keys.get(kind, []) for kind in ['info', 'calc_info']]):
+            raise ValueError(f'info key {key} has non-numeric values in some configs, cannot fill missing ones')
+        if key in self.meta['columns']['info']:
+            kind = 'info'
+        elif key in self.meta['columns']['calc_info'] or missing is None:
+            kind = 'calc_info'
+        else:
+            # absent from every config
+            return np.full(self.n_configs, missing)
+        values, config_indices = self.column(key, kind)
+        if len(config_indices) == self.n_configs:
+            return values
+        if missing is None:
+            raise KeyError(f'info key {key} missing from {self.n_configs - len(config_indices)} configs')
+        dense = np.full([self.n_configs] + list(values.shape[1:]), missing,
+                        dtype=np.result_type(values.dtype, np.asarray(missing).dtype))
+        dense[config_indices] = values
+        return dense
+
+
+    def arrays_column(self, key):
+        """Per-atom values of a numeric arrays key (or calculator result), concatenated over all configs
+
+        Parameters
+        ----------
+        key: str
+            arrays key, or calculator result name
+
+        Returns
+        -------
+        np.ndarray with one row per atom, memory-mapped
+        """
+        if key in ['numbers', 'positions']:
+            return self.core(key)
+        kind = 'arrays' if key in self.meta['columns']['arrays'] else 'calc_arrays'
+        values, config_indices = self.column(key, kind)
+        if len(config_indices) != self.n_configs:
+            raise KeyError(f'arrays key {key} missing from {self.n_configs - len(config_indices)} configs')
+        return values
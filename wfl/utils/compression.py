@@ -0,0 +1,86 @@
+"""Transparent (de)compression of text streams, selected by filename suffix
+
+gzip uses the standard library, zstd requires the optional ``zstandard`` package.
+"""
+
+import gzip
+from pathlib import Path
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def compression_of(filename):
+    """Compression of a file, based on its suffix
+
+    Parameters
+    ----------
+    filename: str / Path
+        file name
+
+    Returns
+    -------
+    str 'gzip' or 'zstd', or None if file is not compressed
+    """
+    return COMPRESSION_SUFFIXES.get(Path(filename).suffix)
+
+
+def uncompressed_name(filename):
+    """File name without compression suffix, e.g. for detecting format of contents
+
+    Parameters
+    ----------
+    filename: str / Path
+        file name
+
+    Returns
+    -------
+    str file name with any compression suffix removed
+    """
+    filename = str(filename)
+    if compression_of(filename) is not None:
+        return str(Path(filename).with_suffix(''))
+    return filename
+
+
+def open_text(filename, mode='r', compression=None, level=None, threads=0):
+    """Open a file as a text stream, compressing or decompressing as needed
+
+    Parameters
+    ----------
+    filename: str / Path
+        file name
+    mode: 'r' / 'w', default 'r'
+        read or write
+    compression: str, default None
+        'gzip' or 'zstd', or None to use compression_of(filename)
+    level: int, default None
+        compression level, or None for default of compression library
+    threads: int, default 0
+        number of zstd compression threads, 0 for compression in calling thread, -1 for one per CPU
+
+    Returns
+    -------
+    text file object
+    """
+    assert mode in ['r', 'w']
+    if compression is None:
+        compression = compression_of(filename)
+
+    if compression is None:
+        return open(filename, mode)
+    elif compression == 'gzip':
+        return gzip.open(filename, mode + 't', compresslevel=level if level is not None else 9)
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError(f'zstandard module is needed for zstd compressed file {filename}')
+        if mode == 'w':
+            cctx = zstandard.ZstdCompressor(level=level if level is not None else 3, threads=threads)
+            return zstandard.open(filename, 'wt', cctx=cctx)
+        return zstandard.open(filename, 'rt')
+    else:
+        raise ValueError(f'Unknown compression {compression}')
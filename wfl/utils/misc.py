@@ -4,8 +4,15 @@ This should be temporary and reorganised when there is more, or just make one ut
 
 """
 
+import os
+import threading
+from contextlib import contextmanager
+
 from ase import Atoms
 
+# held while working directory is changed by chdir()
+_chdir_lock = threading.RLock()
+
 
 def chunks(arr, n):
     """Yield successive n-sized chunks from arr
@@ -48,3 +55,26 @@ def dict_tuple_keys_to_str(error_dict):
             k = '(' + ','.join([str(kv) for kv in k]) + ')'
         error_dict_json_compatible[k] = v
     return error_dict_json_compatible
+
+
+@contextmanager
+def chdir(path):
+    """Context manager that changes working directory, restoring it at the end
+
+    The working directory is shared by all threads of a process, so a process-wide lock is held
+    while in the context.  Ops that change directory this way can therefore run in threads (e.g.
+    iterable_loop(executor='threads')), although their changed-directory sections are serialized.
+    Other code in the same process that uses relative paths is not protected.
+
+    Parameters
+    ----------
+    path: path-like
+        directory to change to
+    """
+    with _chdir_lock:
+        prev_dir = os.getcwd()
+        os.chdir(path)
+        try:
+            yield
+        finally:
+            os.chdir(prev_dir)
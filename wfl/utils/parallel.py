@@ -1,18 +1,116 @@
+import os
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+
 from ase.calculators.calculator import Calculator
 
+# cache of calculators constructed from recipes, most recently used last, local to each thread so that
+# ops running in threads (iterable_loop(executor='threads')) never share a calculator.  Only used by
+# default in threads that enabled it (pool workers), so other callers don't keep calculators alive.
+_calculator_cache_local = threading.local()
+_calculator_cache_size = int(os.environ.get('WFL_CALCULATOR_CACHE_SIZE', 8))
+
+
+def _recipe_key(calculator):
+    # key of calculator recipe, None if it cannot be pickled
+    try:
+        return hashlib.sha256(pickle.dumps(tuple(calculator))).hexdigest()
+    except Exception:
+        return None
+
+
+def _calculator_cache():
+    # calculator cache of current thread
+    try:
+        return _calculator_cache_local.cache
+    except AttributeError:
+        _calculator_cache_local.cache = OrderedDict()
+        return _calculator_cache_local.cache
+
+
+def enable_calculator_cache(enabled=True):
+    """Set whether construct_calculator_picklesafe caches calculators by default in the current thread.
+    Called by wfl.pipeline.pool.do_in_pool in its workers, and for the duration of serial runs.
+
+    Parameters
+    ----------
+    enabled: bool, default True
+        cache calculators by default
+
+    Returns
+    -------
+    previous: bool
+        previous setting
+    """
+    previous = getattr(_calculator_cache_local, 'enabled', False)
+    _calculator_cache_local.enabled = enabled
+    return previous
 
-def construct_calculator_picklesafe(calculator):
+
+def set_calculator_cache_size(size):
+    """Set maximum number of calculators kept in each cache of construct_calculator_picklesafe,
+    evicting least recently used ones if needed.  Default from env var WFL_CALCULATOR_CACHE_SIZE, or 8.
+
+    Parameters
+    ----------
+    size: int
+        maximum number of cached calculators, 0 to disable caching
+    """
+    global _calculator_cache_size
+    _calculator_cache_size = size
+    cache = _calculator_cache()
+    while len(cache) > max(size, 0):
+        cache.popitem(last=False)
+
+
+def evict_calculator(calculator=None):
+    """Remove calculator(s) from cache of construct_calculator_picklesafe of current thread
+
+    Parameters
+    ----------
+    calculator: (initializer, args, kwargs), default None
+        recipe of calculator to evict, or None to evict all
+
+    Returns
+    -------
+    n_evicted: int
+        number of calculators removed from cache
+    """
+    cache = _calculator_cache()
+    if calculator is None:
+        n_evicted = len(cache)
+        cache.clear()
+        return n_evicted
+
+    key = _recipe_key(calculator)
+    if key in cache:
+        del cache[key]
+        return 1
+    return 0
+
+
+def construct_calculator_picklesafe(calculator, cache=None):
     """Constructs a calculator safe with multiprocessing.Pool
 
     Trick: pass a recipe only and create the calculator in the thread created, instead of trying to pickle the entire
     object when creating the pool.
 
+    In pool workers of wfl.pipeline.pool.do_in_pool, calculators constructed from recipes are kept in a
+    least-recently-used cache, local to each process and thread (see enable_calculator_cache(),
+    set_calculator_cache_size() and evict_calculator()), so that an expensive calculator (e.g. large
+    GAP potential) is constructed once in each process rather than once for every chunk.
+
     Taken from minim.py:run_op
 
     Parameters
     ----------
     calculator: Calculator / (initializer, args, kwargs)
         ASE calculator or routine to call to create calculator
+    cache: bool, default None
+        reuse calculator constructed from same recipe earlier in this process.  If None, only if
+        enabled in current thread by enable_calculator_cache(), as in pool workers.
 
     Returns
     -------
@@ -31,6 +129,15 @@ def construct_calculator_picklesafe(calculator):
             raise RuntimeError(
                 'calculator \'{}\' : first element is not callable, cannot construct a calculator'.format(calculator))
 
+        if cache is None:
+            cache = getattr(_calculator_cache_local, 'enabled', False)
+        key = _recipe_key(calculator) if cache and _calculator_cache_size > 0 else None
+        if key is not None:
+            calc_cache = _calculator_cache()
+            if key in calc_cache:
+                calc_cache.move_to_end(key)
+                return calc_cache[key]
+
         if calculator[1] is None:
             c_args = []
         else:
@@ -40,4 +147,11 @@ def construct_calculator_picklesafe(calculator):
         else:
             c_kwargs = calculator[2]
 
-        return calculator[0](*c_args, **c_kwargs)
+        calc = calculator[0](*c_args, **c_kwargs)
+
+        if key is not None:
+            calc_cache[key] = calc
+            while len(calc_cache) > _calculator_cache_size:
+                calc_cache.popitem(last=False)
+
+        return calc
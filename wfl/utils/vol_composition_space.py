@@ -51,3 +51,39 @@ def composition_space_coord(at, fields, composition_Zs=None):
         else:
             raise RuntimeError("Got select_coord field {}, not _V or _x or in at.info".format(f))
     return coords
+
+
+def composition_space_coords_from_columns(columns, fields, composition_Zs=None):
+    """Calculate coordinates in vol-composition space of many configs at once, from
+    per-config columns such as those returned by ConfigSet_in.get_columns()
+
+    Parameters
+    ----------
+    columns : dict(str: np.ndarray)
+        "natoms" (per config) and, if needed for fields, "volume" (per config), "numbers"
+        (per atom, concatenated over configs) and info keys (per config)
+    fields : list(str)
+        fields to find, as in composition_space_coord()
+    composition_Zs : list(int)
+        atomic numbers of elements for composition space
+
+    Returns
+    -------
+    coords : np.ndarray(n_configs, n_coords)
+        coordinates, one row per config
+    """
+    natoms = np.asarray(columns['natoms'])
+    coords = []
+    for f in fields:
+        if f == "_V":
+            coords.append(columns['volume'] / natoms)
+        elif f == "_x":
+            config_of_atom = np.repeat(np.arange(len(natoms)), natoms)
+            for Zi in composition_Zs[1:]:
+                coords.append(np.bincount(config_of_atom, weights=(columns['numbers'] == Zi),
+                                          minlength=len(natoms)) / natoms)
+        elif f in columns:
+            coords.append(columns[f] / natoms)
+        else:
+            raise RuntimeError("Got select_coord field {}, not _V or _x or in columns".format(f))
+    return np.stack(coords, axis=1) if len(coords) > 0 else np.zeros((len(natoms), 0))
@@ -0,0 +1,233 @@
+"""Byte-offset index of frames in (ext)xyz files
+
+The index is kept in a hidden sidecar file next to the xyz file, and is only trusted if the
+size and modification time it records match those of the xyz file.
+"""
+
+import os
+import io
+from pathlib import Path
+
+import numpy as np
+import ase.io
+from ase.io.formats import filetype as ase_filetype, string2index
+from ase.io.extxyz import key_val_str_to_dict
+
+_indexable_formats = ['extxyz', 'xyz']
+
+# in-memory copies of indices, for files whose sidecar could not be written
+_index_cache = {}
+
+
+def index_path(filename):
+    """Name of sidecar file containing frame index of a file
+
+    Parameters
+    ----------
+    filename: str / Path
+        xyz file
+
+    Returns
+    -------
+    Path of index file
+    """
+    filename = Path(filename)
+    return filename.parent / ('.' + filename.name + '.wfl_idx.npz')
+
+
+def is_indexable(filename):
+    """Check if a file is an uncompressed (ext)xyz file whose frames can be indexed
+
+    Parameters
+    ----------
+    filename: str / Path
+        file to check
+
+    Returns
+    -------
+    bool
+    """
+    filename = Path(filename)
+    if not filename.is_file() or filename.suffix in ['.gz', '.bz2', '.xz', '.zst']:
+        return False
+    try:
+        return ase_filetype(str(filename), read=False) in _indexable_formats
+    except Exception:
+        return False
+
+
+def build_index(filename):
+    """Scan an xyz file and find the byte offset of every frame, without parsing the frames
+
+    Parameters
+    ----------
+    filename: str / Path
+        xyz file
+
+    Returns
+    -------
+    offsets: np.ndarray(int64) of len n_frames + 1
+        start of every frame, followed by end of last frame
+    """
+    offsets = []
+    pos = 0
+    with open(filename, 'rb') as fin:
+        while True:
+            line = fin.readline()
+            if not line:
+                break
+            if len(line.strip()) == 0:
+                # blank lines between or after frames
+                pos += len(line)
+                continue
+            try:
+                n_atoms = int(line)
+            except ValueError as exc:
+                raise ValueError(f'Expected number of atoms at byte {pos} of {filename}, got \'{line}\'') from exc
+            offsets.append(pos)
+            pos += len(line)
+            # comment line, then one line per atom
+            for _ in range(n_atoms + 1):
+                pos += len(fin.readline())
+    offsets.append(pos)
+
+    return np.asarray(offsets, dtype=np.int64)
+
+
+def get_index(filename, write=True, build=True):
+    """Get frame index for a file, reading it from the sidecar file if it is up to date,
+    and otherwise building it (and saving it, if possible)
+
+    Parameters
+    ----------
+    filename: str / Path
+        xyz file
+    write: bool, default True
+        write newly built index to sidecar file
+    build: bool, default True
+        build index if there is no up to date one, otherwise return None
+
+    Returns
+    -------
+    offsets: np.ndarray(int64) of len n_frames + 1
+        start of every frame, followed by end of last frame
+    """
+    filename = Path(filename)
+    stat = os.stat(filename)
+    stamp = np.asarray([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    cached = _index_cache.get(filename.resolve())
+    if cached is not None and np.all(cached[0] == stamp):
+        return cached[1]
+
+    idx_file = index_path(filename)
+    try:
+        with np.load(idx_file) as idx_data:
+            if np.all(idx_data['stamp'] == stamp):
+                offsets = idx_data['offsets']
+                _index_cache[filename.resolve()] = (stamp, offsets)
+                return offsets
+    except (OSError, KeyError, ValueError):
+        # missing or unreadable, rebuild below
+        pass
+
+    if not build:
+        return None
+    offsets = build_index(filename)
+    _index_cache[filename.resolve()] = (stamp, offsets)
+
+    if write:
+        tmp_idx_file = idx_file.parent / ('tmp' + idx_file.name)
+        try:
+            with open(tmp_idx_file, 'wb') as fout:
+                np.savez(fout, offsets=offsets, stamp=stamp)
+            os.replace(tmp_idx_file, idx_file)
+        except OSError:
+            # e.g. read-only directory, keep in-memory copy only
+            try:
+                tmp_idx_file.unlink()
+            except OSError:
+                pass
+
+    return offsets
+
+
+def select_frames(n_frames, index):
+    """Convert an ase.io-style index into a list of frame numbers
+
+    Parameters
+    ----------
+    n_frames: int
+        number of frames in file
+    index: str / int / slice
+        index as passed to ase.io.read, e.g. ':', '::10', '-1', 3
+
+    Returns
+    -------
+    list(int) of frame numbers
+    """
+    if isinstance(index, str):
+        index = string2index(index)
+    if isinstance(index, slice):
+        return list(range(n_frames)[index])
+    return [range(n_frames)[index]]
+
+
+def read_frames(filename, offsets, frames):
+    """Read selected frames from an xyz file by seeking to them
+
+    Parameters
+    ----------
+    filename: str / Path
+        xyz file
+    offsets: np.ndarray(int)
+        frame index, as returned by get_index()
+    frames: iterable(int)
+        frame numbers to read, in the order they will be returned.  Runs of
+        consecutive frames are read and parsed together.
+
+    Returns
+    -------
+    generator returning Atoms
+    """
+    format = ase_filetype(str(filename), read=False)
+
+    # split into runs of consecutive frames
+    runs = []
+    for frame_i in frames:
+        if len(runs) > 0 and frame_i == runs[-1][1]:
+            runs[-1][1] += 1
+        else:
+            runs.append([frame_i, frame_i + 1])
+
+    with open(filename, 'rb') as fin:
+        for start, end in runs:
+            fin.seek(offsets[start])
+            buf = fin.read(offsets[end] - offsets[start])
+            for at in ase.io.iread(io.StringIO(buf.decode()), index=':', format=format):
+                yield at
+
+
+def read_frame_headers(filename, offsets, frames):
+    """Read only the number of atoms and parsed comment line of selected frames, without parsing
+    per-atom lines
+
+    Parameters
+    ----------
+    filename: str / Path
+        xyz file
+    offsets: np.ndarray(int)
+        frame index, as returned by get_index()
+    frames: iterable(int)
+        frame numbers to read
+
+    Returns
+    -------
+    generator returning (natoms, dict of key-value pairs in comment line, including 'Lattice' if present)
+    """
+    with open(filename, 'rb') as fin:
+        for frame_i in frames:
+            fin.seek(offsets[frame_i])
+            natoms = int(fin.readline())
+            comment = fin.readline().decode().strip()
+            yield natoms, key_val_str_to_dict(comment) if comment else {}